@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import os
 import sys
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -54,6 +55,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # after the authentication middleware, which profiling needs to recognize staff users
+    'systems.middleware.MetricsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +95,78 @@ DATABASES = {
         "PORT": os.environ.get("POSTGRES_PORT"),
     }
 }
+
+# Requests of the async views using the database at the same time, per ASGI worker process.
+# Under ASGI every request in flight holds its own database connection, so this keeps many slow
+# clients from exhausting the connections of the database server.
+
+ASYNC_DATABASE_CONNECTIONS = int(os.environ.get("ASYNC_DATABASE_CONNECTIONS", 20))
+
+# Cache used for API responses and their version counters.
+# Local memory by default; set REDIS_URL to share the cache between processes in production.
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if os.environ.get("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL"),
+    }
+
+# Broker waking up the measurement event streams when measurements are created.
+# The in-process broker only reaches streams served by the same process; with several
+# server processes use "systems.events.PostgresBroker" (LISTEN/NOTIFY).
+
+MEASUREMENT_EVENTS_BROKER = os.environ.get("MEASUREMENT_EVENTS_BROKER", "systems.events.InProcessBroker")
+
+# Seconds the alert rules of a system are kept compiled in memory. Changes made by other
+# processes are picked up once they expire; changes made by the process itself right away.
+
+ALERT_RULES_TTL = int(os.environ.get("ALERT_RULES_TTL", 60))
+
+# Comma separated hosts alert webhooks may be sent to, ".example.com" for a domain and its
+# subdomains; empty for any host. Webhooks are only ever sent to public IP addresses over
+# http(s), without following redirects.
+
+WEBHOOK_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get("WEBHOOK_ALLOWED_HOSTS", "").split(",")
+                         if host.strip()]
+
+# Seconds a device API key and the systems it may use are kept in memory after being looked up.
+# Revoking a key or changing its systems takes effect in other processes once it expires.
+
+DEVICE_KEY_CACHE_TTL = int(os.environ.get("DEVICE_KEY_CACHE_TTL", 60))
+
+# Seconds the slugs and ids of a user's systems are kept in the cache for ownership checks.
+# Invalidated when the user's systems change, which other processes only see through a shared
+# cache, so without REDIS_URL they are loaded once per request (0) by default.
+
+OWNED_SYSTEMS_CACHE_TIMEOUT = int(
+    os.environ.get("OWNED_SYSTEMS_CACHE_TIMEOUT", 300 if os.environ.get("REDIS_URL") else 0)
+)
+
+# Defer the rollup updates and alert evaluation of new measurements to the outbox worker
+# (python manage.py process_outbox), keeping them out of the write requests. Snapshots,
+# modification stamps and cache invalidation always run with the write.
+
+DEFER_MEASUREMENT_WORK = os.environ.get("DEFER_MEASUREMENT_WORK", "").lower() in ("1", "true", "yes")
+
+# Per-view latency, database queries and time, serializer time and response size of every request,
+# exposed in the Prometheus text format at /metrics to staff users and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>". The metrics are kept per server process.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Requests of staff users with an "X-Profile" header, and this fraction of all requests, are
+# profiled with cProfile into PROFILE_DIR, e.g. for snakeviz or flameprof.
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "hydroponic-profiles"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -135,15 +210,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        # compact formats for measurement series, other data falls back to JSON
+        'systems.renderers.ColumnarJSONRenderer',
+        'systems.renderers.PackedMeasurementRenderer',
+    ],
 }
 
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
-# Django-Debug-Toolbar settings for running tests
-ENABLE_DEBUG_TOOLBAR = DEBUG and "test" not in sys.argv
+# Django-Debug-Toolbar settings for running tests and benchmarks
+ENABLE_DEBUG_TOOLBAR = DEBUG and not {"test", "benchmark_api"} & set(sys.argv)
 if ENABLE_DEBUG_TOOLBAR:
     INSTALLED_APPS += [
         "debug_toolbar",
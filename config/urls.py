@@ -15,11 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from systems.views import Metrics
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Hydroponic System Manager API",
@@ -36,5 +39,9 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('metrics', Metrics.as_view(), name='metrics'),
     path('__debug__/', include('debug_toolbar.urls')),
 ]
+
+# the ASGI server does not serve static files; in DEBUG Django serves them itself
+urlpatterns += staticfiles_urlpatterns()
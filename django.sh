@@ -4,4 +4,4 @@ python manage.py migrate
 echo "=================================="
 
 echo "Start server"
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers "${WEB_CONCURRENCY:-1}"
\ No newline at end of file
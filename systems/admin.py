@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import HydroponicSystem, Measurement
+from .models import AlertEvent, AlertRule, Anomaly, DeviceKey, HydroponicSystem, Measurement
 
 
 class MeasurementInLine(admin.TabularInline):
@@ -20,5 +20,38 @@ class MeasurementAdmin(admin.ModelAdmin):
     search_fields = ['system__name', 'timestamp', 'temperature', 'ph', 'tds']
 
 
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'system', 'metric', 'minimum', 'maximum', 'is_active', 'firing']
+    list_filter = ['metric', 'is_active', 'firing']
+    search_fields = ['name', 'system__name']
+
+
+class AlertEventAdmin(admin.ModelAdmin):
+    list_display = ['rule', 'kind', 'value', 'timestamp', 'delivered_at']
+    list_filter = ['kind', 'metric']
+    raw_id_fields = ['rule', 'system']
+
+
+class AnomalyAdmin(admin.ModelAdmin):
+    list_display = ['system', 'kind', 'metric', 'value', 'score', 'timestamp']
+    list_filter = ['kind', 'metric']
+    raw_id_fields = ['system']
+
+
+class DeviceKeyAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'prefix', 'created_at', 'last_used_at', 'revoked_at']
+    search_fields = ['name', 'owner__username', 'prefix']
+    readonly_fields = ['prefix', 'created_at', 'last_used_at', 'revoked_at']
+    filter_horizontal = ['systems']
+
+    def has_add_permission(self, request):
+        # keys are generated through the API, which shows them once
+        return False
+
+
 admin.site.register(HydroponicSystem, HydroponicSystemAdmin)
 admin.site.register(Measurement, MeasurementAdmin)
+admin.site.register(AlertRule, AlertRuleAdmin)
+admin.site.register(AlertEvent, AlertEventAdmin)
+admin.site.register(Anomaly, AnomalyAdmin)
+admin.site.register(DeviceKey, DeviceKeyAdmin)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.db.models import Avg, Count, DateTimeField, ExpressionWrapper, Max, Min, StdDev, Value
+from django.db.models.functions import ExtractHour, ExtractMinute, Trunc
+
+METRICS = ['temperature', 'ph', 'tds']
+STATS = ['min', 'max', 'avg', 'stddev']
+
+# bucket name -> (unit the timestamp is truncated to, number of units per bucket)
+BUCKETS = {
+    '1m': ('minute', 1),
+    '5m': ('minute', 5),
+    '15m': ('minute', 15),
+    '1h': ('hour', 1),
+    '6h': ('hour', 6),
+    '1d': ('day', 1),
+}
+
+_EXTRACTS = {
+    'minute': (ExtractMinute, timedelta(minutes=1)),
+    'hour': (ExtractHour, timedelta(hours=1)),
+}
+
+
+def bucket_expression(bucket, field='timestamp'):
+    """
+    Build the SQL expression mapping a timestamp to the start of its bucket.
+
+    Single unit buckets are a plain date truncation. Multi unit buckets are truncated and
+    then moved back to the nearest multiple of the bucket width, e.g. 12:37 -> 12:35 for 5m.
+
+    Args:
+        bucket (str): Bucket name, one of ``BUCKETS``.
+        field (str): Name of the timestamp field.
+
+    Returns:
+        Expression: Expression evaluating to the bucket start.
+    """
+    unit, width = BUCKETS[bucket]
+    truncated = Trunc(field, unit, output_field=DateTimeField())
+    if width == 1:
+        return truncated
+    extract, step = _EXTRACTS[unit]
+    return ExpressionWrapper(
+        truncated - extract(field) % width * Value(step),
+        output_field=DateTimeField()
+    )
+
+
+def aggregate_measurements(queryset, bucket):
+    """
+    Aggregate measurements per system and time bucket in the database.
+
+    Args:
+        queryset (QuerySet): Filtered Measurement queryset.
+        bucket (str): Bucket name, one of ``BUCKETS``.
+
+    Returns:
+        QuerySet: Dictionaries with ``system__slug``, ``bucket``, ``count`` and
+        ``<metric>_<stat>`` keys, ordered by system and bucket.
+    """
+    aggregates = {'count': Count('pk')}
+    for metric in METRICS:
+        aggregates[f'{metric}_min'] = Min(metric)
+        aggregates[f'{metric}_max'] = Max(metric)
+        aggregates[f'{metric}_avg'] = Avg(metric)
+        aggregates[f'{metric}_stddev'] = StdDev(metric)
+    return (
+        queryset
+        .annotate(bucket=bucket_expression(bucket))
+        .order_by()
+        .values('system__slug', 'bucket')
+        .annotate(**aggregates)
+        .order_by('system__slug', 'bucket')
+    )
@@ -0,0 +1,329 @@
+import http.client
+import ipaddress
+import json
+import socket
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import outbox
+from .models import AlertEvent, AlertRule
+
+WEBHOOK_TOPIC = 'alerts.webhook'
+WEBHOOK_TIMEOUT = 5
+
+# system id -> (monotonic time of compilation, list of CompiledRule)
+_compiled = {}
+
+
+class CompiledRule:
+    """
+    Alert rule reduced to what evaluating one reading needs, with its evaluation state.
+
+    ``state`` is the ``(breach_started_at, firing)`` of the rule as last seen by the process.
+    It is reloaded with the rule when the compiled rules expire or a transition conflicts
+    with the stored state.
+    """
+    __slots__ = ['pk', 'name', 'metric', 'minimum', 'maximum', 'hysteresis', 'sustained_for', 'webhook_url',
+                 'state']
+
+    def __init__(self, rule):
+        self.pk = rule.pk
+        self.name = rule.name
+        self.metric = rule.metric
+        self.minimum = float('-inf') if rule.minimum is None else rule.minimum
+        self.maximum = float('inf') if rule.maximum is None else rule.maximum
+        self.hysteresis = rule.hysteresis
+        self.sustained_for = rule.sustained_for
+        self.webhook_url = rule.webhook_url
+        self.state = (rule.breach_started_at, rule.firing)
+
+    def breached(self, value):
+        return value < self.minimum or value > self.maximum
+
+    def recovered(self, value):
+        return self.minimum + self.hysteresis <= value <= self.maximum - self.hysteresis
+
+    def next_state(self, state, value, timestamp):
+        """
+        Apply one reading to a state.
+
+        Args:
+            state (tuple): ``(breach_started_at, firing)`` before the reading.
+            value (float): Value of the rule's metric.
+            timestamp (datetime): Time of the reading.
+
+        Returns:
+            tuple: State after the reading.
+        """
+        breach_started_at, firing = state
+        if firing:
+            return (None, False) if self.recovered(value) else state
+        if not self.breached(value):
+            return None, False
+        breach_started_at = breach_started_at or timestamp
+        return breach_started_at, timestamp - breach_started_at >= self.sustained_for
+
+
+def forget(system_ids):
+    """
+    Drop the compiled rules of the given systems, e.g. after their rules changed.
+
+    Other processes pick up the change once their compiled rules expire after ``ALERT_RULES_TTL``.
+
+    Args:
+        system_ids (iterable): Primary keys of the systems.
+    """
+    for system_id in system_ids:
+        _compiled.pop(system_id, None)
+
+
+def compiled_rules(system_ids):
+    """
+    Return the compiled active rules of the given systems, compiling missing or expired ones.
+
+    Args:
+        system_ids (iterable): Primary keys of the systems.
+
+    Returns:
+        dict: System id mapped to its list of CompiledRule, empty for systems without rules.
+    """
+    now = time.monotonic()
+    result = {}
+    missing = []
+    for system_id in system_ids:
+        entry = _compiled.get(system_id)
+        if entry is None or now - entry[0] > settings.ALERT_RULES_TTL:
+            missing.append(system_id)
+        else:
+            result[system_id] = entry[1]
+    if missing:
+        compiled = {system_id: [] for system_id in missing}
+        for rule in AlertRule.objects.filter(system_id__in=missing, is_active=True).order_by('pk'):
+            compiled[rule.system_id].append(CompiledRule(rule))
+        for system_id, rules in compiled.items():
+            _compiled[system_id] = (now, rules)
+        result.update(compiled)
+    return result
+
+
+def evaluate(measurements):
+    """
+    Evaluate the alert rules of the systems of newly created measurements.
+
+    Each reading is applied to the in-memory state of the rules of its system, so the cost per
+    reading is constant and no history is read. Only state changes are written, with a single
+    insert for the events of the batch. Events of rules with a webhook are queued in the outbox.
+
+    Args:
+        measurements (list): Saved Measurement objects.
+    """
+    readings = defaultdict(list)
+    for measurement in measurements:
+        readings[measurement.system_id].append(measurement)
+    rules = compiled_rules(readings)
+    events = []
+    for system_id, system_readings in readings.items():
+        if not rules[system_id]:
+            continue
+        system_readings.sort(key=lambda measurement: (measurement.timestamp, measurement.pk))
+        for rule in rules[system_id]:
+            state = rule.state
+            for measurement in system_readings:
+                state = _apply(rule, state, measurement, events)
+            rule.state = state
+    if events:
+        AlertEvent.objects.bulk_create(events)
+        outbox.enqueue(WEBHOOK_TOPIC, [{'event_id': event.pk} for event in events if event.webhook_url])
+
+
+def _apply(rule, state, measurement, events):
+    """
+    Apply a reading to the state of a rule and record the transition, if any.
+
+    The stored state is only changed if it still is ``state``. Otherwise it was changed by
+    another process, or the in-memory state is left over from a rolled back transaction; the
+    stored state is reloaded and the reading applied to it instead, so every transition is
+    recorded once.
+
+    Returns:
+        tuple: State after the reading.
+    """
+    value = getattr(measurement, rule.metric)
+    new_state = rule.next_state(state, value, measurement.timestamp)
+    while new_state != state:
+        stored = AlertRule.objects.filter(pk=rule.pk, breach_started_at=state[0], firing=state[1])
+        if stored.update(breach_started_at=new_state[0], firing=new_state[1]):
+            if new_state[1] != state[1]:
+                events.append(AlertEvent(
+                    rule_id=rule.pk,
+                    system_id=measurement.system_id,
+                    kind=AlertEvent.FIRING if new_state[1] else AlertEvent.RESOLVED,
+                    metric=rule.metric,
+                    value=value,
+                    measurement_id=measurement.pk,
+                    timestamp=measurement.timestamp,
+                    webhook_url=rule.webhook_url,
+                ))
+            break
+        state = AlertRule.objects.filter(pk=rule.pk).values_list('breach_started_at', 'firing').first()
+        if state is None:
+            # the rule was deleted
+            return new_state
+        new_state = rule.next_state(state, value, measurement.timestamp)
+    return new_state
+
+
+def webhook_payload(event):
+    return {
+        'event': event.kind,
+        'rule': event.rule.name,
+        'rule_id': event.rule_id,
+        'system': event.system.slug,
+        'metric': event.metric,
+        'value': event.value,
+        'minimum': event.rule.minimum,
+        'maximum': event.rule.maximum,
+        'measurement_id': event.measurement_id,
+        'timestamp': event.timestamp,
+    }
+
+
+def is_public_address(address):
+    """
+    Check whether an IP address is reachable on the internet, rather than e.g. a loopback,
+    private or link-local address of the server's network.
+    """
+    address = ipaddress.ip_address(address.split('%')[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def resolve_public(host, port):
+    """
+    Resolve a host, accepting only public addresses.
+
+    Args:
+        host (str): Host name or IP address.
+        port (int): Port number.
+
+    Returns:
+        list: IP addresses of the host.
+
+    Raises:
+        ValueError: If the host resolves to an address that is not public.
+        OSError: If the host cannot be resolved.
+    """
+    addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    for address in addresses:
+        if not is_public_address(address):
+            raise ValueError(f'{host} resolves to the non-public address {address}')
+    return addresses
+
+
+def check_webhook_url(url):
+    """
+    Check that a webhook may be called: an http or https URL whose host is allowed by
+    ``WEBHOOK_ALLOWED_HOSTS`` and resolves to public addresses only.
+
+    Args:
+        url (str): Webhook URL.
+
+    Raises:
+        ValueError: If the webhook may not be called.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('Only http and https URLs are allowed')
+    host = parts.hostname.rstrip('.').lower()
+    allowed_hosts = settings.WEBHOOK_ALLOWED_HOSTS
+    if allowed_hosts and not any(
+        host == allowed or (allowed.startswith('.') and host.endswith(allowed)) for allowed in allowed_hosts
+    ):
+        raise ValueError(f'{host} is not an allowed webhook host')
+    try:
+        resolve_public(host, parts.port or (443 if parts.scheme == 'https' else 80))
+    except OSError:
+        raise ValueError(f'{host} cannot be resolved')
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, **kwargs):
+    # resolved again when connecting, as the host may resolve differently than when it was checked
+    host, port = address
+    error = None
+    for ip in resolve_public(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address, **kwargs)
+        except OSError as exc:
+            error = exc
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        # answered with an HTTPError instead, a redirect could lead to any host
+        return None
+
+
+# connects to public addresses only, without proxies and redirects
+_webhook_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _NoRedirectHandler
+)
+
+
+def urlopen(request, timeout):
+    return _webhook_opener.open(request, timeout=timeout)
+
+
+@outbox.handler(WEBHOOK_TOPIC, batch=False, atomic=False)
+def send_webhook(payload):
+    """
+    POST an alert event to the webhook of its rule as JSON.
+
+    Args:
+        payload (dict): Outbox payload with the ``event_id``.
+
+    Raises:
+        OSError: If the request failed or the webhook did not answer with a 2xx status; the
+            outbox retries the delivery later.
+        ValueError: If the webhook may not be called, see ``check_webhook_url``.
+    """
+    event = AlertEvent.objects.select_related('rule', 'system').filter(pk=payload['event_id']).first()
+    if event is None or event.delivered_at is not None:
+        return
+    check_webhook_url(event.webhook_url)
+    body = json.dumps(webhook_payload(event), cls=DjangoJSONEncoder).encode()
+    request = urllib.request.Request(
+        event.webhook_url, data=body, method='POST', headers={'Content-Type': 'application/json'}
+    )
+    with urlopen(request, timeout=WEBHOOK_TIMEOUT):
+        pass
+    AlertEvent.objects.filter(pk=event.pk).update(delivered_at=timezone.now())
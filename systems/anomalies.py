@@ -0,0 +1,266 @@
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from .aggregates import METRICS
+from .downsampling import CHUNK_ROWS, from_microseconds, read_series
+from .models import Anomaly, AnomalyDetectorState
+
+# weight of a reading in the moving average and variance the z-scores are computed from
+ALPHA = 0.05
+# weight of a reading in the slow moving average drift is measured against
+BASELINE_ALPHA = 0.002
+# readings of a metric seen before spikes and drift are reported
+WARMUP = 30
+SPIKE_THRESHOLD = 5.0
+# distance between the moving average and the baseline in standard deviations; the drift
+# ends once the distance is below half of it
+DRIFT_THRESHOLD = 4.0
+FLATLINE_READINGS = 60
+# smallest standard deviation assumed, about the resolution of common sensors
+NOISE_FLOOR = {'temperature': 0.05, 'ph': 0.01, 'tds': 1.0}
+
+
+def _recurrence(inputs, decay, initial):
+    """
+    Compute ``y[t] = decay * y[t - 1] + inputs[t]`` along the first axis, with ``y[-1] = initial``.
+
+    The closed form is evaluated with cumulative sums in blocks short enough for
+    ``decay ** -block`` to stay far from the float64 range.
+    """
+    block = max(1, int(200 / -np.log(decay)))
+    result = np.empty_like(inputs)
+    for start in range(0, len(inputs), block):
+        chunk = inputs[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1, dtype=np.float64)[:, None]
+        result[start:start + len(chunk)] = powers * (initial + np.cumsum(chunk / powers, axis=0))
+        initial = result[start + len(chunk) - 1]
+    return result
+
+
+def _runs(same, initial):
+    """
+    Count the identical readings ending at every reading, ``initial`` ending before the first.
+    """
+    index = np.arange(len(same))[:, None]
+    last_change = np.maximum.accumulate(np.where(same, -1, index), axis=0)
+    return np.where(last_change >= 0, index - last_change + 1, initial + index + 1)
+
+
+def _hold(marks, initial):
+    """
+    Turn on (1) and off (0) marks into states, unmarked (-1) readings keeping the previous one.
+    """
+    index = np.arange(len(marks))[:, None]
+    last_mark = np.maximum.accumulate(np.where(marks >= 0, index, -1), axis=0)
+    held = np.take_along_axis(marks, np.maximum(last_mark, 0), axis=0)
+    return np.where(last_mark >= 0, held == 1, initial)
+
+
+def _previous(initial, values):
+    return np.vstack([initial[None], values[:-1]])
+
+
+class Detectors:
+    """
+    Spike, flatline and drift detectors of the metrics of one system.
+
+    - A spike is a reading more than ``SPIKE_THRESHOLD`` standard deviations away from the
+      exponentially weighted moving average of the previous readings.
+    - A flatline is reported once a metric repeated the same value ``FLATLINE_READINGS`` times,
+      e.g. a stuck sensor.
+    - A drift is reported when the moving average moves more than ``DRIFT_THRESHOLD`` standard
+      deviations away from a much slower moving average, the baseline, e.g. pH creeping up as
+      the nutrient solution is used up.
+
+    Every recurrence is computed in closed form over arrays, so a batch of readings is processed
+    with a handful of NumPy operations across all its rows and metrics, whether it is a single
+    write or a chunk of the whole history.
+    """
+    FIELDS = ['count', 'mean', 'variance', 'baseline', 'last_value', 'run', 'drifting']
+
+    def __init__(self, states):
+        """
+        Args:
+            states (list): AnomalyDetectorState of every metric, in the order of ``METRICS``.
+        """
+        self.count = np.array([state.count for state in states], dtype=np.int64)
+        self.mean = np.array([state.mean for state in states], dtype=np.float64)
+        self.variance = np.array([state.variance for state in states], dtype=np.float64)
+        self.baseline = np.array([state.baseline for state in states], dtype=np.float64)
+        self.last_value = np.array([np.nan if state.last_value is None else state.last_value for state in states])
+        self.run = np.array([state.run for state in states], dtype=np.int64)
+        self.drifting = np.array([state.drifting for state in states])
+        self.floor = np.array([NOISE_FLOOR[metric] for metric in METRICS])
+
+    def feed(self, values):
+        """
+        Update the detectors with the next readings.
+
+        Args:
+            values (numpy.ndarray): Metric values of shape (n, len(METRICS)), in time order.
+
+        Returns:
+            list: ``(row, metric index, kind, score)`` of every anomaly, ordered by row.
+        """
+        if not len(values):
+            return []
+        fresh = self.count == 0
+        self.mean = np.where(fresh, values[0], self.mean)
+        self.baseline = np.where(fresh, values[0], self.baseline)
+        seen = self.count + np.arange(len(values))[:, None]
+
+        mean = _recurrence(ALPHA * values, 1 - ALPHA, self.mean)
+        deviation = values - _previous(self.mean, mean)
+        variance = _recurrence(ALPHA * (1 - ALPHA) * deviation ** 2, 1 - ALPHA, self.variance)
+        baseline = _recurrence(BASELINE_ALPHA * values, 1 - BASELINE_ALPHA, self.baseline)
+
+        z_scores = np.abs(deviation) / np.maximum(np.sqrt(_previous(self.variance, variance)), self.floor)
+        spikes = (seen >= WARMUP) & (z_scores > SPIKE_THRESHOLD)
+
+        gaps = np.abs(mean - baseline) / np.maximum(np.sqrt(variance), self.floor)
+        marks = np.where(gaps > DRIFT_THRESHOLD, 1, np.where(gaps < DRIFT_THRESHOLD / 2, 0, -1))
+        marks[seen < WARMUP] = 0
+        drifting = _hold(marks, self.drifting)
+        drifts = drifting & ~_previous(self.drifting, drifting)
+
+        runs = _runs(values == _previous(self.last_value, values), self.run)
+        flatlines = runs == FLATLINE_READINGS
+
+        self.count = self.count + len(values)
+        self.mean, self.variance, self.baseline = mean[-1], variance[-1], baseline[-1]
+        self.last_value, self.run, self.drifting = values[-1], runs[-1], drifting[-1]
+
+        anomalies = []
+        for kind, flags, scores in [(Anomaly.SPIKE, spikes, z_scores), (Anomaly.FLATLINE, flatlines, runs),
+                                    (Anomaly.DRIFT, drifts, gaps)]:
+            for row, column in zip(*np.nonzero(flags)):
+                anomalies.append((int(row), int(column), kind, float(scores[row, column])))
+        anomalies.sort(key=lambda anomaly: anomaly[0])
+        return anomalies
+
+    def store(self, states, timestamp):
+        """
+        Copy the detector state to the AnomalyDetectorState objects it was created from.
+
+        Args:
+            states (list): AnomalyDetectorState of every metric, in the order of ``METRICS``.
+            timestamp (datetime): Time of the latest reading.
+        """
+        for index, state in enumerate(states):
+            state.count = int(self.count[index])
+            state.mean = float(self.mean[index])
+            state.variance = float(self.variance[index])
+            state.baseline = float(self.baseline[index])
+            state.last_value = None if np.isnan(self.last_value[index]) else float(self.last_value[index])
+            state.run = int(self.run[index])
+            state.drifting = bool(self.drifting[index])
+            state.timestamp = timestamp
+
+
+def _lock_states(system_ids):
+    """
+    Lock the detector states of the given systems, creating missing ones.
+
+    Returns:
+        dict: System id mapped to its AnomalyDetectorState objects in the order of ``METRICS``.
+    """
+    queryset = (
+        AnomalyDetectorState.objects.select_for_update()
+        .filter(system_id__in=system_ids).order_by('system_id', 'metric')
+    )
+    states = list(queryset)
+    if len(states) < len(system_ids) * len(METRICS):
+        AnomalyDetectorState.objects.bulk_create([
+            AnomalyDetectorState(system_id=system_id, metric=metric)
+            for system_id in system_ids for metric in METRICS
+        ], ignore_conflicts=True)
+        states = list(queryset.all())
+    grouped = defaultdict(dict)
+    for state in states:
+        grouped[state.system_id][state.metric] = state
+    return {system_id: [grouped[system_id][metric] for metric in METRICS] for system_id in system_ids}
+
+
+def detect(measurements):
+    """
+    Run the anomaly detectors of the systems of newly created measurements.
+
+    The detector states of the systems are locked until the transaction ends, so concurrent
+    writes to a system are processed one after the other. Readings older than the latest
+    reading processed for their system are skipped; ``backfill`` takes them into account.
+
+    Args:
+        measurements (list): Saved Measurement objects.
+
+    Returns:
+        list: Created Anomaly objects.
+    """
+    readings = defaultdict(list)
+    for measurement in measurements:
+        readings[measurement.system_id].append(measurement)
+    states = _lock_states(sorted(readings))
+    anomalies = []
+    for system_id, system_readings in readings.items():
+        system_states = states[system_id]
+        latest = system_states[0].timestamp
+        system_readings = sorted(
+            (measurement for measurement in system_readings if latest is None or measurement.timestamp >= latest),
+            key=lambda measurement: (measurement.timestamp, measurement.pk)
+        )
+        if not system_readings:
+            continue
+        detectors = Detectors(system_states)
+        values = np.array([[getattr(measurement, metric) for metric in METRICS] for measurement in system_readings],
+                          dtype=np.float64)
+        for row, column, kind, score in detectors.feed(values):
+            measurement = system_readings[row]
+            anomalies.append(Anomaly(
+                system_id=system_id, measurement_id=measurement.pk, kind=kind, metric=METRICS[column],
+                value=values[row, column], score=score, timestamp=measurement.timestamp,
+            ))
+        detectors.store(system_states, system_readings[-1].timestamp)
+    AnomalyDetectorState.objects.bulk_update(
+        [state for system_states in states.values() for state in system_states], Detectors.FIELDS + ['timestamp']
+    )
+    return Anomaly.objects.bulk_create(anomalies)
+
+
+def backfill(system_id, chunk_rows=CHUNK_ROWS):
+    """
+    Recompute the anomalies and detector state of a system from its whole history.
+
+    The history is read in chunks of NumPy arrays and each chunk is processed at once. The
+    detector state stays locked until the end, so writes to the system wait and continue from
+    the recomputed state.
+
+    Args:
+        system_id (int): Primary key of the system.
+        chunk_rows (int): Number of measurements read per chunk.
+
+    Returns:
+        tuple: Numbers of measurements processed and anomalies found.
+    """
+    with transaction.atomic():
+        states = _lock_states([system_id])[system_id]
+        for state in states:
+            for field in Detectors.FIELDS + ['timestamp']:
+                setattr(state, field, AnomalyDetectorState._meta.get_field(field).get_default())
+        Anomaly.objects.filter(system_id=system_id).delete()
+        detectors = Detectors(states)
+        processed = found = 0
+        latest = None
+        for ids, timestamps, values in read_series(system_id, METRICS, chunk_rows=chunk_rows, ids=True):
+            anomalies = [
+                Anomaly(system_id=system_id, measurement_id=int(ids[row]), kind=kind, metric=METRICS[column],
+                        value=values[row, column], score=score, timestamp=from_microseconds(timestamps[row]))
+                for row, column, kind, score in detectors.feed(values)
+            ]
+            Anomaly.objects.bulk_create(anomalies, batch_size=1000)
+            processed += len(ids)
+            found += len(anomalies)
+            latest = from_microseconds(timestamps[-1])
+        detectors.store(states, latest)
+        AnomalyDetectorState.objects.bulk_update(states, Detectors.FIELDS + ['timestamp'])
+    return processed, found
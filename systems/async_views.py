@@ -0,0 +1,326 @@
+import asyncio
+import time
+import weakref
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+
+from .authentication import DeviceKeyAuthMixin
+from .events import get_broker
+from .filters import MeasurementFilter
+from .metrics import SerializerMetricsMixin
+from .models import HydroponicSystem, Measurement
+from .pagination import MeasurementCursorPagination
+from .renderers import EventStreamRenderer
+from .serializers import MeasurementSerializer
+from .views import MeasurementBulkCreate
+
+# event loop -> semaphore limiting the requests using the database at the same time
+_database_slots = weakref.WeakKeyDictionary()
+
+
+def database_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _database_slots:
+        _database_slots[loop] = asyncio.Semaphore(settings.ASYNC_DATABASE_CONNECTIONS)
+    return _database_slots[loop]
+
+
+def release_connections():
+    """
+    Close the database connections of the current thread as the end of a request would, so they
+    are not held while the response is sent to a slow client.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+class SentWindow:
+    """
+    Ids of the measurements sent by a stream.
+
+    Ids are assigned when rows are inserted, not when they are committed, so a measurement can
+    become visible after measurements with higher ids were sent. Every id above ``floor`` is
+    therefore read again and sent if it was not yet. ``floor`` moves up to the highest id sent
+    ``lookback`` seconds ago, when transactions holding lower ids are assumed to be committed.
+    """
+
+    def __init__(self, floor, lookback):
+        self.floor = floor
+        self.lookback = lookback
+        self.sent = set()
+        # (monotonic time, highest id sent by then)
+        self.marks = deque()
+
+    def add(self, ids):
+        self.sent.update(ids)
+        self.marks.append((time.monotonic(), max(ids)))
+
+    def advance(self):
+        expired = time.monotonic() - self.lookback
+        while self.marks and self.marks[0][0] <= expired:
+            self.floor = max(self.floor, self.marks.popleft()[1])
+        self.sent = {pk for pk in self.sent if pk > self.floor}
+
+
+class AsyncAPIViewMixin:
+    """
+    Run a DRF view as a native async view under ASGI.
+
+    Handlers are coroutines using the async ORM. Authentication, permission and throttle checks
+    are the same as for the synchronous views and run in a worker thread, because the
+    authentication classes load the user synchronously.
+
+    The request body has been received by the time the view runs, so slow clients only hold a
+    coroutine. At most ``ASYNC_DATABASE_CONNECTIONS`` requests per event loop run their
+    database work at the same time; the others wait for a free slot.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            async with database_slots():
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+                if iscoroutinefunction(handler):
+                    response = await handler(request, *args, **kwargs)
+                else:
+                    response = await sync_to_async(handler)(request, *args, **kwargs)
+                await sync_to_async(release_connections)()
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncMeasurementList(SerializerMetricsMixin, AsyncAPIViewMixin, DeviceKeyAuthMixin, generics.GenericAPIView):
+    """
+    Async view for listing and creating measurements associated with hydroponic systems owned by the authenticated user.
+
+    Accepts the same filters, ordering, pagination and payloads as the synchronous measurement list.
+    """
+    serializer_class = MeasurementSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = MeasurementFilter
+    ordering_fields = ['timestamp', 'temperature', 'ph', 'tds']
+    pagination_class = MeasurementCursorPagination
+
+    def get_queryset(self):
+        """
+        Retrieve all measurements associated with hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of Measurement rows
+        """
+        queryset = self.scope_to_device(Measurement.objects.filter(system__owner=self.request.user))
+        if self.request.method == 'GET':
+            return queryset.values(*MeasurementSerializer.values_fields)
+        return queryset.select_related('system')
+
+    async def get(self, request, *args, **kwargs):
+        """
+        List a page of the filtered measurements.
+
+        :param request: Request instance
+        :return: Paginated response
+        """
+        # the system slug filter may load the systems of the request
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is None:
+            return Response(self.get_serializer([row async for row in queryset], many=True).data)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Validate and create a single measurement.
+
+        :param request: Request instance
+        :return: Response with the created measurement
+        """
+        serializer = self.get_serializer(data=request.data)
+        # resolving the system hyperlink may load the systems of the request
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        serializer.instance = await Measurement.objects.acreate(**serializer.validated_data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncMeasurementBulkCreate(AsyncAPIViewMixin, MeasurementBulkCreate):
+    """
+    Async view for creating many measurements for the authenticated user's hydroponic systems in one request.
+
+    Accepts the same payload and returns the same response as the synchronous bulk endpoint.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Validate every item and bulk create the valid ones.
+
+        :param request: Request instance
+        :return: Response with the number of created measurements and per-item errors
+        """
+        items = self.get_items(request)
+        # usually from the cache, loaded with a query otherwise
+        systems = await sync_to_async(self.get_systems)()
+        measurements, errors = self.validate_items(items, systems)
+        # bulk_create of Measurement is atomic and sends measurements_created itself
+        await Measurement.objects.abulk_create(measurements, batch_size=self.batch_size)
+        return self.get_result_response(measurements, errors)
+
+
+class MeasurementStream(SerializerMetricsMixin, AsyncAPIViewMixin, generics.GenericAPIView):
+    """
+    Server-Sent Events stream of the measurements created for the authenticated user's hydroponic systems.
+
+    Every ``measurements`` event carries the measurements committed since the previous event, in
+    the format of the measurement list. Writes arriving within ``coalesce_interval`` of each other
+    are sent as one event. Measurements committed after others with higher ids are still sent, if
+    within ``lookback`` seconds, see ``SentWindow``.
+
+    The event id is the id up to which all measurements were sent. Reconnecting clients resume
+    after the ``Last-Event-ID`` header or ``last_event_id`` parameter, which sends again what was
+    sent within ``lookback`` seconds before, so clients skip ids they already have. Resume points
+    older than the last ``max_backlog`` measurements of all systems are moved up to it. Without
+    one the stream starts with the next measurement created.
+    """
+    serializer_class = MeasurementSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [EventStreamRenderer]
+    coalesce_interval = 0.25
+    heartbeat_interval = 15
+    batch_size = 500
+    lookback = 30
+    max_backlog = 100_000
+    retry = 3000
+
+    def get_last_event_id(self, request):
+        """
+        Read the id of the last event received by the client.
+
+        :param request: Request instance
+        :return: Measurement id, or None for a new stream
+        """
+        value = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({'last_event_id': 'A valid integer is required.'})
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Open the event stream.
+
+        :param request: Request instance
+        :return: Streaming response with the events
+        """
+        last_id = self.get_last_event_id(request)
+        system_ids = {pk async for pk in HydroponicSystem.objects.filter(owner=request.user).values_list('pk', flat=True)}
+        newest_id = (await Measurement.objects.aaggregate(last_id=Max('pk')))['last_id'] or 0
+        # a stream resumes from at most max_backlog measurements (of all systems) ago
+        last_id = newest_id if last_id is None else max(last_id, newest_id - self.max_backlog)
+        response = StreamingHttpResponse(self.stream(system_ids, last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, system_ids, last_id):
+        """
+        Yield the events of the stream until the client disconnects.
+
+        :param system_ids: Primary keys of the user's systems
+        :param last_id: Id up to which all measurements were sent to the client
+        """
+        subscription = get_broker().subscribe()
+        foreign_ids = set()
+        window = SentWindow(last_id, self.lookback)
+        try:
+            yield f'retry: {self.retry}\n\n'
+            # the first round sends what was created since last_id, including while subscribing
+            notified = True
+            while True:
+                if notified:
+                    rows = await self.fetch(system_ids, window)
+                    while rows:
+                        window.add([row['id'] for row in rows])
+                        yield self.format_event(rows, window.floor)
+                        if len(rows) < self.batch_size:
+                            break
+                        # later ids of the window are read again in the next round
+                        rows = await self.fetch(system_ids, window, after=rows[-1]['id'])
+
+                changed = await subscription.wait(self.heartbeat_interval)
+                if not changed:
+                    yield ': keep-alive\n\n'
+                    notified = False
+                    continue
+                unknown = changed - system_ids - foreign_ids
+                if unknown:
+                    system_ids |= await self.owned(unknown)
+                    foreign_ids |= unknown - system_ids
+                notified = bool(changed & system_ids)
+                if notified:
+                    await asyncio.sleep(self.coalesce_interval)
+                    subscription.drain()
+        finally:
+            subscription.close()
+
+    async def owned(self, system_ids):
+        """
+        Select the systems owned by the user, e.g. systems created after the stream was opened.
+
+        :return: Set of primary keys
+        """
+        queryset = HydroponicSystem.objects.filter(owner=self.request.user, pk__in=system_ids).values_list('pk', flat=True)
+        async with database_slots():
+            owned = {pk async for pk in queryset}
+            await sync_to_async(release_connections)()
+        return owned
+
+    async def fetch(self, system_ids, window, after=None):
+        """
+        Read the next measurements above the window's floor that were not sent yet.
+
+        :param system_ids: Primary keys of the user's systems
+        :param window: SentWindow of the stream
+        :param after: Id of the last row of the previous batch, to read the next page
+        :return: List of at most ``batch_size`` rows of ``MeasurementSerializer.values_fields``
+        """
+        if not system_ids:
+            return []
+        window.advance()
+        queryset = (
+            Measurement.objects.filter(system_id__in=system_ids, pk__gt=max(window.floor, after or 0))
+            .exclude(pk__in=window.sent).order_by('pk')
+            .values(*MeasurementSerializer.values_fields)[:self.batch_size]
+        )
+        async with database_slots():
+            rows = [row async for row in queryset]
+            await sync_to_async(release_connections)()
+        return rows
+
+    def format_event(self, rows, last_id):
+        data = JSONRenderer().render(self.get_serializer(rows, many=True).data).decode()
+        return f'id: {last_id}\nevent: measurements\ndata: {data}\n\n'
@@ -0,0 +1,196 @@
+import hashlib
+import hmac
+import secrets
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+from rest_framework.settings import api_settings
+
+from .models import DeviceKey
+
+PREFIX_BYTES = 6
+SECRET_BYTES = 32
+# bounds the memory used by the principals of unknown keys sent by misbehaving clients
+MAX_CACHED_PRINCIPALS = 10000
+
+# key prefix -> (monotonic time of the lookup, DevicePrincipal, or None for unknown and revoked keys)
+_principals = {}
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def generate_key():
+    """
+    Generate a new device API key.
+
+    Returns:
+        tuple: Prefix identifying the key, the key itself and its hash.
+    """
+    prefix = secrets.token_hex(PREFIX_BYTES)
+    key = f'{prefix}.{secrets.token_urlsafe(SECRET_BYTES)}'
+    return prefix, key, hash_key(key)
+
+
+class DevicePrincipal:
+    """
+    Device API key reduced to what authenticating a request needs.
+
+    ``systems`` maps the slugs of the systems the key may use to their primary keys, so views
+    and serializers check them without a query.
+    """
+    __slots__ = ['pk', 'prefix', 'key_hash', 'user', 'systems', 'system_ids']
+
+    def __init__(self, key, systems):
+        self.pk = key.pk
+        self.prefix = key.prefix
+        self.key_hash = key.key_hash
+        self.user = key.owner
+        self.systems = systems
+        self.system_ids = frozenset(systems.values())
+
+
+def load_principal(prefix):
+    """
+    Load an active key of an active user with the systems of its owner it is scoped to.
+
+    Returns:
+        DevicePrincipal: Principal of the key, or None if there is no such key.
+    """
+    key = (
+        DeviceKey.objects.select_related('owner')
+        .filter(prefix=prefix, revoked_at__isnull=True, owner__is_active=True).first()
+    )
+    if key is None:
+        return None
+    systems = dict(key.systems.filter(owner_id=key.owner_id).values_list('slug', 'pk'))
+    DeviceKey.objects.filter(pk=key.pk).update(last_used_at=timezone.now())
+    return DevicePrincipal(key, systems)
+
+
+def get_principal(prefix):
+    """
+    Return the principal of a key prefix, loading it at most once per ``DEVICE_KEY_CACHE_TTL``.
+
+    Args:
+        prefix (str): Prefix of the key.
+
+    Returns:
+        DevicePrincipal: Principal of the key, or None if there is no such active key.
+    """
+    entry = _principals.get(prefix)
+    if entry is not None and time.monotonic() - entry[0] < settings.DEVICE_KEY_CACHE_TTL:
+        return entry[1]
+    principal = load_principal(prefix)
+    if len(_principals) >= MAX_CACHED_PRINCIPALS:
+        _principals.clear()
+    _principals[prefix] = (time.monotonic(), principal)
+    return principal
+
+
+def forget(prefixes):
+    """
+    Drop the cached principals of the given keys, e.g. after they were revoked.
+
+    Other processes pick up the change once their principals expire after ``DEVICE_KEY_CACHE_TTL``.
+
+    Args:
+        prefixes (iterable): Prefixes of the keys.
+    """
+    for prefix in prefixes:
+        _principals.pop(prefix, None)
+
+
+def forget_systems(system_ids):
+    """
+    Drop the cached principals scoped to any of the given systems, e.g. after one was renamed.
+
+    Args:
+        system_ids (iterable): Primary keys of the systems.
+    """
+    system_ids = set(system_ids)
+    forget([
+        prefix for prefix, (_, principal) in list(_principals.items())
+        if principal is not None and principal.system_ids & system_ids
+    ])
+
+
+def resolve(key):
+    """
+    Find the principal of a device API key.
+
+    Args:
+        key (str): Key sent by the device.
+
+    Returns:
+        DevicePrincipal: Principal of the key, or None if the key is not valid.
+    """
+    prefix, _, secret = key.partition('.')
+    if not secret or len(prefix) != 2 * PREFIX_BYTES:
+        return None
+    principal = get_principal(prefix)
+    if principal is None or not hmac.compare_digest(principal.key_hash, hash_key(key)):
+        return None
+    return principal
+
+
+def device_principal(request):
+    """
+    Return the DevicePrincipal a request was authenticated with, or None for other requests.
+    """
+    auth = getattr(request, 'auth', None)
+    return auth if isinstance(auth, DevicePrincipal) else None
+
+
+class DeviceKeyAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate devices with an ``Authorization: Api-Key <key>`` header.
+
+    The request is made as the owner of the key, with its DevicePrincipal as ``request.auth``.
+    """
+    keyword = 'Api-Key'
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid API key header.')
+        try:
+            key = header[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid API key header.')
+        principal = resolve(key)
+        if principal is None:
+            raise exceptions.AuthenticationFailed('Invalid or revoked API key.')
+        return principal.user, principal
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class DeviceKeyAuthMixin:
+    """
+    Accept device API keys on a view besides the default authentication.
+
+    Requests authenticated with a key are limited to the systems of the key: views scope their
+    querysets with ``scope_to_device``, and ``systems.ownership`` resolves systems to those of the key.
+    """
+    # appended, so unauthenticated requests are still answered by the first default class
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, DeviceKeyAuthentication]
+
+    def scope_to_device(self, queryset, field='system_id'):
+        """
+        Limit a queryset to the systems of the device key the request was authenticated with.
+
+        :param queryset: QuerySet to limit
+        :param field: Name of the system foreign key of the queryset's model
+        :return: Limited QuerySet, or the unchanged queryset for requests without a key
+        """
+        principal = device_principal(self.request)
+        if principal is None:
+            return queryset
+        return queryset.filter(**{f'{field}__in': principal.system_ids})
@@ -0,0 +1,241 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import HydroponicSystem
+
+CACHE_ALIAS = 'default'
+VERSION_TIMEOUT = None
+
+
+def user_version_key(user_id):
+    return f'systems:version:user:{user_id}'
+
+
+def system_version_key(slug):
+    return f'systems:version:system:{slug}'
+
+
+def owned_systems_version_key(user_id):
+    # bumped only when the set of the user's systems changes, unlike user_version_key
+    return f'systems:version:owned:{user_id}'
+
+
+def bump_versions(keys):
+    """
+    Increment the given version counters, invalidating every response cached under them.
+
+    Missing counters are started from the current time in milliseconds rather than from 1,
+    so a counter that was evicted never repeats a version of a response still in the cache.
+
+    Args:
+        keys (iterable): Version counter keys.
+    """
+    cache = caches[CACHE_ALIAS]
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, time.time_ns() // 1_000_000, timeout=VERSION_TIMEOUT):
+                cache.incr(key)
+
+
+def bump_for_systems(system_ids):
+    """
+    Invalidate the cached responses depending on the given systems and their owners, now and
+    once the current transaction is committed.
+
+    Args:
+        system_ids (iterable): Primary keys of the changed systems.
+    """
+    systems = HydroponicSystem.objects.filter(pk__in=set(system_ids)).values_list('slug', 'owner_id')
+    keys = []
+    for slug, owner_id in systems:
+        keys += [system_version_key(slug), user_version_key(owner_id)]
+    bump_versions(keys)
+    # other requests may cache the data they read before the commit under the new versions
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def get_versions(keys):
+    """
+    Read the given version counters, starting missing ones.
+
+    Args:
+        keys (list): Version counter keys.
+
+    Returns:
+        list: Current versions in the order of ``keys``.
+    """
+    cache = caches[CACHE_ALIAS]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns() // 1_000_000, timeout=VERSION_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def last_modified_for_owner(user):
+    """
+    Return the newest modification stamp of the user's systems.
+
+    Args:
+        user (User): Owner of the systems.
+
+    Returns:
+        datetime: Newest ``modified_at`` of the user's systems, or None if there are none.
+    """
+    systems = HydroponicSystem.objects.filter(owner=user)
+    return systems.aggregate(last_modified=Max('modified_at'))['last_modified']
+
+
+def to_primitive(data):
+    """
+    Convert serializer output into plain dicts, lists and strings that can be pickled cheaply.
+
+    Hyperlinks are ``str`` subclasses keeping a reference to the linked object, which must
+    not end up in the cache.
+    """
+    if isinstance(data, dict):
+        return {key: to_primitive(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [to_primitive(value) for value in data]
+    if isinstance(data, str):
+        return str(data)
+    return data
+
+
+class CachedResponseMixin:
+    """
+    Cache GET responses per user, query parameters and media type.
+
+    Cached responses are stored under the current values of the version counters returned by
+    ``get_cache_version_keys``; bumping one of the counters makes all dependent entries
+    unreachable. Responses carry ``ETag`` and ``Last-Modified`` headers, derived from
+    ``get_last_modified`` when the view provides a stamp and from the cache key otherwise,
+    and matching conditional requests are answered with 304 Not Modified.
+
+    Concurrent misses for the same key are collapsed: one request computes the response
+    while the others wait up to ``cache_lock_wait`` seconds for it to appear.
+    """
+    cache_timeout = 300
+    cache_lock_timeout = 10
+    cache_lock_wait = 2
+    cache_lock_poll = 0.05
+
+    def get_cache_version_keys(self):
+        """
+        Return the version counters the response depends on.
+
+        :return: List of version counter keys
+        """
+        return [user_version_key(self.request.user.pk)]
+
+    def get_last_modified(self):
+        """
+        Return a cheap modification stamp of the data behind the response, if there is one.
+
+        When a stamp is available it is used for the ``ETag`` and ``Last-Modified`` headers,
+        so conditional requests are answered before the cache or the view are consulted.
+
+        :return: Datetime of the last modification, or None
+        """
+        return None
+
+    def get_key_material(self, request):
+        return [
+            type(self).__name__,
+            str(request.user.pk),
+            # requests made with a device key see the systems of the key only
+            str(getattr(request.auth, 'pk', '')),
+            request.build_absolute_uri(request.path),
+            repr(sorted(request.query_params.lists())),
+            request.accepted_media_type or '',
+            repr(self.kwargs),
+        ]
+
+    def get_response_cache_key(self, request):
+        material = self.get_key_material(request) + list(map(str, get_versions(self.get_cache_version_keys())))
+        return 'systems:response:' + hashlib.sha256('|'.join(material).encode()).hexdigest()
+
+    def get_etag(self, request, cache_key, last_modified):
+        if last_modified is None:
+            digest = cache_key.rsplit(':', 1)[1]
+        else:
+            material = self.get_key_material(request) + [last_modified.isoformat()]
+            digest = hashlib.sha256('|'.join(material).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def etag_matches(self, request, etag):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is None:
+            return False
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+    def modified_since(self, request, last_modified):
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            return True
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is None or last_modified > if_modified_since
+
+    def with_validators(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        stamp = self.get_last_modified()
+        last_modified = int(stamp.timestamp()) if stamp is not None else None
+        cache = caches[CACHE_ALIAS]
+        key = self.get_response_cache_key(request)
+        etag = self.get_etag(request, key, stamp)
+        if self.etag_matches(request, etag) or (last_modified and not self.modified_since(request, last_modified)):
+            return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+        entry = cache.get(key) or self.wait_for_entry(cache, key)
+        if entry is not None:
+            data, cached_last_modified = entry
+            last_modified = last_modified or cached_last_modified
+            if not self.modified_since(request, last_modified):
+                return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+            return self.with_validators(Response(data), etag, last_modified)
+
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, timeout=self.cache_lock_timeout)
+        try:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            last_modified = last_modified or int(time.time())
+            cache.set(key, (to_primitive(response.data), last_modified), timeout=self.cache_timeout)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return self.with_validators(response, etag, last_modified)
+
+    def wait_for_entry(self, cache, key):
+        """
+        Wait for a response being computed by a concurrent request.
+
+        :return: Cached entry, or None if no other request is computing it or it took too long
+        """
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.cache_lock_wait
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(self.cache_lock_poll)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection
+
+from .models import HourlyMeasurementRollup, Measurement
+from .rollups import truncate
+
+CHUNK_ROWS = 200_000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_POSTGRES_EPOCH = (datetime(2000, 1, 1, tzinfo=dt_timezone.utc) - _EPOCH) // _MICROSECOND
+
+
+def to_microseconds(timestamp):
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def from_microseconds(value):
+    return _EPOCH + int(value) * _MICROSECOND
+
+
+def read_series(system_id, metrics, start=None, end=None, chunk_rows=CHUNK_ROWS, ids=False):
+    """
+    Read the measurements of a system as NumPy arrays, in chunks ordered by time.
+
+    Every chunk is fetched as a single ``bytea`` value of fixed size big endian records built
+    by PostgreSQL and decoded with ``numpy.frombuffer``, so no Python object is created per
+    row. Chunks are selected by keyset on ``(timestamp, id)``.
+
+    Args:
+        system_id (int): Primary key of the system.
+        metrics (list): Names of the metric columns to read.
+        start (datetime): Inclusive lower bound of the timestamps.
+        end (datetime): Exclusive upper bound of the timestamps.
+        chunk_rows (int): Number of rows per chunk.
+        ids (bool): Whether to yield the measurement ids (int64 array) first.
+
+    Yields:
+        tuple: Timestamps in microseconds since the epoch (int64 array of length n) and the
+        metric values (float64 array of shape (n, len(metrics))).
+    """
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    # timestamptz_send gives the internal microseconds since 2000-01-01
+    record = ' || '.join(['int8send(id)', 'timestamptz_send(timestamp)'] + [
+        f'float8send({connection.ops.quote_name(metric)})' for metric in metrics
+    ])
+    dtype = np.dtype([('id', '>i8'), ('timestamp', '>i8')] + [(metric, '>f8') for metric in metrics])
+    conditions = ['system_id = %s']
+    params = [system_id]
+    if start is not None:
+        conditions.append('timestamp >= %s')
+        params.append(start)
+    if end is not None:
+        conditions.append('timestamp < %s')
+        params.append(end)
+    last = None
+    with connection.cursor() as cursor:
+        while True:
+            keyset = []
+            if last is not None:
+                keyset = ['timestamp >= %s', '(timestamp > %s OR id > %s)']
+            sql = (
+                f'SELECT string_agg(record, \'\'::bytea) FROM ('
+                f'SELECT {record} AS record FROM {table} WHERE {" AND ".join(conditions + keyset)} '
+                f'ORDER BY timestamp, id LIMIT %s) AS chunk'
+            )
+            cursor.execute(sql, params + ([last[0], last[0], last[1]] if last else []) + [chunk_rows])
+            content = cursor.fetchone()[0]
+            if content is None:
+                return
+            rows = np.frombuffer(content, dtype=dtype)
+            values = np.column_stack([rows[metric] for metric in metrics]).astype(np.float64)
+            timestamps = rows['timestamp'].astype(np.int64) + _POSTGRES_EPOCH
+            yield (rows['id'].astype(np.int64), timestamps, values) if ids else (timestamps, values)
+            if len(rows) < chunk_rows:
+                return
+            last = (from_microseconds(rows['timestamp'][-1] + _POSTGRES_EPOCH), int(rows['id'][-1]))
+
+
+def read_hourly_series(system_id, metrics, start=None, end=None):
+    """
+    Read the hourly rollups of a system as a series of candidate points.
+
+    Every hour contributes two rows at its middle, one with the minimum and one with the
+    maximum of each metric, so downsampling them still picks the extremes of the raw series.
+    A year is under 18k rows, read in milliseconds.
+
+    Args:
+        system_id (int): Primary key of the system.
+        metrics (list): Names of the metrics to read.
+        start (datetime): Lower bound of the timestamps; the hour containing it is included.
+        end (datetime): Exclusive upper bound of the timestamps.
+
+    Returns:
+        tuple: Number of measurements covered, timestamps in microseconds (int64 array) and
+        metric values (float64 array of shape (n, len(metrics))).
+    """
+    rollups = HourlyMeasurementRollup.objects.filter(system_id=system_id).order_by('bucket')
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=truncate(start, 'hour'))
+    if end is not None:
+        rollups = rollups.filter(bucket__lt=end)
+    fields = [f'{metric}_min' for metric in metrics] + [f'{metric}_max' for metric in metrics]
+    rows = list(rollups.values_list('bucket', 'count', *fields))
+    if not rows:
+        return 0, np.empty(0, dtype=np.int64), np.empty((0, len(metrics)))
+    buckets, counts, *columns = zip(*rows)
+    middles = np.array([to_microseconds(bucket) for bucket in buckets], dtype=np.int64) + 1800 * 10 ** 6
+    extremes = np.array(columns, dtype=np.float64).T
+    values = np.empty((2 * len(rows), len(metrics)))
+    values[0::2] = extremes[:, :len(metrics)]
+    values[1::2] = extremes[:, len(metrics):]
+    return sum(counts), np.repeat(middles, 2), values
+
+
+class LTTB:
+    """
+    Streaming Largest-Triangle-Three-Buckets downsampling of metrics sharing a time axis.
+
+    The first and last points are always kept. The time between them is divided into
+    ``points - 2`` buckets of equal width, and every non-empty bucket contributes the point
+    forming the largest triangle with the point selected in the previous bucket and the
+    average of the next bucket. Each metric gets its own selection.
+
+    Rows are fed in time order with ``add``; only the rows of the last two buckets are kept,
+    so memory does not grow with the length of the series. The work within a bucket is
+    vectorized over its rows and all metrics at once.
+    """
+
+    def __init__(self, start, end, points, metrics_count):
+        """
+        Args:
+            start (int): Timestamp of the first row in microseconds.
+            end (int): Timestamp of the last row in microseconds.
+            points (int): Maximum number of points per metric, at least 3.
+            metrics_count (int): Number of metrics.
+        """
+        self.start = start
+        self.buckets = points - 2
+        self.width = max(end - start, 1) / self.buckets
+        self.metrics_count = metrics_count
+        self.timestamps = []
+        self.values = []
+        self.pending_t = np.empty(0, dtype=np.int64)
+        self.pending_v = np.empty((0, metrics_count))
+        self.selected = None
+
+    def add(self, timestamps, values):
+        """
+        Feed the next rows.
+
+        Args:
+            timestamps (numpy.ndarray): Timestamps in microseconds, ascending.
+            values (numpy.ndarray): Metric values of shape (n, metrics_count).
+        """
+        if not len(timestamps):
+            return
+        if self.selected is None:
+            self.select(np.full(self.metrics_count, timestamps[0]), values[0].copy())
+            timestamps, values = timestamps[1:], values[1:]
+        self.pending_t = np.concatenate([self.pending_t, timestamps])
+        self.pending_v = np.concatenate([self.pending_v, values])
+        self.reduce(final=False)
+
+    def finish(self):
+        """
+        Select the points of the remaining buckets and the last point.
+
+        Returns:
+            tuple: Selected timestamps in microseconds and values, both of shape
+            (points per metric, metrics_count).
+        """
+        if len(self.pending_t):
+            last_t, last_v = self.pending_t[-1], self.pending_v[-1].copy()
+            self.pending_t, self.pending_v = self.pending_t[:-1], self.pending_v[:-1]
+            self.reduce(final=True, last=(np.float64(last_t - self.start), last_v))
+            self.select(np.full(self.metrics_count, last_t), last_v)
+        if not self.timestamps:
+            return np.empty((0, self.metrics_count), dtype=np.int64), np.empty((0, self.metrics_count))
+        return np.vstack(self.timestamps), np.vstack(self.values)
+
+    def select(self, timestamps, values):
+        self.timestamps.append(timestamps)
+        self.values.append(values)
+        self.selected = (timestamps - self.start).astype(np.float64), values
+
+    def reduce(self, final, last=None):
+        """
+        Select the points of the buckets whose next bucket is complete.
+        """
+        if not len(self.pending_t):
+            return
+        buckets = np.minimum((self.pending_t - self.start) // self.width, self.buckets - 1)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        ends = np.append(starts[1:], len(buckets))
+        # the last bucket may still grow, and the one before needs its average
+        ready = len(starts) if final else len(starts) - 2
+        if ready <= 0:
+            return
+        offsets = (self.pending_t - self.start).astype(np.float64)
+        counts = (ends - starts)[:, None]
+        mean_t = np.add.reduceat(offsets, starts) / counts[:, 0]
+        mean_v = np.add.reduceat(self.pending_v, starts, axis=0) / counts
+        a_t, a_v = self.selected
+        for bucket in range(ready):
+            if bucket + 1 < len(starts):
+                c_t, c_v = mean_t[bucket + 1], mean_v[bucket + 1]
+            else:
+                c_t, c_v = last
+            rows = slice(starts[bucket], ends[bucket])
+            t = offsets[rows][:, None]
+            v = self.pending_v[rows]
+            areas = np.abs((a_t - c_t) * (v - a_v) - (a_t - t) * (c_v - a_v))
+            chosen = areas.argmax(axis=0)
+            columns = np.arange(self.metrics_count)
+            a_t, a_v = t[chosen, 0], v[chosen, columns]
+            self.timestamps.append(self.pending_t[rows][chosen])
+            self.values.append(a_v)
+        self.selected = (a_t, a_v)
+        keep = starts[ready] if ready < len(starts) else len(self.pending_t)
+        self.pending_t, self.pending_v = self.pending_t[keep:], self.pending_v[keep:]
+
+
+def downsample(chunks, start, end, points, metrics_count):
+    """
+    Downsample a chunked series with ``LTTB``.
+
+    Args:
+        chunks (iterable): ``(timestamps, values)`` chunks as yielded by ``read_series``.
+        start (int): Timestamp of the first row in microseconds.
+        end (int): Timestamp of the last row in microseconds.
+        points (int): Maximum number of points per metric.
+        metrics_count (int): Number of metrics.
+
+    Returns:
+        tuple: Number of rows read, selected timestamps and values.
+    """
+    sampler = LTTB(start, end, points, metrics_count)
+    count = 0
+    for timestamps, values in chunks:
+        count += len(timestamps)
+        sampler.add(timestamps, values)
+    return (count,) + sampler.finish()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import select
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'systems_measurements'
+
+
+class Subscription:
+    """
+    Receiver of the notifications of a broker in one event loop.
+
+    Notifications arriving before the subscriber gets to them are merged, so a burst of writes
+    wakes the subscriber up once with the union of the changed systems.
+    """
+
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.pending = set()
+        self.ready = asyncio.Event()
+
+    def notify(self, system_ids):
+        """
+        Queue a notification; safe to call from any thread.
+
+        Args:
+            system_ids (set): Primary keys of the systems with new measurements.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._add, system_ids)
+        except RuntimeError:
+            # the event loop of the subscriber is gone
+            self.close()
+
+    def _add(self, system_ids):
+        self.pending.update(system_ids)
+        self.ready.set()
+
+    async def wait(self, timeout=None):
+        """
+        Wait for notifications.
+
+        Args:
+            timeout (float): Seconds to wait at most.
+
+        Returns:
+            set: Primary keys of the systems notified since the last call, empty on timeout.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+        system_ids, self.pending = self.pending, set()
+        self.ready.clear()
+        return system_ids
+
+    def drain(self):
+        """
+        Discard the notifications received so far.
+        """
+        self.pending = set()
+        self.ready.clear()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Publish notifications about new measurements to subscribers of the same process.
+
+    Only wakeups carrying system ids are published; subscribers read the measurements from
+    the database, which also makes resuming from an event id possible. Use ``PostgresBroker``
+    when the application runs in several processes.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def publish(self, system_ids):
+        """
+        Notify the subscribers about new measurements of the given systems.
+
+        Args:
+            system_ids (iterable): Primary keys of the systems.
+        """
+        self.deliver(set(system_ids))
+
+    def deliver(self, system_ids):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.notify(system_ids)
+
+    def subscribe(self):
+        """
+        Subscribe the running event loop to notifications.
+
+        Returns:
+            Subscription: Subscription to wait on; close it when done.
+        """
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Publish notifications through PostgreSQL ``LISTEN``/``NOTIFY`` to subscribers of all processes.
+
+    Each process runs one listener thread with its own connection, started with the first
+    subscription, which hands notifications to the local subscribers.
+    """
+    poll_interval = 5
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def publish(self, system_ids):
+        payload = ','.join(str(system_id) for system_id in sorted(set(system_ids)))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+
+    def subscribe(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self.listen, name='measurement-events', daemon=True)
+                self.listener.start()
+        return super().subscribe()
+
+    def listen(self):
+        listener = connection.get_new_connection(connection.get_connection_params())
+        listener.autocommit = True
+        try:
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                if select.select([listener], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                listener.poll()
+                system_ids = set()
+                while listener.notifies:
+                    notification = listener.notifies.pop(0)
+                    system_ids.update(int(value) for value in notification.payload.split(',') if value)
+                if system_ids:
+                    self.deliver(system_ids)
+        except Exception:
+            logger.exception('Measurement event listener stopped')
+        finally:
+            listener.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the broker configured by ``MEASUREMENT_EVENTS_BROKER``.
+
+    Returns:
+        InProcessBroker: Broker instance shared by the process.
+    """
+    return import_string(settings.MEASUREMENT_EVENTS_BROKER)()
@@ -0,0 +1,140 @@
+import csv
+import json
+import re
+import zlib
+
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+
+EXPORT_FIELDS = ['id', 'system', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+_timestamp_field = serializers.DateTimeField()
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Read measurements for an export with a server-side cursor.
+
+    Args:
+        queryset (QuerySet): Filtered Measurement queryset.
+        chunk_size (int): Number of rows fetched from the cursor at a time.
+
+    Yields:
+        tuple: Values of ``EXPORT_FIELDS``, with the system slug and an ISO 8601 timestamp.
+    """
+    rows = queryset.values_list('id', 'system__slug', 'temperature', 'ph', 'tds', 'description', 'timestamp')
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield row[:-1] + (_timestamp_field.to_representation(row[-1]),)
+
+
+class _LineBuffer:
+    """
+    File-like object handing out what ``csv.writer`` writes to it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """
+    Encode rows as CSV lines, header first.
+
+    Args:
+        rows (iterable): Tuples of ``EXPORT_FIELDS`` values.
+
+    Yields:
+        str: CSV lines.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    """
+    Encode rows as newline delimited JSON objects.
+
+    Args:
+        rows (iterable): Tuples of ``EXPORT_FIELDS`` values.
+
+    Yields:
+        str: JSON lines.
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """
+    Join lines into UTF-8 chunks of about ``size`` bytes, so the server does not write every
+    line separately.
+
+    Args:
+        lines (iterable): Text lines.
+        size (int): Approximate chunk size in bytes.
+
+    Yields:
+        bytes: Encoded chunks.
+    """
+    chunk = []
+    length = 0
+    for line in lines:
+        encoded = line.encode('utf-8')
+        chunk.append(encoded)
+        length += len(encoded)
+        if length >= size:
+            yield b''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def gzipped(chunks, level=6):
+    """
+    Compress a stream of chunks into a gzip stream on the fly.
+
+    Args:
+        chunks (iterable): Byte chunks.
+        level (int): Compression level.
+
+    Yields:
+        bytes: Compressed chunks.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def in_thread(chunks):
+    """
+    Iterate over chunks from async code, producing every chunk in the thread of the request.
+
+    ASGI servers read a synchronous streaming response whole before sending any of it, so
+    exports are handed to them as an async iterator, still reading the rows one chunk at a
+    time from the same server-side cursor.
+
+    Args:
+        chunks (iterable): Byte chunks, produced with database queries.
+
+    Yields:
+        bytes: The chunks.
+    """
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def accepts_gzip(request):
+    return bool(_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
@@ -1,7 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as django_filters
 from django_filters.widgets import RangeWidget
 
-from .models import Measurement, HydroponicSystem
+from .models import AlertEvent, Anomaly, Measurement, HydroponicSystem
+from .ownership import for_request
 
 
 class HydroponicSystemFilter(django_filters.FilterSet):
@@ -14,15 +16,79 @@ class HydroponicSystemFilter(django_filters.FilterSet):
         }
 
 
-class MeasurementFilter(django_filters.FilterSet):
+class SystemSlugFilterSet(django_filters.FilterSet):
+    """
+    Filter set of a model belonging to a system, filtering by the slug of the system.
+
+    The slug is resolved with the systems of the request, so the filter compares ``system_id``
+    instead of joining the system table.
+    """
+    system__slug = django_filters.CharFilter(method='filter_system_slug')
+
+    def filter_system_slug(self, queryset, name, value):
+        if self.request is None:
+            return queryset.filter(system__slug=value)
+        return queryset.filter(system_id=for_request(self.request).systems.get(value))
+
+
+class MeasurementFilter(SystemSlugFilterSet):
     timestamp = django_filters.DateTimeFromToRangeFilter(
         widget=RangeWidget(attrs={'type': 'date'}))
     temperature = django_filters.RangeFilter()
     ph = django_filters.RangeFilter()
     tds = django_filters.RangeFilter()
+    anomaly = django_filters.BooleanFilter(method='filter_anomalies')
+    anomaly_kind = django_filters.ChoiceFilter(choices=Anomaly.KIND_CHOICES, method='filter_anomalies')
+    anomaly_metric = django_filters.ChoiceFilter(choices=Anomaly.METRIC_CHOICES, method='filter_anomalies')
 
     class Meta:
         model = Measurement
         fields = {
-            'system__name': ['icontains']
+            'system__name': ['icontains'],
+        }
+
+    def filter_anomalies(self, queryset, name, value):
+        # the anomaly filters describe a single anomaly, they are applied together in filter_queryset
+        return queryset
+
+    def filter_queryset(self, queryset):
+        """
+        Filter the measurements, keeping those with (or with ``anomaly=false``, without) an
+        anomaly of the requested ``anomaly_kind`` and ``anomaly_metric``.
+        """
+        queryset = super().filter_queryset(queryset)
+        data = self.form.cleaned_data
+        conditions = {
+            field: data[parameter] for field, parameter in [('kind', 'anomaly_kind'), ('metric', 'anomaly_metric')]
+            if data.get(parameter)
+        }
+        if not conditions and data.get('anomaly') is None:
+            return queryset
+        anomalies = Exists(Anomaly.objects.filter(measurement_id=OuterRef('pk'), **conditions))
+        return queryset.filter(anomalies if data.get('anomaly') is not False else ~anomalies)
+
+
+class AlertEventFilter(SystemSlugFilterSet):
+    timestamp = django_filters.DateTimeFromToRangeFilter(
+        widget=RangeWidget(attrs={'type': 'date'}))
+
+    class Meta:
+        model = AlertEvent
+        fields = {
+            'rule': ['exact'],
+            'kind': ['exact'],
+            'metric': ['exact'],
+        }
+
+
+class AnomalyFilter(SystemSlugFilterSet):
+    timestamp = django_filters.DateTimeFromToRangeFilter(
+        widget=RangeWidget(attrs={'type': 'date'}))
+
+    class Meta:
+        model = Anomaly
+        fields = {
+            'kind': ['exact'],
+            'metric': ['exact'],
+            'measurement_id': ['exact'],
         }
@@ -0,0 +1,98 @@
+import csv
+import json
+
+MAX_LINE_LENGTH = 64 * 1024
+
+
+def iter_lines(stream, max_line_length=MAX_LINE_LENGTH):
+    """
+    Read a byte stream line by line.
+
+    Only one line is held in memory at a time, and the next line is read only after the
+    caller has consumed the previous one, so a slow consumer slows down the upload instead
+    of buffering it.
+
+    Args:
+        stream: File-like object with a ``readline`` method, or None for an empty body.
+        max_line_length (int): Maximum accepted length of a line in bytes.
+
+    Yields:
+        tuple: Line number and decoded line, or None if the line is longer than allowed.
+    """
+    if stream is None:
+        return
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_length + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_length:
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_length + 1)
+            yield line_number, None
+            continue
+        yield line_number, line.decode('utf-8', errors='replace')
+
+
+def parse_ndjson(lines):
+    """
+    Parse newline delimited JSON, one measurement object per line.
+
+    Args:
+        lines: Iterable of line numbers and lines as produced by ``iter_lines``.
+
+    Yields:
+        tuple: Line number, parsed row (or None) and parse errors (or None).
+    """
+    for line_number, line in lines:
+        if line is None:
+            yield line_number, None, {'non_field_errors': ['Line is too long.']}
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, {'non_field_errors': ['Invalid JSON.']}
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield line_number, row, None
+
+
+def parse_csv(lines):
+    """
+    Parse CSV with a header line naming the measurement fields.
+
+    Args:
+        lines: Iterable of line numbers and lines as produced by ``iter_lines``.
+
+    Yields:
+        tuple: Line number, parsed row (or None) and parse errors (or None).
+    """
+    header = None
+    for line_number, line in lines:
+        if line is None:
+            yield line_number, None, {'non_field_errors': ['Line is too long.']}
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield line_number, None, {
+                'non_field_errors': [f'Expected {len(header)} columns, got {len(values)}.']
+            }
+            continue
+        yield line_number, dict(zip(header, values)), None
+
+
+PARSERS = {
+    'application/x-ndjson': parse_ndjson,
+    'application/jsonl': parse_ndjson,
+    'text/csv': parse_csv,
+}
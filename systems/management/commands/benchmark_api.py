@@ -0,0 +1,128 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from systems.models import HydroponicSystem, Measurement
+from systems.tests import benchmarks
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Seed a separate database with users, systems and measurements and measure the p50/p99 latency, '
+            'queries and peak memory of every API endpoint. Write the results as JSON to compare commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Fraction of the full data set of {benchmarks.SYSTEMS} systems and '
+                                 f'{benchmarks.MEASUREMENTS} measurements to seed, e.g. 0.01 for a quick run.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated measurements.')
+        parser.add_argument('--workers', type=int, default=1, help='Number of processes seeding measurements.')
+        parser.add_argument('--iterations', type=int, default=50, help='Number of timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=3, help='Number of untimed requests per endpoint.')
+        parser.add_argument('--only', action='append', metavar='NAME',
+                            help='Only measure this case. Can be given several times.')
+        parser.add_argument('--cached', action='store_true',
+                            help='Let GET requests be served from the response cache.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the seeded database for the next run, and reuse it if it exists.')
+        parser.add_argument('--output', help='Path of the JSON file to write the results to.')
+        parser.add_argument('--compare', metavar='PATH', help='JSON results of an earlier run to compare with.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative p50 latency or memory increase reported as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if a regression was found.')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)
+        test_settings = connection.settings_dict['TEST']
+        test_settings['NAME'] = test_settings.get('NAME') or f"benchmark_{connection.settings_dict['NAME']}"
+        old_name = connection.settings_dict['NAME']
+        # measured like in production, as the test runner does
+        setup_test_environment(debug=False)
+        # serializing a seeded database for test case rollbacks would read all of it
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            result = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if previous is not None:
+            rows = benchmarks.compare(previous, result, options['threshold'])
+            self.write_comparison(rows, previous)
+            if options['fail_on_regression'] and any(regressed for _, _, regressed in rows):
+                raise CommandError('Regressions found.')
+
+    def run_benchmarks(self, options):
+        if User.objects.exists():
+            self.stdout.write('Reusing the seeded database.')
+        else:
+            self.stdout.write(f"Seeding at scale {options['scale']}...")
+            seeded = benchmarks.seed(options['scale'], options['seed'], options['workers'])
+            self.stdout.write(', '.join(f'{count} {name}' for name, count in seeded.items()))
+
+        fixture = benchmarks.load_fixture()
+        try:
+            cases = [
+                case for case in benchmarks.cases(fixture) if not options['only'] or case.name in options['only']
+            ]
+            results = []
+            for case in cases:
+                measured = benchmarks.measure(case, fixture, options['iterations'], options['warmup'],
+                                              cached=options['cached'])
+                results.append(measured)
+                self.stdout.write(
+                    f"{case.name:32} {measured['p50_ms']:9.2f} ms p50 {measured['p99_ms']:9.2f} ms p99 "
+                    f"{measured['queries']:5g} queries {measured['peak_memory_kib']:9.1f} KiB "
+                    f"status {','.join(map(str, measured['status']))}"
+                )
+            for name, reason in benchmarks.SKIPPED.items():
+                self.stdout.write(f'{name:32} skipped: {reason}')
+        finally:
+            fixture['device_key'].delete()
+
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'cached': options['cached'],
+                'systems': HydroponicSystem.objects.count(),
+                'measurements': Measurement.objects.count(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+            'skipped': benchmarks.SKIPPED,
+        }
+
+    def write_comparison(self, rows, previous):
+        self.stdout.write(f"Compared with {previous['meta'].get('commit') or 'the earlier run'}:")
+        for name, changes, regressed in rows:
+            (p50_before, p50), _, (queries_before, queries), (memory_before, memory) = changes.values()
+            line = (f'{name:32} p50 {p50_before:9.2f} -> {p50:9.2f} ms ({(p50 / p50_before - 1) * 100:+6.1f}%) '
+                    f'queries {queries_before:g} -> {queries:g} memory {memory_before} -> {memory} KiB')
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
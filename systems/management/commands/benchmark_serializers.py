@@ -0,0 +1,49 @@
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from systems.models import HydroponicSystem, Measurement
+from systems.serializers import LastMeasurementsSerializer, MeasurementSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compare the per-row cost of serializing measurements from model instances '
+            'and from values() rows. Works on in-memory rows and does not touch the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows serialized per run.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of runs; the fastest one is reported.')
+        parser.add_argument('--host', default='localhost', help='Host used to build absolute URLs.')
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get(reverse('systems:measurement-list'), HTTP_HOST=options['host']))
+        request.user = User(pk=1, username='benchmark')
+        context = {'request': request}
+        now = timezone.now()
+        system = HydroponicSystem(pk=1, name='Benchmark', slug='benchmark')
+        instances = [
+            Measurement(pk=pk, system=system, temperature=21.5, ph=6.1, tds=540.0,
+                        description='benchmark', timestamp=now)
+            for pk in range(1, options['rows'] + 1)
+        ]
+        rows = [
+            {'id': m.pk, 'system__slug': system.slug, 'temperature': m.temperature, 'ph': m.ph,
+             'tds': m.tds, 'description': m.description, 'timestamp': m.timestamp}
+            for m in instances
+        ]
+
+        for serializer_class in (MeasurementSerializer, LastMeasurementsSerializer):
+            timings = {}
+            for label, data in (('instances', instances), ('values', rows)):
+                run = lambda: serializer_class(data, many=True, context=context).data  # noqa: E731
+                timings[label] = min(timeit.repeat(run, number=1, repeat=options['repeat'])) / len(data)
+            self.stdout.write(
+                f"{serializer_class.__name__}: {timings['instances'] * 1e6:.1f} us/row from instances, "
+                f"{timings['values'] * 1e6:.1f} us/row from values() rows "
+                f"({timings['instances'] / timings['values']:.1f}x)"
+            )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from systems import retention
+from systems.models import HydroponicSystem
+
+
+class Command(BaseCommand):
+    help = ('Compact the raw measurements older than the retention period of their hydroponic system: '
+            'summarize them in the hourly and daily rollups, then delete them in small batches. '
+            'Safe to interrupt, the next run continues where it stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--system', action='append', dest='systems', metavar='SLUG',
+                            help='Only compact this system. Can be given several times.')
+        parser.add_argument('--batch-size', type=int, default=retention.BATCH_SIZE,
+                            help='Number of measurements deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between delete batches, to leave room for other writes.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the measurements that would be compacted.')
+
+    def handle(self, *args, **options):
+        systems = HydroponicSystem.objects.filter(retention_days__isnull=False).order_by('pk')
+        if options['systems']:
+            systems = systems.filter(slug__in=options['systems'])
+        total = 0
+        for system in systems:
+            if options['dry_run']:
+                plan = retention.plan(system)
+                total += plan['count']
+                if plan['count']:
+                    self.stdout.write(
+                        f"{system.slug}: would compact {plan['count']} measurements from "
+                        f"{plan['oldest']:%Y-%m-%d} until {plan['cutoff']:%Y-%m-%d}"
+                    )
+                continue
+            started = time.monotonic()
+            deleted = 0
+            for compacted_until, day_deleted in retention.compact(
+                system, batch_size=options['batch_size'], pause=options['pause']
+            ):
+                deleted += day_deleted
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{system.slug}: compacted until {compacted_until:%Y-%m-%d}, deleted {deleted} '
+                    f'measurements ({deleted / elapsed if elapsed else 0:.0f}/s)'
+                )
+            total += deleted
+        action = 'Would compact' if options['dry_run'] else 'Compacted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {total} measurements.'))
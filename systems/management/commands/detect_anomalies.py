@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from systems import anomalies
+from systems.downsampling import CHUNK_ROWS
+from systems.models import HydroponicSystem
+
+
+class Command(BaseCommand):
+    help = ('Recompute the anomalies and anomaly detector state of hydroponic systems from their whole '
+            'measurement history, e.g. after changing the detector parameters.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--system', action='append', dest='systems', metavar='SLUG',
+                            help='Only process this system. Can be given several times.')
+        parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                            help='Number of measurements read and processed at once.')
+
+    def handle(self, *args, **options):
+        systems = HydroponicSystem.objects.order_by('pk')
+        if options['systems']:
+            systems = systems.filter(slug__in=options['systems'])
+        for pk, slug in systems.values_list('pk', 'slug'):
+            started = time.monotonic()
+            processed, found = anomalies.backfill(pk, chunk_rows=options['chunk_rows'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{slug}: {processed} measurements, {found} anomalies in {time.monotonic() - started:.1f} s'
+            ))
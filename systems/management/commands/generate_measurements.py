@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from systems import rollups, snapshots, synthetic
+from systems.models import HydroponicSystem
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic measurements for load tests: daily temperature curves, pH drift and TDS '
+            'dosing events. Rows are generated with NumPy and written with COPY, optionally in parallel. '
+            'The same --seed and --end give the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--system', action='append', dest='systems', metavar='SLUG',
+                            help='Generate measurements of this existing system. Can be given several times.')
+        parser.add_argument('--create-systems', type=int, default=0, metavar='N',
+                            help='Create N new systems of --owner and generate their measurements.')
+        parser.add_argument('--owner', help='Username of the owner of the created systems.')
+        parser.add_argument('--count', type=int, default=10000, help='Number of measurements per system.')
+        parser.add_argument('--days', type=float, default=30, help='Days covered by the measurements of a system.')
+        parser.add_argument('--end', help='ISO 8601 time of the last measurements, the current time by default.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated values.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes writing in parallel (PostgreSQL only).')
+        parser.add_argument('--batch-size', type=int, default=100_000, help='Approximate number of rows per COPY.')
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help='Do not rebuild the rollups and snapshots of the systems afterwards.')
+
+    def handle(self, *args, **options):
+        end = None
+        if options['end']:
+            end = parse_datetime(options['end'])
+            if end is None or end.tzinfo is None:
+                raise CommandError('--end must be an ISO 8601 time with a time zone, e.g. 2024-06-01T00:00:00Z.')
+
+        systems = []
+        if options['systems']:
+            systems = list(HydroponicSystem.objects.filter(slug__in=options['systems']).order_by('pk'))
+            missing = set(options['systems']) - {system.slug for system in systems}
+            if missing:
+                raise CommandError(f"Unknown systems: {', '.join(sorted(missing))}.")
+        if options['create_systems']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError('--create-systems requires the --owner username of an existing user.')
+            systems += [
+                HydroponicSystem.objects.create(owner=owner, name=f'Synthetic {index + 1}')
+                for index in range(options['create_systems'])
+            ]
+        if not systems:
+            raise CommandError('Give existing systems with --system or create them with --create-systems.')
+
+        started = time.perf_counter()
+        created = synthetic.generate_measurements(
+            systems, options['count'], end=end, period=timedelta(days=options['days']), seed=options['seed'],
+            batch_size=options['batch_size'], workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} measurements of {len(systems)} systems in {elapsed:.1f} s ({created / elapsed:.0f} rows/s)'
+        ))
+        if not options['skip_rollups']:
+            system_ids = [system.pk for system in systems]
+            rollups.rebuild(system_ids=system_ids)
+            snapshots.refresh(system_ids)
+            self.stdout.write('Rebuilt the rollups and snapshots.')
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import ssl
+import time
+from collections import Counter
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.utils.crypto import get_random_string
+
+SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Open many concurrent connections against an endpoint and report throughput and latency. '
+            'Run it against the server under WSGI (e.g. runserver) and under ASGI (uvicorn), or against '
+            'the sync and async endpoints, to compare how many slow clients each can hold.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Absolute URL of the endpoint, e.g. http://localhost:8000/api/async/measurements/')
+        parser.add_argument('--concurrency', type=int, default=100, help='Number of concurrent connections.')
+        parser.add_argument('--requests', type=int, default=1000, help='Total number of requests.')
+        parser.add_argument('--method', default='GET', help='HTTP method.')
+        parser.add_argument('--data', default=None, help='JSON request body, e.g. for the bulk endpoint.')
+        parser.add_argument('--user', help='Username to authenticate as. A session is created for the user up front, '
+                                           'so the test does not measure password hashing.')
+        parser.add_argument('--trickle', type=float, default=0,
+                            help='Seconds over which the request body is sent, simulating slow sensor uplinks.')
+        parser.add_argument('--timeout', type=float, default=30, help='Timeout of a single request in seconds.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise CommandError('Expected an absolute http(s) URL.')
+        body = json.dumps(json.loads(options['data'])).encode() if options['data'] else b''
+        headers = {
+            'Host': url.netloc,
+            'Connection': 'close',
+            'Accept': 'application/json',
+            'Content-Length': str(len(body)),
+        }
+        if body:
+            headers['Content-Type'] = 'application/json'
+        if options['user']:
+            session_key, csrf_token = self.create_session(options['user'])
+            headers['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={session_key}; {settings.CSRF_COOKIE_NAME}={csrf_token}'
+            headers['X-CSRFToken'] = csrf_token
+            headers['Referer'] = f'{url.scheme}://{url.netloc}/'
+        path = url.path or '/'
+        if url.query:
+            path = f'{path}?{url.query}'
+        head = f"{options['method'].upper()} {path} HTTP/1.1\r\n"
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+
+        started = time.perf_counter()
+        results = asyncio.run(self.run(url, head.encode(), body, options))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for outcome, latency in results if isinstance(outcome, int)]
+        outcomes = Counter(outcome for outcome, _ in results)
+        self.stdout.write(f"{len(results)} requests in {elapsed:.2f} s with {options['concurrency']} connections "
+                          f'({len(results) / elapsed:.1f} req/s)')
+        for outcome, count in sorted(outcomes.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f'  {outcome}: {count}')
+        if latencies:
+            self.stdout.write(
+                f'  latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+                f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms, '
+                f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms, '
+                f'max {max(latencies) * 1000:.1f} ms'
+            )
+
+    def create_session(self, username):
+        """
+        Create a logged in session for the user.
+
+        :return: Session key and CSRF token
+        """
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{username}" does not exist.')
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key, get_random_string(CSRF_SECRET_LENGTH)
+
+    async def run(self, url, head, body, options):
+        remaining = options['requests']
+        results = []
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                results.append(await self.request(url, head, body, options))
+
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        return results
+
+    async def request(self, url, head, body, options):
+        """
+        Send one request over a new connection.
+
+        :return: Status code or error name, and the latency in seconds
+        """
+        started = time.perf_counter()
+        try:
+            outcome = await asyncio.wait_for(self.exchange(url, head, body, options), options['timeout'])
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+        except OSError as exc:
+            outcome = type(exc).__name__
+        return outcome, time.perf_counter() - started
+
+    async def exchange(self, url, head, body, options):
+        secure = url.scheme == 'https'
+        reader, writer = await asyncio.open_connection(
+            url.hostname, url.port or (443 if secure else 80), ssl=ssl.create_default_context() if secure else None
+        )
+        try:
+            writer.write(head)
+            if options['trickle'] and body:
+                pieces = 10
+                size = -(-len(body) // pieces)
+                for start in range(0, len(body), size):
+                    writer.write(body[start:start + size])
+                    await writer.drain()
+                    await asyncio.sleep(options['trickle'] / pieces)
+            else:
+                writer.write(body)
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        try:
+            return int(status_line.split()[1])
+        except (IndexError, ValueError):
+            return 'bad response'
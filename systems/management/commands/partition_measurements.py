@@ -0,0 +1,48 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from systems import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage monthly range partitions of the measurement table (PostgreSQL only). '
+        'Run once with --convert to partition the table, then regularly to create '
+        'future partitions and expire old ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert the existing measurement table into a partitioned table.')
+        parser.add_argument('--attach-legacy', action='store_true',
+                            help='With --convert, attach the existing table as one partition instead of copying it.')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Number of future monthly partitions to keep ready.')
+        parser.add_argument('--retention-months', type=int,
+                            help='Detach partitions holding only rows older than this many months.')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop expired partitions instead of only detaching them.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the partitions that would expire.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                partitions.convert(months_ahead=options['months_ahead'], attach_legacy=options['attach_legacy'])
+                self.stdout.write(self.style.SUCCESS('Converted the measurement table into a partitioned table.'))
+            elif not partitions.is_partitioned():
+                raise CommandError('The measurement table is not partitioned, run with --convert first.')
+            else:
+                for name in partitions.ensure_partitions(months_ahead=options['months_ahead']):
+                    self.stdout.write(f'Created {name}')
+        except partitions.PartitioningError as exc:
+            raise CommandError(exc)
+
+        if options['retention_months'] is not None:
+            current_month = partitions.month_start(datetime.now(dt_timezone.utc))
+            cutoff = partitions.add_months(current_month, -options['retention_months'])
+            expired = partitions.expire_partitions(cutoff, drop=options['drop'], dry_run=options['dry_run'])
+            action = 'Would expire' if options['dry_run'] else ('Dropped' if options['drop'] else 'Detached')
+            for name in expired:
+                self.stdout.write(f'{action} {name}')
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from systems import outbox
+
+
+class Command(BaseCommand):
+    help = ('Process the outbox: rollups and alerts of new measurements (with DEFER_MEASUREMENT_WORK) '
+            'and alert webhooks. Several workers, in one or several processes or hosts, can run at the same time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of messages claimed at once.')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds to wait when the outbox is empty.')
+        parser.add_argument('--report-interval', type=float, default=60,
+                            help='Seconds between reports of throughput and lag, 0 to disable.')
+        parser.add_argument('--once', action='store_true', help='Process the due messages and exit.')
+        parser.add_argument('--stats', action='store_true', help='Print the backlog and lag of the outbox and exit.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = outbox.stats()
+            self.stdout.write(f"pending {stats['pending']}, failed {stats['failed']}, lag {stats['lag']:.1f} s")
+            return
+        self.stopping = False
+        if options['once']:
+            self.work(options)
+            return
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if options['workers'] <= 1:
+            self.work(options)
+            return
+        # forked workers must not share the connections of the parent
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=self.work, args=(options,)) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        while any(process.is_alive() for process in processes):
+            if self.stopping:
+                for process in processes:
+                    process.terminate()
+            for process in processes:
+                process.join(timeout=1)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def work(self, options):
+        """
+        Process batches until stopped, reporting throughput and lag every ``--report-interval``.
+        """
+        processed = failed = 0
+        busy = 0.0
+        reported = time.monotonic()
+        while not self.stopping:
+            started = time.monotonic()
+            batch_processed, batch_failed = outbox.process_batch(batch_size=options['batch_size'])
+            busy += time.monotonic() - started
+            processed += batch_processed
+            failed += batch_failed
+            if options['once'] and batch_processed + batch_failed < options['batch_size']:
+                break
+            elapsed = time.monotonic() - reported
+            if options['report_interval'] and elapsed >= options['report_interval']:
+                self.report(processed, failed, busy, elapsed)
+                processed = failed = 0
+                busy = 0.0
+                reported = time.monotonic()
+            if not options['once'] and batch_processed + batch_failed < options['batch_size']:
+                time.sleep(options['interval'])
+        if options['once']:
+            self.stdout.write(f'{processed} processed, {failed} failed')
+
+    def report(self, processed, failed, busy, elapsed):
+        stats = outbox.stats()
+        self.stdout.write(
+            f'[{os.getpid()}] {processed} processed ({processed / elapsed:.1f}/s), {failed} failed, '
+            f'busy {busy / elapsed:.0%}; pending {stats["pending"]}, failed total {stats["failed"]}, '
+            f'lag {stats["lag"]:.1f} s'
+        )
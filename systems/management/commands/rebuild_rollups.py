@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from systems import rollups
+from systems.models import HydroponicSystem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily measurement rollups from the raw measurements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--system', action='append', dest='systems', metavar='SLUG',
+                            help='Only rebuild the rollups of this system. Can be given several times.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rollup rows inserted per query.')
+
+    def handle(self, *args, **options):
+        system_ids = None
+        if options['systems']:
+            system_ids = list(HydroponicSystem.objects.filter(slug__in=options['systems']).values_list('pk', flat=True))
+        created = rollups.rebuild(system_ids=system_ids, batch_size=options['batch_size'])
+        for model_name, count in created.items():
+            self.stdout.write(self.style.SUCCESS(f'{model_name}: {count} rows'))
@@ -0,0 +1,210 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# metrics of the request being handled, None outside of requests; copied into the threads
+# of sync_to_async, so queries of async views are counted too
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+
+
+class Histogram:
+    """
+    Prometheus histogram kept in the memory of the process.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> count per bucket and above the last one, then sum and count
+        self.values = {}
+
+    def observe(self, labels, value):
+        values = self.values.get(labels)
+        if values is None:
+            values = self.values[labels] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, values in sorted(self.values.items()):
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels))
+            cumulative = 0
+            for bucket, count in zip([*self.buckets, '+Inf'], values):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bucket}"}} {cumulative}'
+            yield f'{self.name}_sum{{{label_text}}} {values[-2]}'
+            yield f'{self.name}_count{{{label_text}}} {values[-1]}'
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REQUEST_DURATION = Histogram(
+    'hydroponic_request_duration_seconds', 'Time to handle a request, including streaming the response.',
+    ['view', 'method', 'status'], DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'hydroponic_request_queries', 'Database queries run by a request.', ['view', 'method'], QUERY_BUCKETS,
+)
+REQUEST_QUERY_DURATION = Histogram(
+    'hydroponic_request_query_duration_seconds', 'Time spent in database queries of a request.',
+    ['view', 'method'], DURATION_BUCKETS,
+)
+REQUEST_SERIALIZER_DURATION = Histogram(
+    'hydroponic_request_serializer_duration_seconds',
+    'Time spent validating and representing data in serializers, without their queries.',
+    ['view', 'method'], DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'hydroponic_response_size_bytes', 'Size of the response body.', ['view', 'method'], SIZE_BUCKETS,
+)
+HISTOGRAMS = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_QUERY_DURATION, REQUEST_SERIALIZER_DURATION, RESPONSE_SIZE]
+
+
+class RequestMetrics:
+    """
+    Counters of one request.
+    """
+    __slots__ = ['started', 'queries', 'query_seconds', 'serializer_seconds', 'size']
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.size = 0
+
+
+def activate(request_metrics):
+    """
+    Count the queries and serializer time of the current context in ``request_metrics``.
+
+    Returns:
+        Token to pass to ``deactivate``.
+    """
+    return _current.set(request_metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record(view, method, status, request_metrics):
+    """
+    Add the metrics of a finished request to the histograms.
+
+    Args:
+        view (str): Name of the URL pattern of the view.
+        method (str): HTTP method.
+        status (int): Status code of the response.
+        request_metrics (RequestMetrics): Counters of the request.
+    """
+    duration = time.perf_counter() - request_metrics.started
+    with _lock:
+        REQUEST_DURATION.observe((view, method, str(status)), duration)
+        REQUEST_QUERIES.observe((view, method), request_metrics.queries)
+        REQUEST_QUERY_DURATION.observe((view, method), request_metrics.query_seconds)
+        REQUEST_SERIALIZER_DURATION.observe((view, method), request_metrics.serializer_seconds)
+        RESPONSE_SIZE.observe((view, method), request_metrics.size)
+
+
+def render():
+    """
+    Render the histograms of the process in the Prometheus text format.
+
+    Returns:
+        str: Exposition text.
+    """
+    with _lock:
+        lines = [line for histogram in HISTOGRAMS for line in histogram.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        for histogram in HISTOGRAMS:
+            histogram.values.clear()
+
+
+def track_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request and their time.
+    """
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.query_seconds += time.perf_counter() - started
+
+
+def install(connection):
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
+
+
+def install_all():
+    """
+    Track the queries of the connections of the current thread that are already open.
+    """
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+def _timed(method):
+    def timed(*args, **kwargs):
+        request_metrics = _current.get()
+        if request_metrics is None:
+            return method(*args, **kwargs)
+        started = time.perf_counter()
+        query_seconds = request_metrics.query_seconds
+        try:
+            return method(*args, **kwargs)
+        finally:
+            request_metrics.serializer_seconds += (
+                time.perf_counter() - started - (request_metrics.query_seconds - query_seconds)
+            )
+    return timed
+
+
+class SerializerMetricsMixin:
+    """
+    Count the time serializers of a view spend validating and representing data in the
+    serializer time of the request metrics.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Return a serializer whose validation and representation are timed.
+
+        :return: Serializer instance
+        """
+        serializer = super().get_serializer(*args, **kwargs)
+        # nested and list item serializers are called from these, so they are not counted twice
+        serializer.to_representation = _timed(serializer.to_representation)
+        serializer.run_validation = _timed(serializer.run_validation)
+        return serializer
@@ -0,0 +1,147 @@
+import cProfile
+import os
+import random
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import metrics
+
+PROFILE_HEADER = 'X-Profile'
+
+
+def view_name(request):
+    # unmatched paths share one label, so arbitrary URLs cannot create new series
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def is_staff(request):
+    """
+    Check whether a request is made by a staff user, with any of the API's authentication schemes.
+    """
+    user = request.user
+    try:
+        return Request(
+            request, authenticators=[authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        ).user.is_staff
+    except APIException:
+        return False
+    finally:
+        # the view authenticates the request itself, e.g. enforcing CSRF for session users only
+        request.user = user
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database queries and time, serializer time and response size of every
+    request per view, see ``systems.metrics``. Streamed responses are recorded once they are
+    consumed.
+
+    Requests of staff users with an ``X-Profile`` header, and a random ``PROFILE_SAMPLE_RATE``
+    fraction of all requests, are profiled with cProfile. The profile is written to
+    ``PROFILE_DIR`` and its file name returned in the ``X-Profile`` response header. Only
+    requests handled synchronously are profiled, as the profiler follows a single thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        metrics.install_all()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        profiler = cProfile.Profile() if self.should_profile(request) else None
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            metrics.deactivate(token)
+        if profiler is not None:
+            response[PROFILE_HEADER] = self.save_profile(profiler, request)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self.finish(request, response, request_metrics)
+
+    def should_profile(self, request):
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return True
+        return PROFILE_HEADER in request.headers and is_staff(request)
+
+    def save_profile(self, profiler, request):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = f"{timezone.now():%Y%m%dT%H%M%S}-{view_name(request).replace(':', '-')}-{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+        return name
+
+    def finish(self, request, response, request_metrics):
+        record = (view_name(request), request.method, response.status_code, request_metrics)
+        if not response.streaming:
+            request_metrics.size = len(response.content)
+            metrics.record(*record)
+        elif response.is_async:
+            response.streaming_content = self.astream(response.streaming_content, record)
+        else:
+            response.streaming_content = self.stream(response.streaming_content, record)
+        return response
+
+    @staticmethod
+    def stream(content, record):
+        request_metrics = record[-1]
+        iterator = iter(content)
+        try:
+            while True:
+                # the queries run while producing the chunks belong to the request
+                token = metrics.activate(request_metrics)
+                try:
+                    chunk = next(iterator, None)
+                finally:
+                    metrics.deactivate(token)
+                if chunk is None:
+                    return
+                request_metrics.size += len(chunk)
+                yield chunk
+        finally:
+            metrics.record(*record)
+
+    @staticmethod
+    async def astream(content, record):
+        request_metrics = record[-1]
+        iterator = aiter(content)
+        try:
+            while True:
+                token = metrics.activate(request_metrics)
+                try:
+                    chunk = await anext(iterator, None)
+                finally:
+                    metrics.deactivate(token)
+                if chunk is None:
+                    return
+                request_metrics.size += len(chunk)
+                yield chunk
+        finally:
+            metrics.record(*record)
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0004_alter_measurement_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMeasurementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_sum_squares', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('ph_sum', models.FloatField(default=0)),
+                ('ph_sum_squares', models.FloatField(default=0)),
+                ('ph_min', models.FloatField(null=True)),
+                ('ph_max', models.FloatField(null=True)),
+                ('tds_sum', models.FloatField(default=0)),
+                ('tds_sum_squares', models.FloatField(default=0)),
+                ('tds_min', models.FloatField(null=True)),
+                ('tds_max', models.FloatField(null=True)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='systems.hydroponicsystem')),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('system', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyMeasurementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_sum_squares', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('ph_sum', models.FloatField(default=0)),
+                ('ph_sum_squares', models.FloatField(default=0)),
+                ('ph_min', models.FloatField(null=True)),
+                ('ph_max', models.FloatField(null=True)),
+                ('tds_sum', models.FloatField(default=0)),
+                ('tds_sum_squares', models.FloatField(default=0)),
+                ('tds_min', models.FloatField(null=True)),
+                ('tds_max', models.FloatField(null=True)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='systems.hydroponicsystem')),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('system', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:52
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0005_measurement_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['system', '-timestamp'], name='measurement_system_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='measurement_ts_brin'),
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='system',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='measurements', to='systems.hydroponicsystem'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from rest_framework import serializers
+
+
+def create_snapshots(apps, schema_editor):
+    HydroponicSystem = apps.get_model('systems', 'HydroponicSystem')
+    Measurement = apps.get_model('systems', 'Measurement')
+    MeasurementSnapshot = apps.get_model('systems', 'MeasurementSnapshot')
+    timestamp_field = serializers.DateTimeField()
+    for system_id in HydroponicSystem.objects.values_list('pk', flat=True).iterator():
+        latest = Measurement.objects.filter(system_id=system_id).order_by('-timestamp', '-pk')[:10]
+        readings = [
+            [m.pk, m.temperature, m.ph, m.tds, m.description, timestamp_field.to_representation(m.timestamp)]
+            for m in latest
+        ]
+        if readings:
+            MeasurementSnapshot.objects.create(system_id=system_id, readings=readings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0006_measurement_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementSnapshot',
+            fields=[
+                ('system', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='systems.hydroponicsystem')),
+                ('readings', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_snapshots, migrations.RunPython.noop),
+    ]
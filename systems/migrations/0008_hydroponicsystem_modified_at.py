@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0007_measurement_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hydroponicsystem',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:25
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0008_hydroponicsystem_modified_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=70)),
+                ('metric', models.CharField(choices=[('temperature', 'temperature'), ('ph', 'ph'), ('tds', 'tds')], max_length=20)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+                ('hysteresis', models.FloatField(default=0)),
+                ('sustained_for', models.DurationField(default=datetime.timedelta)),
+                ('webhook_url', models.URLField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('breach_started_at', models.DateTimeField(editable=False, null=True)),
+                ('firing', models.BooleanField(default=False, editable=False)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='systems.hydroponicsystem')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('firing', 'firing'), ('resolved', 'resolved')], max_length=10)),
+                ('metric', models.CharField(max_length=20)),
+                ('value', models.FloatField()),
+                ('measurement_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('webhook_url', models.URLField(blank=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('delivery_attempts', models.PositiveSmallIntegerField(default=0)),
+                ('system', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='systems.hydroponicsystem')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='systems.alertrule')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['system', '-timestamp'], name='alertevent_system_ts_idx'), models.Index(condition=models.Q(('delivered_at__isnull', True), models.Q(('webhook_url', ''), _negated=True)), fields=['created_at'], name='alertevent_undelivered_idx')],
+            },
+        ),
+    ]
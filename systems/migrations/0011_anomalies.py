@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0010_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measurement_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('spike', 'spike'), ('flatline', 'flatline'), ('drift', 'drift')], max_length=10)),
+                ('metric', models.CharField(choices=[('temperature', 'temperature'), ('ph', 'ph'), ('tds', 'tds')], max_length=20)),
+                ('value', models.FloatField()),
+                ('score', models.FloatField()),
+                ('timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('system', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='systems.hydroponicsystem')),
+            ],
+            options={
+                'verbose_name_plural': 'anomalies',
+                'indexes': [models.Index(fields=['system', '-timestamp'], name='anomaly_system_ts_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnomalyDetectorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('temperature', 'temperature'), ('ph', 'ph'), ('tds', 'tds')], max_length=20)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('baseline', models.FloatField(default=0)),
+                ('last_value', models.FloatField(null=True)),
+                ('run', models.PositiveIntegerField(default=0)),
+                ('drifting', models.BooleanField(default=False)),
+                ('timestamp', models.DateTimeField(null=True)),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='systems.hydroponicsystem')),
+            ],
+            options={
+                'unique_together': {('system', 'metric')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0011_anomalies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hydroponicsystem',
+            name='compacted_until',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hydroponicsystem',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.contrib.postgres.indexes import BrinIndex
 
 from django_extensions.db.fields import AutoSlugField
 
@@ -9,18 +13,326 @@ class HydroponicSystem(models.Model):
     description = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hydroponic_systems')
     slug = AutoSlugField(populate_from='name', overwrite=True, unique=True)
+    # also touched whenever measurements of the system change, see systems.receivers
+    modified_at = models.DateTimeField(auto_now=True)
+    # raw measurements older than this many days are compacted into the rollups, see systems.retention
+    retention_days = models.PositiveIntegerField(null=True, blank=True)
+    # the rollups before this moment are final, its raw measurements deleted or being deleted
+    compacted_until = models.DateTimeField(null=True, editable=False)
 
     def __str__(self):
         return self.name
 
 
+class MeasurementQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Create measurements in bulk and send ``measurements_created`` in the same transaction.
+        """
+        from .signals import measurements_created
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if objs:
+                measurements_created.send(sender=self.model, measurements=objs)
+        return objs
+
+    def delete(self):
+        """
+        Delete measurements and send ``measurements_deleted`` in the same transaction.
+        """
+        from .signals import measurements_deleted
+
+        if not measurements_deleted.has_listeners(self.model):
+            return super().delete()
+        with transaction.atomic(using=self.db, savepoint=False):
+            measurements = list(self.only('pk', 'system_id', 'timestamp').order_by())
+            result = super().delete()
+            if measurements:
+                measurements_deleted.send(sender=self.model, measurements=measurements)
+        return result
+
+
 class Measurement(models.Model):
-    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='measurements')
+    # indexed by measurement_system_ts_idx, which starts with system_id
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='measurements',
+                               db_index=False)
     temperature = models.FloatField()
     ph = models.FloatField()
     tds = models.FloatField()
     description = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    objects = MeasurementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # latest measurements of a system, e.g. the prefetch of HydroponicSystemDetail
+            models.Index(fields=['system', '-timestamp'], name='measurement_system_ts_idx'),
+            # range scans over the append-only timestamp column of very large tables
+            BrinIndex(fields=['timestamp'], name='measurement_ts_brin'),
+        ]
+
     def __str__(self):
         return f"{self.system.name} measurement at {self.timestamp}"
+
+    def save(self, *args, **kwargs):
+        """
+        Save the measurement and send ``measurements_created`` or ``measurements_updated``.
+
+        For updates, the stored state of the measurement is loaded first and sent as ``previous``.
+        """
+        from .signals import measurements_created, measurements_updated
+
+        created = self._state.adding
+        with transaction.atomic():
+            previous = None
+            if not created and measurements_updated.has_listeners(Measurement):
+                previous = Measurement.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            if created:
+                measurements_created.send(sender=Measurement, measurements=[self])
+            elif previous is not None:
+                measurements_updated.send(sender=Measurement, measurements=[self], previous=[previous])
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the measurement and send ``measurements_deleted``.
+        """
+        from .signals import measurements_deleted
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            measurements_deleted.send(sender=Measurement, measurements=[self])
+        return result
+
+
+class MeasurementRollup(models.Model):
+    """
+    Pre-computed statistics of the measurements of a system within one time bucket.
+
+    Sums and sums of squares are kept instead of averages so rollups can be updated
+    incrementally and combined into larger buckets.
+    """
+    period = None
+
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='+')
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_sum_squares = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    ph_sum = models.FloatField(default=0)
+    ph_sum_squares = models.FloatField(default=0)
+    ph_min = models.FloatField(null=True)
+    ph_max = models.FloatField(null=True)
+    tds_sum = models.FloatField(default=0)
+    tds_sum_squares = models.FloatField(default=0)
+    tds_min = models.FloatField(null=True)
+    tds_max = models.FloatField(null=True)
+
+    class Meta:
+        abstract = True
+        unique_together = ['system', 'bucket']
+
+    def __str__(self):
+        return f"{self.system} {self.period} rollup at {self.bucket}"
+
+
+class HourlyMeasurementRollup(MeasurementRollup):
+    period = 'hour'
+
+    class Meta(MeasurementRollup.Meta):
+        pass
+
+
+class DailyMeasurementRollup(MeasurementRollup):
+    period = 'day'
+
+    class Meta(MeasurementRollup.Meta):
+        pass
+
+
+class MeasurementSnapshot(models.Model):
+    """
+    Latest measurements of a system in a compact form, kept up to date on every write.
+
+    Each reading is a list of the values of ``FIELDS``, newest first, so the last measurements
+    of a system can be served without querying the measurement table.
+    """
+    SIZE = 10
+    FIELDS = ['id', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+
+    system = models.OneToOneField(HydroponicSystem, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='snapshot')
+    readings = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.system} snapshot at {self.updated_at}"
+
+
+class AlertRule(models.Model):
+    """
+    Range a metric of a hydroponic system is expected to stay in.
+
+    The rule fires once the metric has been outside ``[minimum, maximum]`` for ``sustained_for``
+    and resolves when it is back inside the range by at least ``hysteresis``. Rules are evaluated
+    on every measurement write, see ``systems.alerts``; ``breach_started_at`` and ``firing``
+    hold the evaluation state.
+    """
+    METRIC_CHOICES = [('temperature', 'temperature'), ('ph', 'ph'), ('tds', 'tds')]
+
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='alert_rules')
+    name = models.CharField(max_length=70)
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    hysteresis = models.FloatField(default=0)
+    sustained_for = models.DurationField(default=timedelta)
+    webhook_url = models.URLField(blank=True)
+    is_active = models.BooleanField(default=True)
+    breach_started_at = models.DateTimeField(null=True, editable=False)
+    firing = models.BooleanField(default=False, editable=False)
+
+    def __str__(self):
+        return f"{self.system} {self.name}"
+
+
+class AlertEvent(models.Model):
+    """
+    Transition of an alert rule, written in the transaction of the measurement causing it.
+
+    Events of rules with a webhook are delivered through the outbox; ``delivered_at`` is set
+    once the webhook accepted the event.
+    """
+    FIRING = 'firing'
+    RESOLVED = 'resolved'
+    KIND_CHOICES = [(FIRING, FIRING), (RESOLVED, RESOLVED)]
+
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='events')
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='+', db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    metric = models.CharField(max_length=20)
+    value = models.FloatField()
+    # not a foreign key, the measurement table may be partitioned and measurements expire
+    measurement_id = models.BigIntegerField()
+    timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    webhook_url = models.URLField(blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['system', '-timestamp'], name='alertevent_system_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rule} {self.kind} at {self.timestamp}"
+
+
+class Anomaly(models.Model):
+    """
+    Reading flagged by the anomaly detectors of its system, see ``systems.anomalies``.
+
+    ``score`` is the z-score of a spike, the number of identical readings of a flatline and the
+    distance between the moving average and the baseline, in standard deviations, of a drift.
+    """
+    SPIKE = 'spike'
+    FLATLINE = 'flatline'
+    DRIFT = 'drift'
+    KIND_CHOICES = [(SPIKE, SPIKE), (FLATLINE, FLATLINE), (DRIFT, DRIFT)]
+    METRIC_CHOICES = AlertRule.METRIC_CHOICES
+
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='+', db_index=False)
+    # not a foreign key, the measurement table may be partitioned and measurements expire
+    measurement_id = models.BigIntegerField(db_index=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    value = models.FloatField()
+    score = models.FloatField()
+    timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'anomalies'
+        indexes = [
+            models.Index(fields=['system', '-timestamp'], name='anomaly_system_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.system} {self.metric} {self.kind} at {self.timestamp}"
+
+
+class AnomalyDetectorState(models.Model):
+    """
+    State of the anomaly detectors of one metric of a system after its latest reading.
+
+    The moving averages and variance are updated with every reading, so detecting anomalies in
+    new readings does not read the history of the system.
+    """
+    system = models.ForeignKey(HydroponicSystem, on_delete=models.CASCADE, related_name='+')
+    metric = models.CharField(max_length=20, choices=Anomaly.METRIC_CHOICES)
+    count = models.PositiveBigIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    baseline = models.FloatField(default=0)
+    last_value = models.FloatField(null=True)
+    run = models.PositiveIntegerField(default=0)
+    drifting = models.BooleanField(default=False)
+    timestamp = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = ['system', 'metric']
+
+    def __str__(self):
+        return f"{self.system} {self.metric} detectors after {self.count} readings"
+
+
+class OutboxMessage(models.Model):
+    """
+    Work to be done once a transaction commits, written in that transaction.
+
+    Messages are processed and deleted by the ``process_outbox`` worker, see ``systems.outbox``.
+    Messages failing ``outbox.MAX_ATTEMPTS`` times are kept with ``failed_at`` set.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the queue of the worker
+            models.Index(fields=['available_at', 'id'], name='outbox_pending_idx',
+                         condition=models.Q(failed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} message {self.pk}"
+
+
+class DeviceKey(models.Model):
+    """
+    API key of a device, e.g. a sensor, allowed to read and write the measurements of ``systems``.
+
+    Only the SHA-256 hash of the key is stored. Keys are long random strings, so a fast hash is
+    enough and checking one costs microseconds instead of the password hash of basic auth.
+    The key starts with ``prefix``, which is stored in clear to find the key.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_keys')
+    name = models.CharField(max_length=70)
+    prefix = models.CharField(max_length=16, unique=True, editable=False)
+    key_hash = models.CharField(max_length=64, editable=False)
+    systems = models.ManyToManyField(HydroponicSystem, related_name='device_keys')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # updated when a process loads the key, i.e. about once per DEVICE_KEY_CACHE_TTL
+    last_used_at = models.DateTimeField(null=True, editable=False)
+    revoked_at = models.DateTimeField(null=True, editable=False)
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix})"
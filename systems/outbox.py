@@ -0,0 +1,202 @@
+import logging
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+RETRY_DELAY = timedelta(seconds=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# claimed messages are hidden from other workers for this long, which must cover handling a whole
+# batch, e.g. 100 webhooks timing out, or its messages are handled twice
+LEASE = timedelta(minutes=15)
+
+# topic -> (function, whether it takes a list of payloads, whether it runs in a transaction,
+# whether its messages are handled in order)
+_handlers = {}
+
+
+def handler(topic, batch=True, atomic=True, ordered=False):
+    """
+    Register the function processing the messages of a topic.
+
+    Batch handlers are called with the payloads of all messages of the topic in a batch, other
+    handlers once per payload. Atomic handlers run in the transaction deleting their messages,
+    so their database writes are committed together with the removal of the messages. Others,
+    e.g. calling other services, run outside of transactions and their messages are deleted
+    afterwards, so they must tolerate handling a message again.
+
+    The messages of ordered topics are handled by one worker at a time, see ``ordered_topics``,
+    in the order they were claimed, except for retried messages, which come after the later ones.
+
+    Args:
+        topic (str): Topic of the messages.
+        batch (bool): Whether the function takes a list of payloads.
+        atomic (bool): Whether the function runs in a transaction.
+        ordered (bool): Whether the messages are handled in order.
+
+    Returns:
+        callable: Decorator registering the function.
+    """
+    def register(function):
+        _handlers[topic] = (function, batch, atomic, ordered)
+        return function
+    return register
+
+
+def enqueue(topic, payloads):
+    """
+    Add messages to the outbox in the current transaction.
+
+    Args:
+        topic (str): Topic of the messages.
+        payloads (list): JSON serializable payloads, one per message.
+
+    Returns:
+        list: Created OutboxMessage objects.
+    """
+    return OutboxMessage.objects.bulk_create([OutboxMessage(topic=topic, payload=payload) for payload in payloads])
+
+
+def _run(topic, messages):
+    if topic not in _handlers:
+        raise LookupError(f'No handler for outbox topic "{topic}"')
+    function, batch, atomic, _ = _handlers[topic]
+    with transaction.atomic() if atomic else nullcontext():
+        if batch:
+            function([message.payload for message in messages])
+        else:
+            for message in messages:
+                function(message.payload)
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).delete()
+
+
+def _retry(message, exc, now):
+    message.attempts += 1
+    message.last_error = f'{type(exc).__name__}: {exc}'
+    message.available_at = now + min(RETRY_DELAY * 2 ** (message.attempts - 1), MAX_RETRY_DELAY)
+    if message.attempts >= MAX_ATTEMPTS:
+        message.failed_at = now
+        logger.error('Outbox message %s (%s) failed for good: %s', message.pk, message.topic, message.last_error)
+
+
+def _lock_key(topic):
+    # the same in every process, unlike hash()
+    return zlib.crc32(f'outbox:{topic}'.encode())
+
+
+@contextmanager
+def ordered_topics():
+    """
+    Take the ordered topics no other worker is handling, with Postgres advisory locks held
+    until the block ends.
+
+    Yields:
+        set: Ordered topics handled by other workers, whose messages must not be claimed.
+    """
+    topics = sorted(topic for topic, (_, _, _, ordered) in _handlers.items() if ordered)
+    held = []
+    try:
+        with connection.cursor() as cursor:
+            for topic in topics:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [_lock_key(topic)])
+                if cursor.fetchone()[0]:
+                    held.append(topic)
+        yield set(topics) - set(held)
+    finally:
+        with connection.cursor() as cursor:
+            for topic in held:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [_lock_key(topic)])
+
+
+def claim(batch_size, now, exclude_topics=()):
+    """
+    Lease a batch of due messages to the current worker.
+
+    Messages are locked with ``SELECT ... FOR UPDATE SKIP LOCKED``, so several workers can
+    claim messages at the same time without waiting for each other, and made due again after
+    ``LEASE`` in the same short transaction. Messages of a worker that died are picked up
+    once their lease expires.
+
+    Args:
+        batch_size (int): Maximum number of messages claimed.
+        now (datetime): Current time.
+        exclude_topics (iterable): Topics whose messages are not claimed.
+
+    Returns:
+        list: Claimed OutboxMessage objects.
+    """
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True, available_at__lte=now)
+            .exclude(topic__in=list(exclude_topics))
+            .order_by('available_at', 'pk')[:batch_size]
+        )
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(available_at=now + LEASE)
+    return messages
+
+
+def process_batch(batch_size=100):
+    """
+    Process a batch of due messages.
+
+    The messages are claimed first, see ``claim``, so no transaction is held open while they
+    are handled. Messages of ordered topics are only claimed while no other worker handles the
+    topic. The messages of a topic with a batch handler are handled together; if that
+    fails, or for other handlers, they are handled one by one, so a bad message only delays
+    itself. Handled messages are deleted, failed ones retried with exponential backoff.
+
+    Args:
+        batch_size (int): Maximum number of messages processed.
+
+    Returns:
+        tuple: Numbers of processed and failed messages.
+    """
+    with ordered_topics() as busy_topics:
+        topics = defaultdict(list)
+        for message in claim(batch_size, timezone.now(), busy_topics):
+            topics[message.topic].append(message)
+        processed, failed = [], []
+        for topic, topic_messages in topics.items():
+            if len(topic_messages) > 1 and _handlers.get(topic, (None, False, True, False))[1]:
+                try:
+                    _run(topic, topic_messages)
+                    processed += topic_messages
+                    continue
+                except Exception:
+                    pass
+            for message in topic_messages:
+                try:
+                    _run(topic, [message])
+                    processed.append(message)
+                except Exception as exc:
+                    _retry(message, exc, timezone.now())
+                    failed.append(message)
+        OutboxMessage.objects.bulk_update(failed, ['attempts', 'last_error', 'available_at', 'failed_at'])
+    return len(processed), len(failed)
+
+
+def stats():
+    """
+    Measure the backlog of the outbox.
+
+    Returns:
+        dict: Numbers of ``pending`` and ``failed`` messages, and ``lag`` in seconds, the age
+        of the oldest pending message.
+    """
+    pending = OutboxMessage.objects.filter(failed_at__isnull=True).aggregate(count=Count('pk'), oldest=Min('created_at'))
+    oldest = pending['oldest']
+    return {
+        'pending': pending['count'],
+        'failed': OutboxMessage.objects.filter(failed_at__isnull=False).count(),
+        'lag': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
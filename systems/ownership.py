@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+
+from . import caching
+from .authentication import device_principal
+from .models import HydroponicSystem
+
+
+def owned_systems(user_id):
+    """
+    Map the slugs of a user's systems to their primary keys.
+
+    The map is cached under the version counter of the user's systems, which is bumped when
+    one of them is created, deleted, renamed or given away, for ``OWNED_SYSTEMS_CACHE_TIMEOUT``
+    seconds (0 disables caching).
+
+    Args:
+        user_id (int): Primary key of the owner.
+
+    Returns:
+        dict: Slugs mapped to primary keys.
+    """
+    cache = caches[caching.CACHE_ALIAS]
+    version, = caching.get_versions([caching.owned_systems_version_key(user_id)])
+    key = f'systems:owned:{user_id}:{version}'
+    systems = cache.get(key)
+    if systems is None:
+        systems = dict(HydroponicSystem.objects.filter(owner_id=user_id).values_list('slug', 'pk'))
+        if settings.OWNED_SYSTEMS_CACHE_TIMEOUT:
+            cache.set(key, systems, timeout=settings.OWNED_SYSTEMS_CACHE_TIMEOUT)
+    return systems
+
+
+class Ownership:
+    """
+    Systems a request may use: those of the authenticated user, or those of the device key it
+    was made with.
+
+    Permissions, serializer fields and filters of a request share one instance, see
+    ``for_request``, so the systems are loaded at most once per request, and usually not at all.
+    """
+
+    def __init__(self, request):
+        self.user_id = request.user.pk
+        self.principal = device_principal(request)
+        self._systems = None
+
+    @property
+    def systems(self):
+        """
+        dict: Slugs of the systems mapped to their primary keys.
+        """
+        if self._systems is None:
+            self._systems = self.principal.systems if self.principal is not None else owned_systems(self.user_id)
+        return self._systems
+
+    def owns(self, system_id, owner_id=None):
+        """
+        Check whether the request may use a system.
+
+        Args:
+            system_id (int): Primary key of the system.
+            owner_id (int): Owner of the system if known, which answers the check without loading the systems.
+
+        Returns:
+            bool: True if the system may be used.
+        """
+        if self.principal is not None:
+            return system_id in self.principal.system_ids
+        if owner_id is not None:
+            return owner_id == self.user_id
+        return system_id in self.systems.values()
+
+    def get_system(self, slug):
+        """
+        Resolve a slug to one of the systems, without a query.
+
+        Args:
+            slug (str): Slug of the system.
+
+        Returns:
+            HydroponicSystem: Instance with the primary key and slug, the other fields deferred,
+            or None.
+        """
+        pk = self.systems.get(slug)
+        if pk is None:
+            return None
+        db = router.db_for_read(HydroponicSystem)
+        # values in the order of the model fields; the owner is loaded when read
+        return HydroponicSystem.from_db(db, ['id', 'slug'], [pk, slug])
+
+
+def for_request(request):
+    """
+    Return the Ownership of a request, creating it on first use.
+
+    Args:
+        request (Request): Authenticated request.
+
+    Returns:
+        Ownership: Systems the request may use.
+    """
+    ownership = getattr(request, '_ownership', None)
+    if ownership is None or ownership.user_id != request.user.pk:
+        ownership = request._ownership = Ownership(request)
+    return ownership
@@ -0,0 +1,203 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MeasurementCursorPagination(LimitOffsetPagination):
+    """
+    Keyset pagination over ``(timestamp, id)`` for measurement lists.
+
+    Pages are selected with a ``WHERE (timestamp, id) < (t, i)`` condition instead of an
+    ``OFFSET``, so every page costs the same no matter how deep it is. Clients follow the
+    ``next``/``previous`` links, which carry an opaque ``cursor`` parameter.
+
+    The total count can be skipped with ``?count=false``. Requests using ``offset`` or ordering
+    by a field other than the timestamp fall back to limit/offset pagination.
+    """
+    max_limit = 1000
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'The pagination cursor value.'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def use_keyset(self, request):
+        """
+        Decide whether the request can be served with keyset pagination.
+
+        Args:
+            request (Request): Request instance.
+
+        Returns:
+            bool: True unless an offset or a non-timestamp ordering was requested.
+        """
+        if self.offset_query_param in request.query_params:
+            return False
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '').split(',')[0].strip()
+        return ordering in ('', 'timestamp', '-timestamp')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        page = self.get_keyset_page(queryset, request)
+        if page is None:
+            return None
+        if self.include_count:
+            self.count = self.get_count(queryset)
+        return self.finish_keyset_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Paginate the queryset like ``paginate_queryset``, using the async ORM.
+
+        Args:
+            queryset (QuerySet): Filtered queryset.
+            request (Request): Request instance.
+            view (APIView): View instance.
+
+        Returns:
+            list: Rows of the page, or None if pagination is disabled.
+        """
+        self.request = request
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            self.limit = self.get_limit(request)
+            if self.limit is None:
+                return None
+            self.offset = self.get_offset(request)
+            self.count = await queryset.acount()
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+        page = self.get_keyset_page(queryset, request)
+        if page is None:
+            return None
+        if self.include_count:
+            self.count = await queryset.acount()
+        return self.finish_keyset_page([row async for row in page])
+
+    def get_keyset_page(self, queryset, request):
+        """
+        Build the query selecting the rows of the requested page and one row more.
+
+        Args:
+            queryset (QuerySet): Filtered queryset.
+            request (Request): Request instance.
+
+        Returns:
+            QuerySet: Ordered and sliced queryset, or None if pagination is disabled.
+        """
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '')
+        self.descending = not ordering.startswith('timestamp')
+        self.include_count = request.query_params.get(self.count_query_param, '').lower() not in ('false', '0')
+
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor[0]
+        self.has_cursor = cursor is not None
+        if cursor is not None:
+            _, timestamp, pk = cursor
+            lookup = 'lt' if self.descending != self.reverse else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'timestamp__{lookup}': timestamp}) | Q(timestamp=timestamp, **{f'pk__{lookup}': pk})
+            )
+
+        descending = self.descending != self.reverse
+        ordering = ('-timestamp', '-pk') if descending else ('timestamp', 'pk')
+        return queryset.order_by(*ordering)[:self.limit + 1]
+
+    def finish_keyset_page(self, results):
+        """
+        Trim the extra row fetched by ``get_keyset_page`` and remember the positions of the links.
+
+        Args:
+            results (list): Rows fetched with the page query.
+
+        Returns:
+            list: Rows of the page in the requested order.
+        """
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if self.reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, self.has_cursor
+
+        self.next_position = self.get_position(results[-1]) if has_next and results else None
+        self.previous_position = self.get_position(results[0]) if has_previous and results else None
+        return results
+
+    def get_position(self, measurement):
+        if isinstance(measurement, dict):
+            return measurement['timestamp'], measurement['id']
+        return measurement.timestamp, measurement.pk
+
+    def decode_cursor(self, request):
+        """
+        Decode the cursor from the request query parameters.
+
+        Args:
+            request (Request): Request instance.
+
+        Returns:
+            tuple: Reverse flag, timestamp and primary key, or None if no cursor was given.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = tokens['r'][0] == '1'
+            timestamp = datetime.fromisoformat(tokens['t'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, IndexError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, timestamp, pk
+
+    def encode_cursor(self, reverse, position):
+        timestamp, pk = position
+        querystring = parse.urlencode({'r': '1' if reverse else '0', 't': timestamp.isoformat(), 'i': pk})
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.include_count:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
@@ -0,0 +1,237 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Measurement
+
+TABLE = Measurement._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+
+# bounds are rendered like '2024-07-01 00:00:00+00', which fromisoformat only parses since Python 3.11
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned():
+    """
+    Check whether the measurement table is a partitioned table.
+
+    Returns:
+        bool: True if the table has been converted with ``convert``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)', [TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions():
+    """
+    List the partitions of the measurement table with their upper bounds.
+
+    Returns:
+        list: Tuples of partition name and exclusive upper bound, None for the default partition.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname',
+            [TABLE]
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = _UPPER_BOUND.search(bound)
+            partitions.append((name, parse_datetime(match.group(1)) if match else None))
+        return partitions
+
+
+def convert(months_ahead=3, attach_legacy=False):
+    """
+    Convert the measurement table into a table partitioned by month on ``timestamp``.
+
+    The primary key becomes ``(id, timestamp)`` as required by PostgreSQL; ids keep coming
+    from a sequence so they stay unique. By default existing rows are copied into monthly
+    partitions. With ``attach_legacy`` the existing table is attached as is as a single
+    partition for everything up to the month of its newest row, which avoids copying the data.
+
+    Args:
+        months_ahead (int): Number of future monthly partitions to create.
+        attach_legacy (bool): Attach the existing table instead of copying its rows.
+    """
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Partitioning is only supported on PostgreSQL.')
+    if is_partitioned():
+        raise PartitioningError('The measurement table is already partitioned.')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            'SELECT conrelid::regclass::text FROM pg_constraint WHERE confrelid = %s::regclass', [TABLE]
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise PartitioningError(f'Tables referencing measurements cannot be partitioned: {referencing}.')
+
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN '
+            '(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = %s)',
+            [TABLE, TABLE, 'p']
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            'WHERE conrelid = %s::regclass AND contype = %s',
+            [TABLE, 'f']
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MIN(timestamp), MAX(timestamp), MAX(id) FROM {_quote(TABLE)}')
+        first_timestamp, last_timestamp, last_id = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} RENAME TO {_quote(LEGACY_TABLE)}')
+        cursor.execute(f'ALTER TABLE {_quote(LEGACY_TABLE)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {_quote(LEGACY_TABLE)} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {_quote(SEQUENCE)}')
+        cursor.execute(
+            f'CREATE TABLE {_quote(TABLE)} (LIKE {_quote(LEGACY_TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (timestamp)'
+        )
+        cursor.execute(f'CREATE SEQUENCE {_quote(SEQUENCE)} START WITH {(last_id or 0) + 1} '
+                       f'OWNED BY {_quote(TABLE)}.id')
+        cursor.execute(f"ALTER TABLE {_quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} ADD PRIMARY KEY (id, timestamp)')
+        cursor.execute(f'CREATE TABLE {_quote(DEFAULT_PARTITION)} PARTITION OF {_quote(TABLE)} DEFAULT')
+
+        current_month = month_start(datetime.now(dt_timezone.utc))
+        if attach_legacy:
+            first_month = current_month
+            if last_timestamp is not None:
+                first_month = max(first_month, add_months(month_start(last_timestamp), 1))
+            cursor.execute(
+                'SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = %s',
+                [LEGACY_TABLE, 'p']
+            )
+            legacy_primary_key = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE {_quote(LEGACY_TABLE)} DROP CONSTRAINT {_quote(legacy_primary_key)}')
+            cursor.execute(f'ALTER TABLE {_quote(LEGACY_TABLE)} ADD CONSTRAINT {_quote(LEGACY_TABLE + "_pkey")} '
+                           f'PRIMARY KEY (id, timestamp)')
+            for name, _ in indexes:
+                cursor.execute(f'ALTER INDEX {_quote(name)} RENAME TO {_quote(name[:56] + "_legacy")}')
+            cursor.execute(
+                f'ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(LEGACY_TABLE)} '
+                f'FOR VALUES FROM (MINVALUE) TO (%s)',
+                [first_month]
+            )
+        else:
+            first_month = month_start(first_timestamp) if first_timestamp else current_month
+
+        month = first_month
+        while month <= add_months(current_month, months_ahead):
+            _create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        if not attach_legacy:
+            cursor.execute(f'INSERT INTO {_quote(TABLE)} SELECT * FROM {_quote(LEGACY_TABLE)}')
+            cursor.execute(f'DROP TABLE {_quote(LEGACY_TABLE)}')
+
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {_quote(TABLE)} ADD CONSTRAINT {_quote(name)} {definition}')
+
+
+def _create_partition(cursor, month):
+    """
+    Create the partition for ``month`` unless it exists.
+
+    The partition is created as a standalone table first, rows for its range are moved out
+    of the default partition, and only then it is attached, so the default partition never
+    blocks the creation of new partitions.
+    """
+    name = partition_name(month)
+    cursor.execute('SELECT to_regclass(%s)', [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    upper = add_months(month, 1)
+    cursor.execute(f'CREATE TABLE {_quote(name)} (LIKE {_quote(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+    if cursor.fetchone()[0] is not None:
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {_quote(DEFAULT_PARTITION)} '
+            f'WHERE timestamp >= %s AND timestamp < %s RETURNING *) '
+            f'INSERT INTO {_quote(name)} SELECT * FROM moved',
+            [month, upper]
+        )
+    cursor.execute(
+        f'ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(name)} FOR VALUES FROM (%s) TO (%s)',
+        [month, upper]
+    )
+    return True
+
+
+def ensure_partitions(months_ahead=3):
+    """
+    Create the partitions for the current month and the next ``months_ahead`` months.
+
+    Args:
+        months_ahead (int): Number of future monthly partitions to create.
+
+    Returns:
+        list: Names of the created partitions.
+    """
+    created = []
+    month = month_start(datetime.now(dt_timezone.utc))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            if _create_partition(cursor, month):
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+def expire_partitions(before, drop=False, dry_run=False):
+    """
+    Detach, and optionally drop, the partitions holding only rows older than ``before``.
+
+    Args:
+        before (datetime): Partitions whose upper bound is at or before this moment expire.
+        drop (bool): Drop the expired partitions after detaching them.
+        dry_run (bool): Only report the expired partitions.
+
+    Returns:
+        list: Names of the expired partitions.
+    """
+    expired = [name for name, upper in list_partitions() if upper is not None and upper <= before]
+    if dry_run:
+        return expired
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name in expired:
+            cursor.execute(f'ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {_quote(name)}')
+    return expired
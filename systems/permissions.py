@@ -1,9 +1,33 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
+from .ownership import for_request
+
+
 class IsHydroponicSystemOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return for_request(request).owns(obj.pk, obj.owner_id)
 
 class IsMeasurementOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.system.owner == request.user
\ No newline at end of file
+        return for_request(request).owns(obj.system_id, obj.system.owner_id)
+
+class IsAlertRuleOwner(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return for_request(request).owns(obj.system_id, obj.system.owner_id)
+
+class IsDeviceKeyOwner(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return obj.owner_id == request.user.pk
+
+class CanReadMetrics(permissions.BasePermission):
+    """
+    Allow staff users, and scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    def has_permission(self, request, view):
+        header = request.headers.get('Authorization', '')
+        if settings.METRICS_TOKEN and hmac.compare_digest(header.encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()):
+            return True
+        return request.user.is_staff
@@ -0,0 +1,206 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import alerts, anomalies, authentication, caching, events, outbox, rollups, snapshots
+from .models import AlertRule, Anomaly, DeviceKey, HydroponicSystem, Measurement
+from .signals import measurements_created, measurements_deleted, measurements_updated
+
+MEASUREMENTS_CREATED = 'measurements.created'
+
+
+@receiver(measurements_created, sender=Measurement)
+def add_to_rollups(sender, measurements, **kwargs):
+    if not settings.DEFER_MEASUREMENT_WORK:
+        rollups.add_measurements(measurements)
+
+
+@receiver(measurements_updated, sender=Measurement)
+def refresh_updated_rollups(sender, measurements, previous, **kwargs):
+    rollups.refresh_buckets(measurements + previous)
+
+
+@receiver(measurements_deleted, sender=Measurement)
+def refresh_deleted_rollups(sender, measurements, **kwargs):
+    rollups.refresh_buckets(measurements)
+
+
+@receiver(measurements_created, sender=Measurement)
+def add_to_snapshots(sender, measurements, **kwargs):
+    snapshots.add_measurements(measurements)
+
+
+@receiver(measurements_updated, sender=Measurement)
+def refresh_updated_snapshots(sender, measurements, previous, **kwargs):
+    snapshots.refresh(measurement.system_id for measurement in measurements + previous)
+
+
+@receiver(measurements_deleted, sender=Measurement)
+def refresh_deleted_snapshots(sender, measurements, **kwargs):
+    snapshots.refresh(measurement.system_id for measurement in measurements)
+
+
+def touch_systems(system_ids):
+    HydroponicSystem.objects.filter(pk__in=set(system_ids)).update(modified_at=timezone.now())
+
+
+@receiver(measurements_created, sender=Measurement)
+def touch_created(sender, measurements, **kwargs):
+    touch_systems(measurement.system_id for measurement in measurements)
+
+
+@receiver(measurements_updated, sender=Measurement)
+def touch_updated(sender, measurements, previous, **kwargs):
+    touch_systems(measurement.system_id for measurement in measurements + previous)
+
+
+@receiver(measurements_deleted, sender=Measurement)
+def touch_deleted(sender, measurements, **kwargs):
+    touch_systems(measurement.system_id for measurement in measurements)
+
+
+@receiver(post_delete, sender=HydroponicSystem)
+def touch_remaining_systems(sender, instance, **kwargs):
+    # keeps the newest modification stamp of the owner's systems moving forward on deletes
+    HydroponicSystem.objects.filter(owner_id=instance.owner_id).update(modified_at=timezone.now())
+
+
+@receiver(measurements_created, sender=Measurement)
+def invalidate_created(sender, measurements, **kwargs):
+    caching.bump_for_systems(measurement.system_id for measurement in measurements)
+
+
+@receiver(measurements_updated, sender=Measurement)
+def invalidate_updated(sender, measurements, previous, **kwargs):
+    caching.bump_for_systems(measurement.system_id for measurement in measurements + previous)
+
+
+@receiver(measurements_deleted, sender=Measurement)
+def invalidate_deleted(sender, measurements, **kwargs):
+    caching.bump_for_systems(measurement.system_id for measurement in measurements)
+
+
+@receiver(pre_save, sender=HydroponicSystem)
+def remember_stored_system(sender, instance, **kwargs):
+    instance._stored = None
+    if instance.pk is not None:
+        instance._stored = HydroponicSystem.objects.filter(pk=instance.pk).values('slug', 'owner_id').first()
+
+
+@receiver(post_save, sender=HydroponicSystem)
+@receiver(post_delete, sender=HydroponicSystem)
+def invalidate_system(sender, instance, **kwargs):
+    keys = [caching.system_version_key(instance.slug), caching.user_version_key(instance.owner_id)]
+    stored = getattr(instance, '_stored', None)
+    if stored:
+        keys += [caching.system_version_key(stored['slug']), caching.user_version_key(stored['owner_id'])]
+    caching.bump_versions(keys)
+    transaction.on_commit(lambda: caching.bump_versions(keys))
+
+
+def bump_owned_systems(owner_ids):
+    keys = [caching.owned_systems_version_key(owner_id) for owner_id in owner_ids]
+    caching.bump_versions(keys)
+    # again once committed, in case another process cached the systems before the commit
+    transaction.on_commit(lambda: caching.bump_versions(keys))
+
+
+@receiver(post_save, sender=HydroponicSystem)
+def invalidate_saved_owned_systems(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored', None)
+    if stored is None:
+        bump_owned_systems([instance.owner_id])
+    elif (stored['slug'], stored['owner_id']) != (instance.slug, instance.owner_id):
+        bump_owned_systems({stored['owner_id'], instance.owner_id})
+
+
+@receiver(post_delete, sender=HydroponicSystem)
+def invalidate_deleted_owned_systems(sender, instance, **kwargs):
+    bump_owned_systems([instance.owner_id])
+
+
+@receiver(measurements_created, sender=Measurement)
+def publish_created(sender, measurements, **kwargs):
+    system_ids = {measurement.system_id for measurement in measurements}
+    # streams read the new rows, so they must not be woken up before the rows are visible
+    transaction.on_commit(lambda: events.get_broker().publish(system_ids))
+
+
+@receiver(measurements_created, sender=Measurement)
+def evaluate_alerts(sender, measurements, **kwargs):
+    if not settings.DEFER_MEASUREMENT_WORK:
+        alerts.evaluate(measurements)
+
+
+@receiver(measurements_created, sender=Measurement)
+def detect_anomalies(sender, measurements, **kwargs):
+    if not settings.DEFER_MEASUREMENT_WORK:
+        anomalies.detect(measurements)
+
+
+@receiver(measurements_deleted, sender=Measurement)
+def delete_anomalies(sender, measurements, **kwargs):
+    Anomaly.objects.filter(measurement_id__in=[measurement.pk for measurement in measurements]).delete()
+
+
+@receiver(measurements_created, sender=Measurement)
+def defer_created(sender, measurements, **kwargs):
+    if settings.DEFER_MEASUREMENT_WORK:
+        outbox.enqueue(MEASUREMENTS_CREATED, [[
+            [measurement.pk, measurement.system_id, measurement.timestamp.isoformat(),
+             measurement.temperature, measurement.ph, measurement.tds]
+            for measurement in measurements
+        ]])
+
+
+# in order, as the anomaly detectors skip readings older than those they processed
+@outbox.handler(MEASUREMENTS_CREATED, ordered=True)
+def process_created(payloads):
+    measurements = [
+        Measurement(pk=pk, system_id=system_id, timestamp=datetime.fromisoformat(timestamp),
+                    temperature=temperature, ph=ph, tds=tds)
+        for payload in payloads
+        for pk, system_id, timestamp, temperature, ph, tds in payload
+    ]
+    # recomputed rather than added, the measurements may have changed since
+    rollups.recompute(measurements)
+    alerts.evaluate(measurements)
+    anomalies.detect(measurements)
+    # series and anomaly responses changed after the write request
+    system_ids = {measurement.system_id for measurement in measurements}
+    touch_systems(system_ids)
+    caching.bump_for_systems(system_ids)
+
+
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+def forget_compiled_rules(sender, instance, **kwargs):
+    alerts.forget([instance.system_id])
+
+
+@receiver(post_save, sender=DeviceKey)
+@receiver(post_delete, sender=DeviceKey)
+def forget_device_key(sender, instance, **kwargs):
+    authentication.forget([instance.prefix])
+
+
+@receiver(m2m_changed, sender=DeviceKey.systems.through)
+def forget_device_key_systems(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        authentication.forget_systems([instance.pk])
+    else:
+        authentication.forget([instance.prefix])
+    # cached responses of device keys were limited to their previous systems
+    caching.bump_versions([caching.user_version_key(instance.owner_id)])
+
+
+@receiver(post_save, sender=HydroponicSystem)
+@receiver(post_delete, sender=HydroponicSystem)
+def forget_system_device_keys(sender, instance, **kwargs):
+    authentication.forget_systems([instance.pk])
@@ -0,0 +1,262 @@
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .exports import iter_csv, iter_ndjson
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+PACKED_MAGIC = b'HMP1'
+PACKED_METRICS = ['temperature', 'ph', 'tds']
+_PACKED_FIELDS = ['id', 'timestamp'] + PACKED_METRICS
+_PACKED_HEADER = struct.Struct('<4sII')
+_STRING_LENGTH = struct.Struct('<H')
+
+
+def _rows(data):
+    """
+    Return the measurement rows of the response data and the rest of the envelope.
+
+    Args:
+        data: Response data, a paginated page, a list of rows or a single row.
+
+    Returns:
+        tuple: List of rows and the envelope without ``results``, or None if the data is not
+        made of serialized measurements.
+    """
+    if isinstance(data, list):
+        rows, envelope = data, {}
+    elif isinstance(data, dict) and isinstance(data.get('results'), list):
+        rows, envelope = data['results'], {key: value for key, value in data.items() if key != 'results'}
+    elif isinstance(data, dict):
+        rows, envelope = [data], {}
+    else:
+        return None
+    if rows and not all(field in rows[0] for field in _PACKED_FIELDS):
+        return None
+    return rows, envelope
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_varints(buffer, values):
+    for value in values:
+        value = _zigzag(value)
+        while value > 0x7f:
+            buffer.append(value & 0x7f | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+
+def _read_varints(content, offset, count):
+    values = []
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = content[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        values.append(_unzigzag(value))
+    return values, offset
+
+
+def _deltas(values):
+    previous = 0
+    for value in values:
+        yield value - previous
+        previous = value
+
+
+def _cumulative(deltas):
+    total = 0
+    for delta in deltas:
+        total += delta
+        yield total
+
+
+def _to_microseconds(timestamp):
+    if isinstance(timestamp, str):
+        # serialized with a 'Z' suffix, which fromisoformat only accepts since Python 3.11
+        timestamp = parse_datetime(timestamp)
+    return (timestamp - EPOCH) // _MICROSECOND
+
+
+def pack_measurements(rows):
+    """
+    Encode serialized measurements into the packed binary format.
+
+    Layout, little endian:
+
+    * header: magic ``HMP1``, number of rows N and number of systems S as uint32
+    * N float32 values for each of ``temperature``, ``ph`` and ``tds``
+    * N uint16 indexes into the system table
+    * S system URLs, each a uint16 byte length followed by UTF-8 bytes
+    * N zigzag varint deltas of the ids, then N of the timestamps in microseconds since
+      the epoch, each relative to the previous row (the first one to zero)
+
+    Args:
+        rows (list): Serialized measurements with ``id``, ``system``, ``timestamp`` and metrics.
+
+    Returns:
+        bytes: Packed measurements.
+    """
+    systems = {}
+    indexes = array('H', [systems.setdefault(row.get('system') or '', len(systems)) for row in rows])
+    buffer = bytearray(_PACKED_HEADER.pack(PACKED_MAGIC, len(rows), len(systems)))
+    for metric in PACKED_METRICS:
+        buffer += array('f', [row[metric] for row in rows]).tobytes()
+    buffer += indexes.tobytes()
+    for system in systems:
+        encoded = system.encode('utf-8')
+        buffer += _STRING_LENGTH.pack(len(encoded)) + encoded
+    _write_varints(buffer, _deltas(row['id'] for row in rows))
+    _write_varints(buffer, _deltas(_to_microseconds(row['timestamp']) for row in rows))
+    return bytes(buffer)
+
+
+def unpack_measurements(content):
+    """
+    Decode measurements packed by ``pack_measurements``.
+
+    Args:
+        content (bytes): Packed measurements.
+
+    Returns:
+        list: Dictionaries with ``id``, ``system``, ``timestamp`` (aware datetime) and metrics.
+    """
+    magic, count, systems_count = _PACKED_HEADER.unpack_from(content)
+    if magic != PACKED_MAGIC:
+        raise ValueError('Not a packed measurement payload')
+    offset = _PACKED_HEADER.size
+    columns = {}
+    for metric in PACKED_METRICS:
+        columns[metric] = array('f', content[offset:offset + 4 * count]).tolist()
+        offset += 4 * count
+    indexes = array('H', content[offset:offset + 2 * count]).tolist()
+    offset += 2 * count
+    systems = []
+    for _ in range(systems_count):
+        length, = _STRING_LENGTH.unpack_from(content, offset)
+        offset += _STRING_LENGTH.size
+        systems.append(content[offset:offset + length].decode('utf-8'))
+        offset += length
+    id_deltas, offset = _read_varints(content, offset, count)
+    timestamp_deltas, offset = _read_varints(content, offset, count)
+    ids = list(_cumulative(id_deltas))
+    timestamps = [EPOCH + value * _MICROSECOND for value in _cumulative(timestamp_deltas)]
+    return [
+        {
+            'id': ids[i],
+            'system': systems[indexes[i]],
+            'timestamp': timestamps[i],
+            **{metric: columns[metric][i] for metric in PACKED_METRICS},
+        }
+        for i in range(count)
+    ]
+
+
+def _set_pagination_headers(response, envelope):
+    links = [f'<{envelope[rel]}>; rel="{rel}"' for rel in ('next', 'previous') if envelope.get(rel)]
+    if links:
+        response['Link'] = ', '.join(links)
+    if 'count' in envelope:
+        response['X-Total-Count'] = str(envelope['count'])
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Render lists, such as measurement series, as JSON with one array per field.
+
+    ``{"results": [{"id": 1, "ph": 6.1}, {"id": 2, "ph": 6.3}]}`` becomes
+    ``{"results": {"id": [1, 2], "ph": [6.1, 6.3]}}``; the pagination envelope is kept.
+    Anything that is not a list of rows, such as errors, is rendered as regular JSON.
+    """
+    media_type = 'application/vnd.hydroponic.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if self.is_rows(data):
+            data = self.to_columns(data)
+        elif isinstance(data, dict) and self.is_rows(data.get('results')):
+            data = {**data, 'results': self.to_columns(data['results'])}
+        return super().render(data, accepted_media_type, renderer_context)
+
+    @staticmethod
+    def is_rows(data):
+        # e.g. not the list of messages of a ValidationError
+        return isinstance(data, list) and all(isinstance(row, dict) for row in data)
+
+    def to_columns(self, rows):
+        return {name: [row[name] for row in rows] for name in (rows[0] if rows else [])}
+
+
+class PackedMeasurementRenderer(BaseRenderer):
+    """
+    Render measurements in the packed binary format of ``pack_measurements``.
+
+    Only the ids, systems, timestamps and metrics are included. Pagination links and the total
+    count are sent in the ``Link`` and ``X-Total-Count`` headers. Errors are rendered as JSON.
+    """
+    media_type = 'application/vnd.hydroponic.packed'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        extracted = _rows(data)
+        if extracted is None or (response is not None and response.status_code >= 400):
+            if response is not None:
+                response['Content-Type'] = JSONRenderer.media_type
+            return JSONRenderer().render(data, renderer_context=renderer_context)
+        rows, envelope = extracted
+        if response is not None:
+            _set_pagination_headers(response, envelope)
+        return pack_measurements(rows)
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Base of the renderers selecting the format of a streamed response.
+
+    Streams are written by the view, exports with ``encode``; ``render`` only handles responses
+    that are not streamed, such as errors, and renders them as JSON.
+    """
+    charset = 'utf-8'
+    encode = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class CSVExportRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    encode = staticmethod(iter_csv)
+
+
+class NDJSONExportRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    encode = staticmethod(iter_ndjson)
+
+
+class EventStreamRenderer(StreamingRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
@@ -0,0 +1,127 @@
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import caching, rollups, snapshots
+from .models import HydroponicSystem, Measurement
+
+BATCH_SIZE = 5000
+
+
+def retention_cutoff(retention_days, now=None):
+    """
+    Start of the day before which the raw measurements of a system expire.
+
+    Args:
+        retention_days (int): Days of raw measurements kept.
+        now (datetime): Current time, ``timezone.now()`` if None.
+
+    Returns:
+        datetime: Day boundary, so expired days are summarized in complete rollup buckets.
+    """
+    return rollups.truncate((now or timezone.now()) - timedelta(days=retention_days), 'day')
+
+
+def delete_before(system_id, before, batch_size=BATCH_SIZE, pause=0):
+    """
+    Delete the raw measurements of a system older than ``before``, oldest first.
+
+    Every batch of ``batch_size`` rows is deleted and committed on its own, so row locks are
+    held briefly and autovacuum can keep up. No signals are sent: the rows are summarized in the
+    rollups already, and the receivers would recompute them from what is left.
+
+    Args:
+        system_id (int): Primary key of the system.
+        before (datetime): Exclusive upper bound of the deleted timestamps.
+        batch_size (int): Number of rows deleted per transaction.
+        pause (float): Seconds to sleep between batches.
+
+    Yields:
+        int: Number of rows deleted by each batch.
+    """
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    sql = (
+        f'DELETE FROM {table} WHERE id IN ('
+        f'SELECT id FROM {table} WHERE system_id = %s AND timestamp < %s ORDER BY timestamp LIMIT %s)'
+    )
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [system_id, before, batch_size])
+            deleted = cursor.rowcount
+        if deleted:
+            yield deleted
+        if deleted < batch_size:
+            return
+        if pause:
+            time.sleep(pause)
+
+
+def plan(system, now=None):
+    """
+    Describe what compacting a system would do, without changing anything.
+
+    Args:
+        system (HydroponicSystem): System with a ``retention_days``.
+        now (datetime): Current time, ``timezone.now()`` if None.
+
+    Returns:
+        dict: ``cutoff``, number of expired measurements as ``count`` and the ``oldest`` timestamp.
+    """
+    cutoff = retention_cutoff(system.retention_days, now)
+    expired = Measurement.objects.filter(system_id=system.pk, timestamp__lt=cutoff)
+    return {'cutoff': cutoff, **expired.aggregate(count=Count('pk'), oldest=Min('timestamp'))}
+
+
+def compact(system, now=None, batch_size=BATCH_SIZE, pause=0):
+    """
+    Summarize and delete the expired raw measurements of a system, one day at a time.
+
+    For every day, the hourly and daily rollups are recomputed from the raw measurements and
+    ``compacted_until`` is moved past the day in one transaction; then the measurements of the
+    day are deleted in batches. An interrupted run resumes from ``compacted_until``, first
+    deleting what is left of days already summarized. Anomalies and alert events of the
+    deleted measurements are kept.
+
+    Args:
+        system (HydroponicSystem): System with a ``retention_days``.
+        now (datetime): Current time, ``timezone.now()`` if None.
+        batch_size (int): Number of rows deleted per transaction.
+        pause (float): Seconds to sleep between batches.
+
+    Yields:
+        tuple: End of the compacted day and number of measurements deleted.
+    """
+    cutoff = retention_cutoff(system.retention_days, now)
+    day = system.compacted_until
+    if day is not None:
+        deleted = sum(delete_before(system.pk, day, batch_size, pause))
+        if deleted:
+            _deleted(system)
+            yield day, deleted
+    while True:
+        expired = Measurement.objects.filter(system_id=system.pk, timestamp__lt=cutoff)
+        if day is not None:
+            expired = expired.filter(timestamp__gte=day)
+        oldest = expired.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None:
+            return
+        day = rollups.truncate(oldest, 'day')
+        end = day + rollups.PERIODS['day']
+        with transaction.atomic():
+            rollups.recompute_range(system.pk, day, end)
+            HydroponicSystem.objects.filter(pk=system.pk).update(compacted_until=end)
+        system.compacted_until = end
+        deleted = sum(delete_before(system.pk, end, batch_size, pause))
+        _deleted(system)
+        yield end, deleted
+        day = end
+
+
+def _deleted(system):
+    # what the measurements_deleted receivers would do, once per compacted day
+    HydroponicSystem.objects.filter(pk=system.pk).update(modified_at=timezone.now())
+    caching.bump_for_systems([system.pk])
+    snapshots.refresh([system.pk])
@@ -0,0 +1,339 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .aggregates import METRICS, bucket_expression
+from .models import DailyMeasurementRollup, HourlyMeasurementRollup, HydroponicSystem, Measurement
+
+ROLLUP_MODELS = [HourlyMeasurementRollup, DailyMeasurementRollup]
+
+PERIODS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# aggregation bucket -> rollup model able to serve it
+ROLLUP_BUCKETS = {
+    '1h': HourlyMeasurementRollup,
+    '6h': HourlyMeasurementRollup,
+    '1d': DailyMeasurementRollup,
+}
+
+STAT_FIELDS = ['sum', 'sum_squares', 'min', 'max']
+
+
+def truncate(timestamp, period):
+    """
+    Truncate a timestamp to the start of its rollup bucket in the current time zone.
+
+    Args:
+        timestamp (datetime): Aware timestamp.
+        period (str): Rollup period, ``hour`` or ``day``.
+
+    Returns:
+        datetime: Start of the bucket.
+    """
+    timestamp = timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def empty_stats():
+    stats = {'count': 0}
+    for metric in METRICS:
+        stats.update({f'{metric}_sum': 0.0, f'{metric}_sum_squares': 0.0,
+                      f'{metric}_min': None, f'{metric}_max': None})
+    return stats
+
+
+def single_stats(measurement):
+    stats = {'count': 1}
+    for metric in METRICS:
+        value = getattr(measurement, metric)
+        stats.update({f'{metric}_sum': value, f'{metric}_sum_squares': value * value,
+                      f'{metric}_min': value, f'{metric}_max': value})
+    return stats
+
+
+def merge_stats(stats, other):
+    """
+    Merge the statistics of ``other`` into ``stats`` in place.
+
+    Args:
+        stats (dict): Statistics with ``count`` and ``<metric>_<stat>`` keys.
+        other (dict): Statistics with the same keys.
+    """
+    stats['count'] += other['count']
+    for metric in METRICS:
+        stats[f'{metric}_sum'] += other[f'{metric}_sum'] or 0
+        stats[f'{metric}_sum_squares'] += other[f'{metric}_sum_squares'] or 0
+        for stat, pick in (('min', min), ('max', max)):
+            values = [value for value in (stats[f'{metric}_{stat}'], other[f'{metric}_{stat}']) if value is not None]
+            stats[f'{metric}_{stat}'] = pick(values) if values else None
+
+
+def finalize_stats(stats):
+    """
+    Turn merged sums into the min/max/avg/stddev representation of ``aggregate_measurements``.
+
+    Args:
+        stats (dict): Statistics with ``count`` and ``<metric>_<stat>`` keys.
+
+    Returns:
+        dict: Row with ``count`` and ``<metric>_min/max/avg/stddev`` keys.
+    """
+    count = stats['count']
+    row = {'count': count}
+    for metric in METRICS:
+        avg = stats[f'{metric}_sum'] / count if count else None
+        variance = stats[f'{metric}_sum_squares'] / count - avg * avg if count else None
+        row[f'{metric}_min'] = stats[f'{metric}_min']
+        row[f'{metric}_max'] = stats[f'{metric}_max']
+        row[f'{metric}_avg'] = avg
+        row[f'{metric}_stddev'] = max(variance, 0) ** 0.5 if count else None
+    return row
+
+
+def measurement_stats():
+    """
+    Build the aggregates computing rollup statistics from raw measurements.
+
+    Returns:
+        dict: Aggregate expressions keyed by rollup field name.
+    """
+    aggregates = {'count': Count('pk')}
+    for metric in METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_sum_squares'] = Sum(F(metric) * F(metric))
+        aggregates[f'{metric}_min'] = Min(metric)
+        aggregates[f'{metric}_max'] = Max(metric)
+    return aggregates
+
+
+def rollup_stats():
+    """
+    Build the aggregates combining several rollup rows.
+
+    Returns:
+        dict: Aggregate expressions keyed by rollup field name.
+    """
+    aggregates = {'count': Sum('count')}
+    for metric in METRICS:
+        aggregates[f'{metric}_sum'] = Sum(f'{metric}_sum')
+        aggregates[f'{metric}_sum_squares'] = Sum(f'{metric}_sum_squares')
+        aggregates[f'{metric}_min'] = Min(f'{metric}_min')
+        aggregates[f'{metric}_max'] = Max(f'{metric}_max')
+    return aggregates
+
+
+def add_measurements(measurements):
+    """
+    Add newly created measurements to the rollups.
+
+    Deltas are grouped per system and bucket in Python and applied with a single
+    ``INSERT ... ON CONFLICT DO UPDATE`` per rollup table.
+
+    Args:
+        measurements (list): Saved Measurement objects.
+    """
+    for model in ROLLUP_MODELS:
+        deltas = defaultdict(empty_stats)
+        for measurement in measurements:
+            key = (measurement.system_id, truncate(measurement.timestamp, model.period))
+            merge_stats(deltas[key], single_stats(measurement))
+        _upsert(model, sorted(deltas.items()))
+
+
+def _upsert(model, deltas):
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ['system_id', 'bucket', 'count'] + [
+        f'{metric}_{stat}' for metric in METRICS for stat in STAT_FIELDS
+    ]
+    updates = [f'count = {table}.count + EXCLUDED.count']
+    for metric in METRICS:
+        for stat in ('sum', 'sum_squares'):
+            updates.append(f'{metric}_{stat} = {table}.{metric}_{stat} + EXCLUDED.{metric}_{stat}')
+        updates.append(f'{metric}_min = LEAST({table}.{metric}_min, EXCLUDED.{metric}_min)')
+        updates.append(f'{metric}_max = GREATEST({table}.{metric}_max, EXCLUDED.{metric}_max)')
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    params = []
+    for (system_id, bucket), stats in deltas:
+        params.extend([system_id, bucket] + [stats[column] for column in columns[2:]])
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'VALUES {", ".join([row_placeholder] * len(deltas))} '
+        f'ON CONFLICT (system_id, bucket) DO UPDATE SET {", ".join(updates)}'
+    )
+    if deltas:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+def refresh_buckets(measurements):
+    """
+    Recompute the rollup buckets containing the given measurements from raw rows.
+
+    Used after updates and deletes, where min and max cannot be adjusted incrementally.
+
+    Args:
+        measurements (list): Measurement objects whose buckets need refreshing.
+    """
+    compacted = _compacted_until(measurement.system_id for measurement in measurements)
+    for model in ROLLUP_MODELS:
+        keys = {(measurement.system_id, truncate(measurement.timestamp, model.period))
+                for measurement in measurements}
+        _recompute(model, sorted(keys), Measurement.objects, 'timestamp', measurement_stats(), compacted)
+
+
+def recompute(measurements):
+    """
+    Recompute the hourly buckets containing the given measurements from raw rows, and the
+    daily buckets from the hourly ones.
+
+    Unlike ``add_measurements`` the result does not depend on what was applied before, so
+    this is safe to run late, more than once, or after the measurements changed again, as
+    the outbox worker may.
+
+    Args:
+        measurements (list): Measurement objects whose buckets need refreshing.
+    """
+    hours = sorted({(measurement.system_id, truncate(measurement.timestamp, 'hour')) for measurement in measurements})
+    compacted = _compacted_until(system_id for system_id, _ in hours)
+    _recompute(HourlyMeasurementRollup, hours, Measurement.objects, 'timestamp', measurement_stats(), compacted)
+    days = sorted({(system_id, truncate(bucket, 'day')) for system_id, bucket in hours})
+    _recompute(DailyMeasurementRollup, days, HourlyMeasurementRollup.objects, 'bucket', rollup_stats(), compacted)
+
+
+def recompute_range(system_id, start, end):
+    """
+    Recompute the hourly and daily buckets of a system between two day boundaries from raw rows.
+
+    Args:
+        system_id (int): Primary key of the system.
+        start (datetime): Start of the first day.
+        end (datetime): End of the last day.
+    """
+    hours = [(system_id, start + index * PERIODS['hour']) for index in range((end - start) // PERIODS['hour'])]
+    _recompute(HourlyMeasurementRollup, hours, Measurement.objects, 'timestamp', measurement_stats())
+    days = sorted({(system_id, truncate(bucket, 'day')) for _, bucket in hours})
+    _recompute(DailyMeasurementRollup, days, HourlyMeasurementRollup.objects, 'bucket', rollup_stats())
+
+
+def _compacted_until(system_ids):
+    systems = HydroponicSystem.objects.filter(pk__in=set(system_ids), compacted_until__isnull=False)
+    return dict(systems.values_list('pk', 'compacted_until'))
+
+
+def _recompute(model, keys, source, field, aggregates, compacted=None):
+    for system_id, bucket in keys:
+        if compacted and system_id in compacted and bucket < compacted[system_id]:
+            # final, the raw measurements of compacted buckets are gone
+            continue
+        stats = source.filter(
+            system_id=system_id,
+            **{f'{field}__gte': bucket, f'{field}__lt': bucket + PERIODS[model.period]}
+        ).aggregate(**aggregates)
+        if stats['count']:
+            model.objects.update_or_create(system_id=system_id, bucket=bucket, defaults=stats)
+        else:
+            model.objects.filter(system_id=system_id, bucket=bucket).delete()
+
+
+def rebuild(system_ids=None, batch_size=1000):
+    """
+    Rebuild the rollups from scratch.
+
+    The rollups of compacted periods are kept, their raw measurements are gone.
+
+    Args:
+        system_ids (list): Restrict the rebuild to these systems, all systems if None.
+        batch_size (int): Number of rollup rows inserted per query.
+
+    Returns:
+        dict: Number of rollup rows created per model name.
+    """
+    created = {}
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            measurements = Measurement.objects.filter(
+                Q(system__compacted_until__isnull=True) | Q(timestamp__gte=F('system__compacted_until'))
+            )
+            rollups = model.objects.filter(
+                Q(system__compacted_until__isnull=True) | Q(bucket__gte=F('system__compacted_until'))
+            )
+            if system_ids is not None:
+                measurements = measurements.filter(system_id__in=system_ids)
+                rollups = rollups.filter(system_id__in=system_ids)
+            rollups.delete()
+            rows = (
+                measurements
+                .annotate(bucket=Trunc('timestamp', model.period))
+                .order_by()
+                .values('system_id', 'bucket')
+                .annotate(**measurement_stats())
+            )
+            batch = []
+            created[model.__name__] = 0
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    created[model.__name__] += len(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+            created[model.__name__] += len(batch)
+    return created
+
+
+def aggregate_rollups(queryset, systems, bucket, start=None, end=None):
+    """
+    Aggregate measurements per system and time bucket, reading full periods from rollups.
+
+    Rollup periods lying completely within ``[start, end]`` are read from the rollup table
+    of ``ROLLUP_BUCKETS[bucket]``; the partial periods at both ends of the range are
+    aggregated from the raw measurements of ``queryset``.
+
+    Args:
+        queryset (QuerySet): Measurement queryset, already filtered by owner, system and range.
+        systems (QuerySet): HydroponicSystem queryset selecting the same systems as ``queryset``.
+        bucket (str): Bucket name, one of ``ROLLUP_BUCKETS``.
+        start (datetime): Inclusive start of the range, or None.
+        end (datetime): Inclusive end of the range, or None.
+
+    Returns:
+        list: Dictionaries in the format of ``aggregate_measurements``.
+    """
+    model = ROLLUP_BUCKETS[bucket]
+    period = PERIODS[model.period]
+    rollups = model.objects.filter(system__in=systems)
+    edges = queryset.none()
+    if start is not None:
+        full_start = truncate(start, model.period)
+        if full_start < start:
+            full_start += period
+        rollups = rollups.filter(bucket__gte=full_start)
+        edges = edges | queryset.filter(timestamp__lt=full_start)
+    if end is not None:
+        full_end = truncate(end, model.period)
+        rollups = rollups.filter(bucket__lt=full_end)
+        edges = edges | queryset.filter(timestamp__gte=full_end)
+
+    partials = [
+        rollups.annotate(result_bucket=bucket_expression(bucket, field='bucket'))
+        .order_by().values('system__slug', 'result_bucket').annotate(**rollup_stats()),
+        edges.annotate(result_bucket=bucket_expression(bucket))
+        .order_by().values('system__slug', 'result_bucket').annotate(**measurement_stats()),
+    ]
+    merged = defaultdict(empty_stats)
+    for partial in partials:
+        for row in partial:
+            merge_stats(merged[(row['system__slug'], row['result_bucket'])], row)
+    return [
+        {'system__slug': slug, 'bucket': result_bucket, **finalize_stats(stats)}
+        for (slug, result_bucket), stats in sorted(merged.items())
+    ]
@@ -1,7 +1,80 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from .models import HydroponicSystem, Measurement
+from . import alerts
+from .aggregates import METRICS, STATS
+from .authentication import generate_key
+from .models import AlertEvent, AlertRule, Anomaly, DeviceKey, HydroponicSystem, Measurement, MeasurementSnapshot
+from .ownership import for_request
+from .snapshots import from_reading
+
+# digits only, so it matches both the int and the slug path converters
+_URL_SENTINEL = '8462937105'
+
+
+def url_template(view_name, request, lookup_field, format=None):
+    """
+    Reverse ``view_name`` once and return a function filling in the lookup value.
+
+    Args:
+        view_name (str): Name of the URL pattern.
+        request (Request): Request used to build absolute URLs.
+        lookup_field (str): Name of the URL keyword argument.
+        format (str): Format suffix to append, as hyperlinked fields do.
+
+    Returns:
+        callable: Function returning the absolute URL for a lookup value.
+    """
+    url = reverse(view_name, kwargs={lookup_field: _URL_SENTINEL}, request=request, format=format)
+    prefix, suffix = url.rsplit(_URL_SENTINEL, 1)
+    return lambda value: f'{prefix}{value}{suffix}'
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    List serializer with a fast path for rows fetched with ``QuerySet.values()``.
+
+    Instead of running every value through a bound field and calling ``reverse`` for every
+    hyperlink, the child builds a row function once per list with ``get_row_builder``,
+    which produces the same output as its ``to_representation``. Model instances, and
+    serializers without a request in the context, take the regular path.
+    """
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get('request')
+        if request is None or not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        to_row = self.child.get_row_builder(request, self.context.get('format'))
+        return [to_row(row) for row in rows]
+
+
+class SystemHyperlinkField(serializers.HyperlinkedRelatedField):
+    """
+    Hyperlink to one of the hydroponic systems the request may use, see ``systems.ownership``.
+
+    Slugs are resolved from the systems of the request without a query, to an instance with
+    only the primary key and slug of the system loaded. Without a request in the context,
+    the queryset is used.
+    """
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return super().get_queryset()
+        return HydroponicSystem.objects.filter(pk__in=for_request(request).systems.values())
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        request = self.context.get('request')
+        if request is None:
+            return super().get_object(view_name, view_args, view_kwargs)
+        system = for_request(request).get_system(view_kwargs[self.lookup_url_kwarg])
+        if system is None:
+            raise ObjectDoesNotExist
+        return system
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -57,7 +130,8 @@ class HydroponicSystemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = HydroponicSystem
-        fields = ['url', 'id', 'name', 'description', 'owner', 'slug']
+        fields = ['url', 'id', 'name', 'description', 'owner', 'slug', 'retention_days', 'compacted_until']
+        extra_kwargs = {'retention_days': {'min_value': 1}}
 
 
 class HydroponicSystemDetailSerializer(serializers.ModelSerializer):
@@ -65,11 +139,13 @@ class HydroponicSystemDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = HydroponicSystem
-        fields = ['id', 'name', 'description', 'owner', 'slug', 'last_measurements']
+        fields = ['id', 'name', 'description', 'owner', 'slug', 'retention_days', 'compacted_until',
+                  'last_measurements']
+        extra_kwargs = {'retention_days': {'min_value': 1}}
 
     def get_last_measurements(self, obj):
         """
-        Retrieve last measurements for the system.
+        Retrieve last measurements for the system from its snapshot.
 
         Args:
            obj (HydroponicSystem): Hydroponic system object.
@@ -77,9 +153,28 @@ class HydroponicSystemDetailSerializer(serializers.ModelSerializer):
         Returns:
            list: Serialized last measurements.
         """
-        measurements = obj.last_measurements_prefetched
+        try:
+            readings = obj.snapshot.readings
+        except MeasurementSnapshot.DoesNotExist:
+            readings = []
         request = self.context.get('request')
-        return LastMeasurementsSerializer(measurements, many=True, context={'request': request}).data
+        return LastMeasurementsSerializer(
+            [from_reading(reading) for reading in readings], many=True, context={'request': request}
+        ).data
+
+
+class HydroponicSystemStateSerializer(HydroponicSystemDetailSerializer):
+    """
+    Serializer for the current state of a HydroponicSystem, i.e. its last measurements.
+    """
+    url = serializers.HyperlinkedIdentityField(
+        view_name='systems:hydroponic-system-detail',
+        lookup_field='slug'
+    )
+
+    class Meta:
+        model = HydroponicSystem
+        fields = ['url', 'id', 'name', 'slug', 'last_measurements']
 
 
 class LastMeasurementsSerializer(serializers.ModelSerializer):
@@ -93,6 +188,30 @@ class LastMeasurementsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Measurement
         fields = ['url', 'id', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+        list_serializer_class = ValuesListSerializer
+
+    def get_row_builder(self, request, format=None):
+        """
+        Build a function serializing a snapshot reading or a ``values()`` row.
+
+        Args:
+            request (Request): Request used to build absolute URLs.
+            format (str): Format suffix of the URLs.
+
+        Returns:
+            callable: Function returning the serialized row.
+        """
+        measurement_url = url_template('systems:measurement-detail', request, 'pk', format)
+        timestamp = serializers.DateTimeField().to_representation
+        return lambda row: {
+            'url': measurement_url(row['id']),
+            'id': row['id'],
+            'temperature': float(row['temperature']),
+            'ph': float(row['ph']),
+            'tds': float(row['tds']),
+            'description': str(row['description']),
+            'timestamp': timestamp(row['timestamp']),
+        }
 
 
 class MeasurementSerializer(serializers.ModelSerializer):
@@ -102,44 +221,255 @@ class MeasurementSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(
         view_name='systems:measurement-detail',
     )
-    system = serializers.HyperlinkedRelatedField(
+    system = SystemHyperlinkField(
         view_name='systems:hydroponic-system-detail',
         lookup_field='slug',
         queryset=HydroponicSystem.objects.all()
     )
 
+    # columns fetched by the list view for the fast path of ``get_row_builder``
+    values_fields = ['id', 'system__slug', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+
     class Meta:
         model = Measurement
         fields = ['url', 'id', 'system', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+        list_serializer_class = ValuesListSerializer
 
-    def __init__(self, *args, **kwargs):
+    def validate_system(self, value):
         """
-        Initialize the MeasurementSerializer instance.
+        Validate if the user owns the system, and for device keys that the key may use it.
 
-        This method customizes the queryset of the 'system' field based on the requesting user.
+        Answered from the systems of the request, without a query.
 
         Args:
-           *args: Variable length argument list.
-           **kwargs: Arbitrary keyword arguments.
+            value (HydroponicSystem): Hydroponic system object.
 
         Returns:
-           None
+            HydroponicSystem: Validated hydroponic system object.
         """
-        super().__init__(*args, **kwargs)
-        request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            self.fields['system'].queryset = HydroponicSystem.objects.filter(owner=request.user)
+        if not for_request(self.context['request']).owns(value.pk):
+            raise serializers.ValidationError('You can only create measurements for your own hydroponic systems')
+        return value
+
+    def get_row_builder(self, request, format=None):
+        """
+        Build a function serializing a row of ``values_fields``.
+
+        Args:
+            request (Request): Request used to build absolute URLs.
+            format (str): Format suffix of the URLs.
+
+        Returns:
+            callable: Function returning the serialized row.
+        """
+        measurement_url = url_template('systems:measurement-detail', request, 'pk', format)
+        system_url = url_template('systems:hydroponic-system-detail', request, 'slug', format)
+        timestamp = serializers.DateTimeField().to_representation
+        return lambda row: {
+            'url': measurement_url(row['id']),
+            'id': row['id'],
+            'system': system_url(row['system__slug']),
+            'temperature': float(row['temperature']),
+            'ph': float(row['ph']),
+            'tds': float(row['tds']),
+            'description': str(row['description']),
+            'timestamp': timestamp(row['timestamp']),
+        }
+
+
+class MeasurementBulkItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a single item of a bulk measurement upload.
+
+    The system is referenced by slug and resolved against the ``systems`` mapping
+    in the serializer context, so validating an item never hits the database.
+    """
+    system = serializers.SlugField()
+
+    class Meta:
+        model = Measurement
+        fields = ['system', 'temperature', 'ph', 'tds', 'description']
 
     def validate_system(self, value):
         """
         Validate if the user owns the system.
 
         Args:
-            value (HydroponicSystem): Hydroponic system object.
+            value (str): Slug of the hydroponic system.
 
         Returns:
-            HydroponicSystem: Validated hydroponic system object.
+            int: Primary key of the validated hydroponic system.
         """
-        if value.owner != self.context['request'].user:
+        system_id = self.context['systems'].get(value)
+        if system_id is None:
             raise serializers.ValidationError('You can only create measurements for your own hydroponic systems')
+        return system_id
+
+
+class MeasurementAggregateSerializer(serializers.Serializer):
+    """
+    Serializer for one time bucket of aggregated measurements of a system.
+    """
+    system = serializers.SlugField(source='system__slug')
+    bucket = serializers.DateTimeField()
+    count = serializers.IntegerField()
+
+    def to_representation(self, instance):
+        """
+        Group the aggregated values by metric.
+
+        Args:
+            instance (dict): Aggregated row.
+
+        Returns:
+            dict: Serialized row with a nested dictionary of statistics per metric.
+        """
+        data = super().to_representation(instance)
+        for metric in METRICS:
+            data[metric] = {stat: instance[f'{metric}_{stat}'] for stat in STATS}
+        return data
+
+
+class SeriesQuerySerializer(serializers.Serializer):
+    """
+    Serializer for the query parameters of a downsampled measurement series.
+    """
+    metric = serializers.MultipleChoiceField(choices=METRICS, required=False)
+    points = serializers.IntegerField(min_value=3, max_value=10000, default=1000)
+    timestamp_min = serializers.DateTimeField(required=False)
+    timestamp_max = serializers.DateTimeField(required=False)
+    source = serializers.ChoiceField(choices=['auto', 'raw', 'hourly'], default='auto')
+
+    def validate_metric(self, value):
+        """
+        Order the requested metrics, all of them if none is given.
+
+        Args:
+            value (set): Requested metric names.
+
+        Returns:
+            list: Metric names in the order of ``METRICS``.
+        """
+        return [metric for metric in METRICS if metric in value]
+
+
+class AlertRuleSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the AlertRule model.
+    """
+    url = serializers.HyperlinkedIdentityField(
+        view_name='systems:alert-rule-detail',
+    )
+    system = SystemHyperlinkField(
+        view_name='systems:hydroponic-system-detail',
+        lookup_field='slug',
+        queryset=HydroponicSystem.objects.all()
+    )
+
+    class Meta:
+        model = AlertRule
+        fields = ['url', 'id', 'system', 'name', 'metric', 'minimum', 'maximum', 'hysteresis', 'sustained_for',
+                  'webhook_url', 'is_active', 'firing', 'breach_started_at']
+        read_only_fields = ['firing', 'breach_started_at']
+
+    def validate_webhook_url(self, value):
+        """
+        Validate that the webhook may be called, see ``alerts.check_webhook_url``.
+
+        Args:
+            value (str): Webhook URL, or an empty string.
+
+        Returns:
+            str: Validated webhook URL.
+        """
+        if value:
+            try:
+                alerts.check_webhook_url(value)
+            except ValueError as exc:
+                raise serializers.ValidationError(str(exc))
         return value
+
+    def validate(self, attrs):
+        """
+        Validate that the rule has a non-empty range and a hysteresis fitting into it.
+
+        Args:
+            attrs (dict): Field values.
+
+        Returns:
+            dict: Validated field values.
+        """
+        minimum = attrs.get('minimum', getattr(self.instance, 'minimum', None))
+        maximum = attrs.get('maximum', getattr(self.instance, 'maximum', None))
+        hysteresis = attrs.get('hysteresis', getattr(self.instance, 'hysteresis', 0))
+        if minimum is None and maximum is None:
+            raise serializers.ValidationError('Set a minimum, a maximum or both')
+        if hysteresis < 0:
+            raise serializers.ValidationError({'hysteresis': 'Must not be negative'})
+        if minimum is not None and maximum is not None and maximum - minimum < 2 * hysteresis:
+            raise serializers.ValidationError('The range must be wider than twice the hysteresis')
+        return attrs
+
+
+class AlertEventSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the AlertEvent model.
+    """
+    rule = serializers.HyperlinkedRelatedField(
+        view_name='systems:alert-rule-detail',
+        read_only=True
+    )
+    system = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+
+    class Meta:
+        model = AlertEvent
+        fields = ['id', 'rule', 'system', 'kind', 'metric', 'value', 'measurement_id', 'timestamp', 'created_at',
+                  'delivered_at']
+
+
+class AnomalySerializer(serializers.ModelSerializer):
+    """
+    Serializer for the Anomaly model.
+    """
+    system = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+
+    class Meta:
+        model = Anomaly
+        fields = ['id', 'system', 'kind', 'metric', 'value', 'score', 'measurement_id', 'timestamp', 'created_at']
+
+
+class DeviceKeySerializer(serializers.ModelSerializer):
+    """
+    Serializer for the DeviceKey model.
+
+    The key itself is only included in the response creating it; afterwards only its hash is known.
+    """
+    url = serializers.HyperlinkedIdentityField(
+        view_name='systems:device-key-detail',
+    )
+    systems = SystemHyperlinkField(
+        view_name='systems:hydroponic-system-detail',
+        lookup_field='slug',
+        many=True,
+        queryset=HydroponicSystem.objects.all()
+    )
+    key = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = DeviceKey
+        fields = ['url', 'id', 'name', 'prefix', 'key', 'systems', 'created_at', 'last_used_at', 'revoked_at']
+
+    def create(self, validated_data):
+        """
+        Create a device key with a newly generated key.
+
+        Args:
+            validated_data (dict): Validated data for key creation.
+
+        Returns:
+            DeviceKey: Newly created key, with the key itself as its ``key`` attribute.
+        """
+        prefix, key, key_hash = generate_key()
+        instance = super().create({**validated_data, 'prefix': prefix, 'key_hash': key_hash})
+        instance.key = key
+        return instance
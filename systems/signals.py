@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Sent after measurements are inserted, within the inserting transaction.
+# Arguments: measurements (list of saved Measurement objects).
+measurements_created = Signal()
+
+# Sent after a measurement is updated, within the updating transaction.
+# Arguments: measurements (list of updated Measurement objects),
+# previous (list of the same measurements as they were stored before the update).
+measurements_updated = Signal()
+
+# Sent after measurements are deleted, within the deleting transaction.
+# Arguments: measurements (list of deleted Measurement objects).
+measurements_deleted = Signal()
@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from .models import Measurement, MeasurementSnapshot
+
+_timestamp_field = serializers.DateTimeField()
+
+
+def to_reading(measurement):
+    """
+    Convert a measurement into the compact reading stored in a snapshot.
+
+    Args:
+        measurement (Measurement): Saved measurement.
+
+    Returns:
+        list: Values of ``MeasurementSnapshot.FIELDS``.
+    """
+    return [
+        measurement.pk,
+        measurement.temperature,
+        measurement.ph,
+        measurement.tds,
+        measurement.description,
+        _timestamp_field.to_representation(measurement.timestamp),
+    ]
+
+
+def _newest_first(reading):
+    # fromisoformat only accepts the 'Z' suffix of the serialized timestamps since Python 3.11
+    return parse_datetime(reading[-1]), reading[0]
+
+
+def add_measurements(measurements):
+    """
+    Merge newly created measurements into the snapshots of their systems.
+
+    Missing snapshots are created first, then all affected snapshots are locked in primary key
+    order, merged in Python and written back with a single ``bulk_update``.
+
+    Args:
+        measurements (list): Saved Measurement objects.
+    """
+    readings = defaultdict(list)
+    for measurement in measurements:
+        readings[measurement.system_id].append(to_reading(measurement))
+    MeasurementSnapshot.objects.bulk_create(
+        [MeasurementSnapshot(system_id=system_id) for system_id in readings], ignore_conflicts=True
+    )
+    snapshots = list(
+        MeasurementSnapshot.objects.select_for_update().filter(system_id__in=readings).order_by('pk')
+    )
+    now = timezone.now()
+    for snapshot in snapshots:
+        merged = snapshot.readings + readings[snapshot.system_id]
+        snapshot.readings = sorted(merged, key=_newest_first, reverse=True)[:MeasurementSnapshot.SIZE]
+        snapshot.updated_at = now
+    MeasurementSnapshot.objects.bulk_update(snapshots, ['readings', 'updated_at'])
+
+
+def refresh(system_ids):
+    """
+    Rebuild the snapshots of the given systems from the measurement table.
+
+    Used after updates and deletes, where a reading may have to be replaced by an older one.
+
+    Args:
+        system_ids (iterable): Primary keys of the systems to refresh.
+    """
+    for system_id in sorted(set(system_ids)):
+        latest = Measurement.objects.filter(system_id=system_id).order_by('-timestamp', '-pk')
+        MeasurementSnapshot.objects.update_or_create(
+            system_id=system_id,
+            defaults={'readings': [to_reading(measurement) for measurement in latest[:MeasurementSnapshot.SIZE]]}
+        )
+
+
+def from_reading(reading):
+    """
+    Convert a compact reading back into a dictionary of measurement fields.
+
+    Args:
+        reading (list): Values of ``MeasurementSnapshot.FIELDS``.
+
+    Returns:
+        dict: Measurement fields keyed by name.
+    """
+    return dict(zip(MeasurementSnapshot.FIELDS, reading))
@@ -0,0 +1,179 @@
+import io
+import multiprocessing
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection, connections, transaction
+
+from .models import Measurement
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# binary COPY timestamps count microseconds from 2000-01-01
+POSTGRES_EPOCH_US = 946_684_800_000_000
+
+COLUMNS = ['system_id', 'temperature', 'ph', 'tds', 'description', 'timestamp']
+# a row of binary COPY: the number of fields, then the length and big-endian value of each field
+COPY_ROW = np.dtype([
+    ('fields', '>i2'),
+    ('system_id_length', '>i4'), ('system_id', '>i8'),
+    ('temperature_length', '>i4'), ('temperature', '>f8'),
+    ('ph_length', '>i4'), ('ph', '>f8'),
+    ('tds_length', '>i4'), ('tds', '>f8'),
+    ('description_length', '>i4'),
+    ('timestamp_length', '>i4'), ('timestamp', '>i8'),
+])
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + bytes(8)
+COPY_TRAILER = b'\xff\xff'
+
+
+def generate(count, end, period, rng):
+    """
+    Generate the readings of one system, evenly spread over ``period`` before ``end``.
+
+    Temperature follows a daily curve peaking in the afternoon. Nutrients are dosed at random
+    intervals of a few days: TDS jumps back to its target and then falls as the plants take
+    nutrients up, while pH drifts up from its setpoint and levels off until the next dose
+    brings it down again. Setpoints, rates and the dosing interval differ between systems.
+
+    Args:
+        count (int): Number of readings.
+        end (datetime): Time of the last reading.
+        period (timedelta): Time between the first and the last reading.
+        rng (numpy.random.Generator): Source of the random values.
+
+    Returns:
+        dict: Arrays of ``timestamp`` in microseconds since the Unix epoch, ``temperature``,
+        ``ph`` and ``tds``.
+    """
+    end_us = (end - UNIX_EPOCH) // timedelta(microseconds=1)
+    elapsed = np.linspace(0, period / timedelta(microseconds=1), count).astype(np.int64)
+    timestamps = end_us - (elapsed[-1] - elapsed)
+    noise = rng.normal(size=(3, count))
+
+    hour = (timestamps % MICROSECONDS_PER_DAY) / MICROSECONDS_PER_DAY * 24
+    temperature = rng.uniform(19, 23) + rng.uniform(1, 3) * np.cos((hour - 15) / 24 * 2 * np.pi) + 0.1 * noise[0]
+
+    interval = rng.uniform(2, 5) * MICROSECONDS_PER_DAY
+    doses = np.sort(rng.uniform(timestamps[0], timestamps[-1], rng.poisson((timestamps[-1] - timestamps[0]) / interval)))
+    # the last dose before the first reading
+    doses = np.concatenate([[timestamps[0] - rng.uniform(0, interval)], doses])
+    since_dose = (timestamps - doses[np.searchsorted(doses, timestamps, side='right') - 1]) / MICROSECONDS_PER_DAY
+
+    # uptake is proportional to the nutrients left in the solution
+    tds = rng.uniform(600, 900) * np.exp(-rng.uniform(0.05, 0.1) * since_dose) + 3 * noise[1]
+    # the nutrient solution buffers pH, so the drift slows down towards a maximum rise
+    rise = rng.uniform(0.3, 0.6)
+    ph = rng.uniform(5.8, 6.2) + rise * (1 - np.exp(-rng.uniform(0.05, 0.15) * since_dose / rise)) + 0.02 * noise[2]
+
+    return {
+        'timestamp': timestamps,
+        'temperature': temperature.round(2),
+        'ph': ph.round(3),
+        'tds': tds.round(1),
+    }
+
+
+def _copy(readings):
+    """
+    Insert readings with one binary ``COPY``.
+    """
+    rows = np.zeros(len(readings['timestamp']), dtype=COPY_ROW)
+    rows['fields'] = len(COLUMNS)
+    for name in ['system_id', 'temperature', 'ph', 'tds', 'timestamp']:
+        rows[f'{name}_length'] = 8
+    for name in ['system_id', 'temperature', 'ph', 'tds']:
+        rows[name] = readings[name]
+    rows['timestamp'] = readings['timestamp'] - POSTGRES_EPOCH_US
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(column) for column in COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT binary)',
+                                  io.BytesIO(COPY_HEADER + rows.tobytes() + COPY_TRAILER))
+
+
+def _insert(readings):
+    """
+    Insert readings with batched INSERTs, on databases without ``COPY``.
+
+    ``bulk_create`` cannot be used: it replaces the timestamps with the current time.
+    """
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(column) for column in COLUMNS)
+    field = Measurement._meta.get_field('timestamp')
+    timestamps = [
+        field.get_db_prep_save(UNIX_EPOCH + timedelta(microseconds=value), connection)
+        for value in readings['timestamp'].tolist()
+    ]
+    rows = zip(readings['system_id'].tolist(), readings['temperature'].tolist(), readings['ph'].tolist(),
+               readings['tds'].tolist(), [''] * len(timestamps), timestamps)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s, %s)', list(rows))
+
+
+def _write(systems, count, end, period, seed, batch_size):
+    """
+    Generate and insert the readings of ``(index, system_id)`` pairs.
+    """
+    write = _copy if connection.vendor == 'postgresql' else _insert
+    pending = []
+    size = 0
+    for index, system_id in systems:
+        readings = generate(count, end, period, np.random.default_rng([seed, index]))
+        readings['system_id'] = np.full(count, system_id, dtype=np.int64)
+        pending.append(readings)
+        size += count
+        if size >= batch_size:
+            write({name: np.concatenate([batch[name] for batch in pending]) for name in pending[0]})
+            pending, size = [], 0
+    if pending:
+        write({name: np.concatenate([batch[name] for batch in pending]) for name in pending[0]})
+
+
+def _work(systems, count, end, period, seed, batch_size):
+    try:
+        _write(systems, count, end, period, seed, batch_size)
+    finally:
+        connections.close_all()
+
+
+def generate_measurements(systems, count, end=None, period=timedelta(days=30), seed=0, batch_size=100_000,
+                          workers=1):
+    """
+    Generate ``count`` measurements per system and insert them in bulk.
+
+    Readings are generated with NumPy, see ``generate``, and written with binary ``COPY`` on
+    PostgreSQL. The values depend only on the seed, the position of a system in ``systems``
+    and the time of day, so the same arguments give the same data. No signals are sent and
+    the rollups, snapshots, alerts and anomalies are not updated.
+
+    With several workers the systems are shared between forked processes with their own
+    database connections, so the systems must be committed and no transaction may be open.
+
+    Args:
+        systems (list): HydroponicSystem objects or primary keys.
+        count (int): Number of measurements per system.
+        end (datetime): Time of the last measurement, the current time if None.
+        period (timedelta): Time between the first and the last measurement of a system.
+        seed (int): Seed of the random values.
+        batch_size (int): Approximate number of rows per ``COPY``.
+        workers (int): Number of processes, only used on PostgreSQL.
+
+    Returns:
+        int: Number of measurements created.
+    """
+    if count <= 0:
+        return 0
+    systems = list(enumerate(getattr(system, 'pk', system) for system in systems))
+    end = end or datetime.now(dt_timezone.utc)
+    workers = min(workers, len(systems)) if connection.vendor == 'postgresql' else 1
+    if workers <= 1:
+        _write(systems, count, end, period, seed, batch_size)
+    else:
+        # forked workers must not share the connections of the parent
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers) as pool:
+            pool.starmap(_work, [(systems[start::workers], count, end, period, seed, batch_size)
+                                 for start in range(workers)])
+    return count * len(systems)
@@ -0,0 +1,286 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+import factory
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from systems import anomalies, rollups, snapshots, urls
+from systems.authentication import generate_key
+from systems.models import AlertRule, DeviceKey, HydroponicSystem, Measurement
+from .factories import HydroponicSystemFactory, MeasurementFactory, UserFactory
+
+# volumes seeded at scale 1
+USERS = 1000
+SYSTEMS = 10_000
+MEASUREMENTS = 50_000_000
+
+# endpoints that cannot be measured with the test client, with the reason
+SKIPPED = {
+    'measurement-stream': 'long-lived event stream, measure it with loadtest under ASGI',
+}
+
+
+def seed(scale=1.0, random_seed=0, workers=1):
+    """
+    Seed users, systems and measurements at ``scale`` times the full volumes.
+
+    Every user owns the same number of systems. The systems of the first user, whose requests
+    are measured, also get alert rules and detected anomalies. Rollups and snapshots are
+    rebuilt once at the end.
+
+    Args:
+        scale (float): Fraction of ``USERS``, ``SYSTEMS`` and ``MEASUREMENTS``.
+        random_seed (int): Seed of the measurement values.
+        workers (int): Number of processes writing measurements.
+
+    Returns:
+        dict: Number of seeded users, systems and measurements.
+    """
+    users = UserFactory.create_bulk(max(1, round(USERS * scale)))
+    systems = HydroponicSystemFactory.create_bulk(max(1, round(SYSTEMS * scale)), owner=factory.Iterator(users))
+    per_system = round(MEASUREMENTS * scale) // len(systems)
+    measurements = MeasurementFactory.seed_measurements(systems, per_system, seed=random_seed, workers=workers)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {connection.ops.quote_name(Measurement._meta.db_table)}')
+    rollups.rebuild()
+    snapshots.refresh([system.pk for system in systems])
+    own_systems = [system for system in systems if system.owner_id == users[0].pk]
+    AlertRule.objects.bulk_create([
+        AlertRule(system=system, name='pH range', metric='ph', minimum=5.8, maximum=6.2, hysteresis=0.05)
+        for system in own_systems
+    ])
+    for system in own_systems:
+        anomalies.backfill(system.pk)
+    return {'users': len(users), 'systems': len(systems), 'measurements': measurements}
+
+
+def load_fixture():
+    """
+    Find the objects the benchmarked requests refer to in a seeded database.
+
+    A new device key is created for the systems of the user, as keys cannot be read back.
+
+    Returns:
+        dict: The user, one of their systems, a measurement and alert rule of it, and the device key.
+    """
+    user = User.objects.order_by('pk').first()
+    systems = list(HydroponicSystem.objects.filter(owner=user).order_by('pk'))
+    system = systems[0]
+    prefix, key, key_hash = generate_key()
+    device_key = DeviceKey.objects.create(owner=user, name='benchmark', prefix=prefix, key_hash=key_hash)
+    device_key.systems.set(systems)
+    return {
+        'user': user,
+        'system': system,
+        'measurement': Measurement.objects.filter(system=system).order_by('-timestamp').first(),
+        'rule': AlertRule.objects.filter(system=system).first(),
+        'device_key': device_key,
+        'key': key,
+    }
+
+
+class Case:
+    """
+    A request to measure.
+
+    ``data`` may be a function of the iteration number, for payloads that must differ between
+    requests. Requests with ``device`` are authenticated with the fixture's device key instead
+    of as the user.
+    """
+
+    def __init__(self, name, url_name, method='get', kwargs=None, params=None, data=None, format='json',
+                 content_type=None, device=False):
+        self.name = name
+        self.url_name = url_name
+        self.method = method
+        self.kwargs = kwargs
+        self.params = params or {}
+        self.data = data
+        self.format = format
+        self.content_type = content_type
+        self.device = device
+
+    def path(self):
+        return reverse(f'systems:{self.url_name}', kwargs=self.kwargs)
+
+    def send(self, client, iteration, cached):
+        """
+        Send the request and read the whole response.
+
+        GET requests carry a ``nocache`` parameter unique to the iteration unless ``cached`` is
+        set, so responses are computed rather than served from the response cache.
+        """
+        if self.method == 'get':
+            params = dict(self.params) if cached else {**self.params, 'nocache': iteration}
+            response = client.get(self.path(), params)
+        else:
+            data = self.data(iteration) if callable(self.data) else self.data
+            if self.content_type:
+                response = client.generic(self.method.upper(), self.path(), data, content_type=self.content_type)
+            else:
+                response = getattr(client, self.method)(self.path(), data, format=self.format)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+
+def cases(fixture):
+    """
+    Build the requests measured for every endpoint of ``systems.urls``.
+    """
+    system = fixture['system']
+    system_url = reverse('systems:hydroponic-system-detail', kwargs={'slug': system.slug})
+    reading = {'system': system_url, 'temperature': 21.5, 'ph': 6.1, 'tds': 640}
+    items = [{'system': system.slug, 'temperature': 21.5, 'ph': 6.1, 'tds': 640}] * 500
+    upload = ''.join(json.dumps({**item, 'ph': 6 + index / 1000}) + '\n' for index, item in enumerate(items * 2))
+    return [
+        Case('api-root', 'api-root'),
+        Case('user-create', 'user-create', 'post', data=lambda iteration: {
+            'username': f'benchmark-{iteration}', 'email': f'benchmark-{iteration}@example.com', 'password': 'secret',
+        }),
+        Case('hydroponic-system-list', 'hydroponic-system-list'),
+        Case('hydroponic-system-create', 'hydroponic-system-list', 'post', data=lambda iteration: {
+            'name': f'benchmark {iteration}', 'owner': fixture['user'].pk,
+        }),
+        Case('hydroponic-system-detail', 'hydroponic-system-detail', kwargs={'slug': system.slug}),
+        Case('hydroponic-system-update', 'hydroponic-system-detail', 'patch', kwargs={'slug': system.slug},
+             data=lambda iteration: {'description': f'benchmark {iteration}'}),
+        Case('hydroponic-system-series', 'hydroponic-system-series', kwargs={'slug': system.slug}),
+        Case('measurement-list', 'measurement-list'),
+        Case('measurement-list-packed', 'measurement-list', params={'format': 'packed', 'limit': 1000}),
+        Case('measurement-create', 'measurement-list', 'post', data=reading),
+        Case('measurement-create-device', 'measurement-list', 'post', data=reading, device=True),
+        Case('measurement-latest', 'measurement-latest'),
+        Case('measurement-aggregate', 'measurement-aggregate', params={'bucket': '1h'}),
+        Case('measurement-export', 'measurement-export', params={'system__slug': system.slug}),
+        Case('measurement-bulk-create', 'measurement-bulk-create', 'post', data=items),
+        Case('measurement-upload', 'measurement-upload', 'post', data=upload, content_type='application/x-ndjson'),
+        Case('measurement-detail', 'measurement-detail', kwargs={'pk': fixture['measurement'].pk}),
+        Case('alert-rule-list', 'alert-rule-list'),
+        Case('alert-rule-create', 'alert-rule-list', 'post', data={
+            'system': system_url, 'name': 'TDS', 'metric': 'tds', 'minimum': 500, 'maximum': 900,
+        }),
+        Case('alert-rule-detail', 'alert-rule-detail', kwargs={'pk': fixture['rule'].pk}),
+        Case('alert-event-list', 'alert-event-list'),
+        Case('anomaly-list', 'anomaly-list'),
+        Case('device-key-list', 'device-key-list'),
+        Case('device-key-create', 'device-key-list', 'post', data={'name': 'sensor', 'systems': [system_url]}),
+        Case('device-key-detail', 'device-key-detail', kwargs={'pk': fixture['device_key'].pk}),
+        Case('async-measurement-list', 'async-measurement-list'),
+        Case('async-measurement-create', 'async-measurement-list', 'post', data=reading),
+        Case('async-measurement-bulk-create', 'async-measurement-bulk-create', 'post', data=items),
+    ]
+
+
+def uncovered(benchmark_cases):
+    """
+    Names of the URL patterns of ``systems.urls`` without a case or a reason to skip them.
+    """
+    names = {pattern.name for pattern in urls.urlpatterns}
+    return names - {case.url_name for case in benchmark_cases} - set(SKIPPED)
+
+
+def measure(case, fixture, iterations=50, warmup=3, memory_iterations=3, cached=False):
+    """
+    Measure the latency, queries and allocated memory of a request.
+
+    Every request runs in a transaction that is rolled back, so writes do not change the data
+    measured by later requests or runs. Memory is traced in separate iterations, as tracing
+    slows Python down.
+
+    Args:
+        case (Case): Request to measure.
+        fixture (dict): Result of ``load_fixture``.
+        iterations (int): Number of timed requests.
+        warmup (int): Number of requests sent before, e.g. to fill in-process caches.
+        memory_iterations (int): Number of requests with traced memory allocations.
+        cached (bool): Whether GET responses may be served from the response cache.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, queries per request, peak allocated memory
+        in KiB and the response status codes.
+    """
+    client = APIClient()
+    if case.device:
+        client.credentials(HTTP_AUTHORIZATION=f"Api-Key {fixture['key']}")
+    else:
+        client.force_authenticate(user=fixture['user'])
+
+    def send(iteration):
+        with transaction.atomic():
+            response = case.send(client, iteration, cached)
+            transaction.set_rollback(True)
+        return response
+
+    for iteration in range(warmup):
+        send(iteration)
+    latencies = []
+    queries = []
+    statuses = set()
+    for iteration in range(warmup, warmup + iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = send(iteration)
+            latencies.append(time.perf_counter() - started)
+        # the savepoint statements of the rollback are not part of the request
+        queries.append(sum(1 for query in context.captured_queries if 'SAVEPOINT' not in query['sql']))
+        statuses.add(response.status_code)
+    peaks = []
+    for iteration in range(warmup + iterations, warmup + iterations + memory_iterations):
+        tracemalloc.start()
+        try:
+            send(iteration)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'name': case.name,
+        'method': case.method.upper(),
+        'path': case.path(),
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'queries': statistics.median(queries),
+        'max_queries': max(queries),
+        'peak_memory_kib': round(max(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def compare(previous, current, threshold=0.2):
+    """
+    Compare two benchmark results.
+
+    Args:
+        previous (dict): Earlier result, as written by the ``benchmark_api`` command.
+        current (dict): Later result.
+        threshold (float): Relative p50 latency or memory increase reported as a regression.
+
+    Returns:
+        list: ``(name, changes, regressed)`` of every endpoint measured in both, where
+        ``changes`` maps the metrics to their previous and current values.
+    """
+    earlier = {result['name']: result for result in previous['results']}
+    rows = []
+    for result in current['results']:
+        before = earlier.get(result['name'])
+        if before is None:
+            continue
+        changes = {metric: (before[metric], result[metric])
+                   for metric in ['p50_ms', 'p99_ms', 'queries', 'peak_memory_kib']}
+        regressed = (
+            result['queries'] > before['queries']
+            or result['p50_ms'] > before['p50_ms'] * (1 + threshold)
+            or (before['peak_memory_kib'] and result['peak_memory_kib'] > before['peak_memory_kib'] * (1 + threshold))
+        )
+        rows.append((result['name'], changes, bool(regressed)))
+    return rows
@@ -1,10 +1,46 @@
+from datetime import timedelta
+
 import factory
 from django.contrib.auth.models import User
 from factory.django import DjangoModelFactory
+from systems import caching, receivers, synthetic
 from systems.models import HydroponicSystem, Measurement
 
 
-class UserFactory(DjangoModelFactory):
+class BulkFactoryMixin:
+    """
+    Fast bulk seeding: objects are built by the factory and inserted with one ``bulk_create``
+    per batch, instead of one INSERT per object. No signals are sent, ``after_bulk_create``
+    does what their receivers must not miss.
+    """
+
+    @classmethod
+    def bulk_declarations(cls):
+        """
+        Declarations overriding the regular ones in ``create_bulk``, e.g. to keep unique fields
+        unique within a batch.
+        """
+        return {}
+
+    @classmethod
+    def after_bulk_create(cls, objs):
+        """
+        Called with the objects of every batch once they are inserted.
+        """
+
+    @classmethod
+    def create_bulk(cls, size, batch_size=1000, **kwargs):
+        model = cls._meta.model
+        created = []
+        for start in range(0, size, batch_size):
+            objs = cls.build_batch(min(batch_size, size - start), **{**cls.bulk_declarations(), **kwargs})
+            objs = model.objects.bulk_create(objs)
+            cls.after_bulk_create(objs)
+            created += objs
+        return created
+
+
+class UserFactory(BulkFactoryMixin, DjangoModelFactory):
     username = factory.Faker('user_name')
     email = factory.Faker('email')
     password = factory.Faker('password')
@@ -12,8 +48,12 @@ class UserFactory(DjangoModelFactory):
     class Meta:
         model = User
 
+    @classmethod
+    def bulk_declarations(cls):
+        return {'username': factory.Sequence(lambda n: f'user{n}')}
 
-class HydroponicSystemFactory(DjangoModelFactory):
+
+class HydroponicSystemFactory(BulkFactoryMixin, DjangoModelFactory):
     owner = factory.SubFactory(UserFactory)
     name = factory.Faker('word')
     description = factory.Faker('text')
@@ -21,6 +61,18 @@ class HydroponicSystemFactory(DjangoModelFactory):
     class Meta:
         model = HydroponicSystem
 
+    @classmethod
+    def bulk_declarations(cls):
+        # the slugs are generated from the names and must not collide within a batch
+        return {'name': factory.Sequence(lambda n: f'system {n}'), 'description': ''}
+
+    @classmethod
+    def after_bulk_create(cls, objs):
+        # post_save is not sent, so the owners' cached systems and responses are invalidated here
+        owner_ids = {system.owner_id for system in objs}
+        receivers.bump_owned_systems(owner_ids)
+        caching.bump_versions(caching.user_version_key(owner_id) for owner_id in owner_ids)
+
 
 class MeasurementFactory(factory.django.DjangoModelFactory):
     system = factory.SubFactory(HydroponicSystemFactory)
@@ -31,3 +83,25 @@ class MeasurementFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = Measurement
+
+    @classmethod
+    def seed_measurements(cls, systems, count, end=None, period=timedelta(days=30), seed=0, batch_size=100_000,
+                          workers=1):
+        """
+        Seed ``count`` synthetic measurements per system, evenly spread over ``period`` before ``end``.
+
+        Readings are generated with NumPy and written with ``COPY``, see
+        ``systems.synthetic.generate_measurements``, so millions of rows take seconds. The
+        ``timestamp`` is written as given, unlike with the ORM. No signals are sent: the systems
+        are touched and their cached responses invalidated here, but the rollups must be rebuilt
+        and the snapshots refreshed afterwards.
+
+        Returns:
+            int: Number of measurements created.
+        """
+        created = synthetic.generate_measurements(systems, count, end=end, period=period, seed=seed,
+                                                  batch_size=batch_size, workers=workers)
+        system_ids = [system.pk for system in systems]
+        receivers.touch_systems(system_ids)
+        caching.bump_for_systems(system_ids)
+        return created
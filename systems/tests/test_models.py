@@ -1,6 +1,25 @@
-from django.test import TestCase
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth.models import User
-from systems.models import HydroponicSystem, Measurement
+from systems import alerts, anomalies, caching, outbox, partitions, retention, rollups, synthetic
+from systems.filters import MeasurementFilter
+from systems.models import (
+    AlertEvent, AlertRule, Anomaly, AnomalyDetectorState, HydroponicSystem, Measurement, HourlyMeasurementRollup,
+    DailyMeasurementRollup, MeasurementSnapshot, OutboxMessage
+)
 from .factories import UserFactory, HydroponicSystemFactory, MeasurementFactory
 
 
@@ -25,3 +44,564 @@ class MeasurementModelTests(TestCase):
         self.assertEqual(self.measurement.system, self.system)
         self.assertTrue(isinstance(self.measurement, Measurement))
         self.assertEqual(str(self.measurement), f"{self.system.name} measurement at {self.measurement.timestamp}")
+
+
+class MeasurementRollupTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory()
+
+    def rollup_state(self):
+        fields = ['system_id', 'bucket', 'count', 'temperature_sum', 'ph_min', 'tds_max']
+        return {
+            model.__name__: list(model.objects.order_by('system_id', 'bucket').values_list(*fields))
+            for model in rollups.ROLLUP_MODELS
+        }
+
+    def assertRollupsConsistent(self):
+        incremental = self.rollup_state()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_state())
+
+    def test_create(self):
+        MeasurementFactory.create_batch(3, system=self.system, temperature=21.5, ph=6.2, tds=640)
+        rollup = HourlyMeasurementRollup.objects.get(system=self.system)
+        self.assertEqual(rollup.count, 3)
+        self.assertRollupsConsistent()
+
+    def test_bulk_create(self):
+        Measurement.objects.bulk_create([
+            Measurement(system=self.system, temperature=value, ph=6, tds=500) for value in range(5)
+        ])
+        rollup = DailyMeasurementRollup.objects.get(system=self.system)
+        self.assertEqual((rollup.count, rollup.temperature_sum, rollup.temperature_max), (5, 10, 4))
+        self.assertRollupsConsistent()
+
+    def test_update(self):
+        measurement = MeasurementFactory(system=self.system, temperature=30)
+        MeasurementFactory(system=self.system, temperature=20)
+        measurement.temperature = 10
+        measurement.system = HydroponicSystemFactory()
+        measurement.save()
+        self.assertEqual(HourlyMeasurementRollup.objects.get(system=self.system).temperature_max, 20)
+        self.assertRollupsConsistent()
+
+    def test_delete(self):
+        measurement = MeasurementFactory(system=self.system)
+        MeasurementFactory(system=self.system)
+        measurement.delete()
+        self.assertEqual(HourlyMeasurementRollup.objects.get(system=self.system).count, 1)
+        Measurement.objects.filter(system=self.system).delete()
+        self.assertFalse(HourlyMeasurementRollup.objects.exists())
+        self.assertRollupsConsistent()
+
+    def test_rebuild_command(self):
+        MeasurementFactory.create_batch(2, system=self.system)
+        HourlyMeasurementRollup.objects.all().delete()
+        call_command('rebuild_rollups', '--system', self.system.slug, stdout=StringIO())
+        self.assertEqual(HourlyMeasurementRollup.objects.get(system=self.system).count, 2)
+
+
+class MeasurementPartitioningTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory()
+        self.current_month = partitions.month_start(timezone.now())
+        self.months = [partitions.add_months(self.current_month, offset) for offset in (-2, -1, 0)]
+        for month in self.months:
+            measurement = MeasurementFactory(system=self.system)
+            Measurement.objects.filter(pk=measurement.pk).update(timestamp=month + timedelta(days=3))
+
+    def partition_names(self):
+        return [name for name, _ in partitions.list_partitions()]
+
+    def test_convert(self):
+        last_id = Measurement.objects.latest('pk').pk
+        partitions.convert(months_ahead=1)
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(self.partition_names(), sorted(
+            [partitions.partition_name(month) for month in self.months]
+            + [partitions.partition_name(partitions.add_months(self.current_month, 1)), partitions.DEFAULT_PARTITION]
+        ))
+        self.assertEqual(Measurement.objects.count(), 3)
+        measurement = MeasurementFactory(system=self.system)
+        self.assertGreater(measurement.pk, last_id)
+        self.assertEqual(Measurement.objects.get(pk=measurement.pk), measurement)
+
+    def test_convert_attach_legacy(self):
+        partitions.convert(months_ahead=0, attach_legacy=True)
+        self.assertIn(partitions.LEGACY_TABLE, self.partition_names())
+        self.assertEqual(Measurement.objects.count(), 3)
+        MeasurementFactory(system=self.system)
+        self.assertEqual(Measurement.objects.count(), 4)
+
+    def test_new_partition_takes_rows_from_default(self):
+        partitions.convert(months_ahead=0)
+        future = partitions.add_months(self.current_month, 2)
+        MeasurementFactory(system=self.system)
+        Measurement.objects.filter(timestamp__gte=self.current_month + timedelta(days=5)).update(
+            timestamp=future + timedelta(days=1))
+        partitions.ensure_partitions(months_ahead=2)
+        self.assertIn(partitions.partition_name(future), self.partition_names())
+        self.assertEqual(Measurement.objects.filter(timestamp__gte=future).count(), 1)
+
+    def test_expire(self):
+        partitions.convert(months_ahead=0)
+        expired = partitions.expire_partitions(self.months[1], drop=True)
+        self.assertEqual(expired, [partitions.partition_name(self.months[0])])
+        self.assertEqual(Measurement.objects.count(), 2)
+
+    def test_timestamp_range_prunes_partitions(self):
+        partitions.convert(months_ahead=0)
+        params = {'timestamp_min': self.months[1].isoformat(),
+                  'timestamp_max': (self.months[1] + timedelta(days=10)).isoformat()}
+        queryset = MeasurementFilter(params, queryset=Measurement.objects.filter(system__owner=self.system.owner)).qs
+        plan = queryset.explain()
+        self.assertIn(partitions.partition_name(self.months[1]), plan)
+        self.assertNotIn(partitions.partition_name(self.months[0]), plan)
+        self.assertNotIn(partitions.partition_name(self.months[2]), plan)
+
+    def test_command_requires_conversion(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_measurements', stdout=StringIO())
+
+
+class AlertEvaluationTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory()
+        self.rule = AlertRule.objects.create(system=self.system, name='pH range', metric='ph',
+                                             minimum=5.5, maximum=6.5, hysteresis=0.2)
+        self.start = timezone.now()
+        self.next_pk = 1
+
+    def readings(self, *values, minutes=1):
+        """
+        Build unsaved measurements of the system, one every ``minutes``.
+        """
+        measurements = []
+        for value in values:
+            measurements.append(Measurement(pk=self.next_pk, system=self.system, temperature=21, ph=value, tds=600,
+                                            timestamp=self.start + timedelta(minutes=self.next_pk * minutes)))
+            self.next_pk += 1
+        return measurements
+
+    def evaluate(self, *values, minutes=1):
+        alerts.evaluate(self.readings(*values, minutes=minutes))
+        return list(AlertEvent.objects.order_by('pk').values_list('kind', 'measurement_id'))
+
+    def test_fires_and_resolves_with_hysteresis(self):
+        self.assertEqual(self.evaluate(6.0, 6.6), [('firing', 2)])
+        # back in range, but not by the hysteresis
+        self.assertEqual(self.evaluate(6.4, 7.0, 6.35), [('firing', 2)])
+        self.assertEqual(self.evaluate(6.2), [('firing', 2), ('resolved', 6)])
+        self.rule.refresh_from_db()
+        self.assertFalse(self.rule.firing)
+
+    def test_sustained_for(self):
+        self.rule.sustained_for = timedelta(minutes=10)
+        self.rule.save()
+        # breaches shorter than 10 minutes do not fire
+        self.assertEqual(self.evaluate(5.0, 5.0, 6.0, 5.0, minutes=3), [])
+        self.assertEqual(self.evaluate(5.0, 5.0, minutes=3), [])
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.breach_started_at, self.start + timedelta(minutes=12))
+        self.assertEqual(self.evaluate(5.0, 5.0, minutes=3), [('firing', 8)])
+
+    def test_batches_are_evaluated_in_time_order(self):
+        alerts.evaluate(self.readings(7.0, 6.0)[::-1])
+        self.assertEqual(list(AlertEvent.objects.values_list('kind', flat=True)), ['firing', 'resolved'])
+
+    def test_query_count_does_not_grow_with_readings(self):
+        self.evaluate(6.0)
+        # rule state update, event insert
+        measurements = self.readings(*[6.0] * 500, *[7.0] * 500)
+        with self.assertNumQueries(2):
+            alerts.evaluate(measurements)
+
+    def test_transition_recorded_by_another_process(self):
+        self.evaluate(6.0)
+        AlertRule.objects.filter(pk=self.rule.pk).update(firing=True)
+        self.assertEqual(self.evaluate(7.0), [])
+        self.assertEqual(self.evaluate(6.0), [('resolved', 3)])
+
+    def test_rolled_back_transition(self):
+        self.evaluate(6.0)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            alerts.evaluate(self.readings(7.0))
+            raise RuntimeError
+        self.assertEqual(self.evaluate(6.0), [])
+        self.assertEqual(self.evaluate(7.0), [('firing', 4)])
+
+    def test_rule_changes_are_compiled(self):
+        self.evaluate(6.0)
+        self.rule.maximum = 5.9
+        self.rule.save()
+        self.assertEqual(self.evaluate(6.0), [('firing', 2)])
+
+    def test_measurement_creation_fires(self):
+        measurement = MeasurementFactory(system=self.system, ph=8.0)
+        event = AlertEvent.objects.get()
+        self.assertEqual((event.rule, event.kind, event.value, event.measurement_id),
+                         (self.rule, AlertEvent.FIRING, 8.0, measurement.pk))
+
+    def test_deliver_webhooks(self):
+        self.rule.webhook_url = 'https://example.com/hook'
+        self.rule.save()
+        self.evaluate(7.0, 6.0)
+        with mock.patch('systems.alerts.resolve_public', return_value=['93.184.215.14']), \
+                mock.patch('systems.alerts.urlopen') as urlopen:
+            urlopen.side_effect = [mock.MagicMock(), OSError('connection refused')]
+            out = StringIO()
+            call_command('process_outbox', '--once', stdout=out)
+        self.assertEqual(out.getvalue().strip(), '1 processed, 1 failed')
+        request = urlopen.call_args_list[0].args[0]
+        self.assertEqual(request.full_url, 'https://example.com/hook')
+        self.assertEqual(json.loads(request.data)['event'], 'firing')
+        delivered, failed = AlertEvent.objects.order_by('pk')
+        self.assertIsNotNone(delivered.delivered_at)
+        self.assertIsNone(failed.delivered_at)
+        self.assertEqual(OutboxMessage.objects.get().payload, {'event_id': failed.pk})
+
+    def test_webhooks_reach_public_addresses_only(self):
+        requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                requests.append(self.path)
+                self.send_response(302)
+                self.send_header('Location', f'http://127.0.0.1:{server.server_port}/internal')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/hook'
+        request = urllib.request.Request(url, data=b'{}', method='POST')
+        with self.assertRaisesMessage(ValueError, 'non-public address 127.0.0.1'):
+            alerts.urlopen(request, timeout=5)
+        self.assertEqual(requests, [])
+        # redirects are not followed, even to an allowed address
+        with mock.patch('systems.alerts.is_public_address', return_value=True):
+            with self.assertRaises(urllib.error.HTTPError):
+                alerts.urlopen(request, timeout=5)
+        self.assertEqual(requests, ['/hook'])
+
+
+@outbox.handler('tests.echo')
+def echo(payloads):
+    for payload in payloads:
+        if payload == 'bad':
+            raise ValueError('bad payload')
+        HydroponicSystem.objects.filter(pk=payload).update(description='processed')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory()
+
+    def test_bad_message_is_retried_alone(self):
+        outbox.enqueue('tests.echo', [self.system.pk, 'bad'])
+        self.assertEqual(outbox.process_batch(), (1, 1))
+        self.system.refresh_from_db()
+        self.assertEqual(self.system.description, 'processed')
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.payload, message.attempts), ('bad', 1))
+        self.assertEqual(message.last_error, 'ValueError: bad payload')
+        self.assertGreater(message.available_at, timezone.now())
+        # not due yet
+        self.assertEqual(outbox.process_batch(), (0, 0))
+
+    def test_claimed_messages_are_leased(self):
+        outbox.enqueue('tests.echo', [self.system.pk])
+        now = timezone.now()
+        self.assertEqual(len(outbox.claim(10, now)), 1)
+        # hidden from other workers until the lease expires
+        self.assertEqual(outbox.claim(10, now), [])
+        self.assertEqual(outbox.process_batch(), (0, 0))
+        self.assertEqual(len(outbox.claim(10, now + outbox.LEASE)), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        outbox.enqueue('tests.unknown', [1])
+        for attempt in range(outbox.MAX_ATTEMPTS):
+            OutboxMessage.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.process_batch(), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertIsNotNone(message.failed_at)
+        self.assertIn('LookupError', message.last_error)
+        OutboxMessage.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.process_batch(), (0, 0))
+        self.assertEqual(outbox.stats()['failed'], 1)
+
+    def test_stats(self):
+        outbox.enqueue('tests.echo', [self.system.pk])
+        OutboxMessage.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        stats = outbox.stats()
+        self.assertEqual((stats['pending'], stats['failed']), (1, 0))
+        self.assertGreaterEqual(stats['lag'], 120)
+        out = StringIO()
+        call_command('process_outbox', '--stats', stdout=out)
+        self.assertTrue(out.getvalue().startswith('pending 1, failed 0, lag 12'))
+
+    @override_settings(DEFER_MEASUREMENT_WORK=True)
+    def test_deferred_measurement_work(self):
+        rule = AlertRule.objects.create(system=self.system, name='pH', metric='ph', maximum=7)
+        MeasurementFactory(system=self.system, temperature=21, ph=8, tds=600)
+        Measurement.objects.bulk_create([
+            Measurement(system=self.system, temperature=22, ph=6, tds=650),
+            Measurement(system=self.system, temperature=23, ph=6.5, tds=700),
+        ])
+        self.assertFalse(HourlyMeasurementRollup.objects.exists())
+        self.assertFalse(AlertEvent.objects.exists())
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        # changed before the worker got to it
+        measurement = Measurement.objects.get(temperature=23)
+        measurement.tds = 750
+        measurement.save()
+        outbox.process_batch()
+
+        hourly = HourlyMeasurementRollup.objects.get()
+        daily = DailyMeasurementRollup.objects.get()
+        for rollup in (hourly, daily):
+            self.assertEqual((rollup.count, rollup.tds_sum, rollup.ph_max), (3, 2000, 8))
+        self.assertEqual(list(rule.events.values_list('kind', flat=True)), ['firing', 'resolved'])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(DEFER_MEASUREMENT_WORK=True)
+    def test_deferred_measurement_work_invalidates_caches(self):
+        MeasurementFactory(system=self.system)
+        modified_at = timezone.now() - timedelta(hours=1)
+        HydroponicSystem.objects.filter(pk=self.system.pk).update(modified_at=modified_at)
+        version, = caching.get_versions([caching.system_version_key(self.system.slug)])
+        outbox.process_batch()
+        # the ETags of series and anomaly lists change once the worker has processed the measurement
+        self.assertGreater(HydroponicSystem.objects.get(pk=self.system.pk).modified_at, modified_at)
+        self.assertGreater(caching.get_versions([caching.system_version_key(self.system.slug)])[0], version)
+
+    @override_settings(DEFER_MEASUREMENT_WORK=True)
+    def test_ordered_topic_is_handled_by_one_worker(self):
+        MeasurementFactory(system=self.system)
+        taken, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            with outbox.ordered_topics() as busy_topics:
+                self.assertEqual(busy_topics, set())
+                taken.set()
+                release.wait(5)
+            connections['default'].close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        self.assertTrue(taken.wait(5))
+        # later measurements wait until the other worker is done with the ones it claimed
+        self.assertEqual(outbox.process_batch(), (0, 0))
+        release.set()
+        thread.join()
+        self.assertEqual(outbox.process_batch(), (1, 0))
+
+
+class OutboxDeliveryTests(TransactionTestCase):
+    def test_webhooks_are_delivered_outside_of_transactions(self):
+        system = HydroponicSystemFactory()
+        AlertRule.objects.create(system=system, name='pH', metric='ph', maximum=7,
+                                 webhook_url='https://example.com/hook')
+        MeasurementFactory(system=system, temperature=21, ph=8, tds=600)
+        in_atomic_block = []
+
+        def urlopen(request, timeout):
+            in_atomic_block.append(connections['default'].in_atomic_block)
+            return mock.MagicMock()
+
+        with mock.patch('systems.alerts.resolve_public', return_value=['93.184.215.14']), \
+                mock.patch('systems.alerts.urlopen', side_effect=urlopen):
+            self.assertEqual(outbox.process_batch(), (1, 0))
+        self.assertEqual(in_atomic_block, [False])
+        self.assertIsNotNone(AlertEvent.objects.get().delivered_at)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class AnomalyDetectionTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory()
+        rng = np.random.default_rng(7)
+        self.temperature = 21 + rng.normal(0, 0.2, 300)
+        # the temperature sensor gets stuck
+        self.temperature[200:] = 21.5
+        self.ph = 6 + rng.normal(0, 0.02, 300)
+        # the pH starts creeping up
+        self.ph[180:] += np.arange(120) * 0.003
+        self.tds = 800 + rng.normal(0, 5, 300)
+        self.tds[150] = 950
+
+    def create(self, rows, batch_size):
+        for start in range(0, len(rows), batch_size):
+            Measurement.objects.bulk_create([
+                Measurement(system=self.system, temperature=temperature, ph=ph, tds=tds)
+                for temperature, ph, tds in rows[start:start + batch_size]
+            ])
+        return list(self.system.measurements.order_by('timestamp', 'pk').values_list('pk', flat=True))
+
+    def found(self):
+        return list(
+            Anomaly.objects.filter(system=self.system).order_by('timestamp', 'kind')
+            .values_list('measurement_id', 'kind', 'metric')
+        )
+
+    def test_detect(self):
+        ids = self.create(list(zip(self.temperature, self.ph, self.tds)), batch_size=37)
+        found = self.found()
+        self.assertIn((ids[150], Anomaly.SPIKE, 'tds'), found)
+        self.assertIn((ids[259], Anomaly.FLATLINE, 'temperature'), found)
+        drifts = [ids.index(pk) for pk, kind, metric in found if kind == Anomaly.DRIFT]
+        self.assertEqual(len(drifts), 1)
+        self.assertTrue(200 < drifts[0] < 260)
+        self.assertEqual(len(found), 3)
+        spike = Anomaly.objects.get(kind=Anomaly.SPIKE)
+        self.assertEqual(spike.value, 950)
+        self.assertGreater(spike.score, anomalies.SPIKE_THRESHOLD)
+
+    def test_backfill_matches_incremental_detection(self):
+        self.create(list(zip(self.temperature, self.ph, self.tds)), batch_size=1)
+        incremental = self.found()
+        states = list(AnomalyDetectorState.objects.filter(system=self.system).order_by('metric').values())
+
+        out = StringIO()
+        call_command('detect_anomalies', '--system', self.system.slug, '--chunk-rows', '64', stdout=out)
+        self.assertIn('300 measurements, 3 anomalies', out.getvalue())
+        self.assertEqual(self.found(), incremental)
+        for state, backfilled in zip(states, AnomalyDetectorState.objects.filter(system=self.system)
+                                     .order_by('metric').values()):
+            for field in ['count', 'run', 'drifting', 'last_value', 'timestamp']:
+                self.assertEqual(state[field], backfilled[field])
+            for field in ['mean', 'variance', 'baseline']:
+                self.assertAlmostEqual(state[field], backfilled[field])
+
+    def test_delete(self):
+        ids = self.create(list(zip(self.temperature, self.ph, self.tds)), batch_size=300)
+        Measurement.objects.filter(pk=ids[150]).delete()
+        self.assertFalse(Anomaly.objects.filter(measurement_id=ids[150]).exists())
+
+    def test_filter(self):
+        ids = self.create(list(zip(self.temperature, self.ph, self.tds)), batch_size=300)
+        measurements = Measurement.objects.all()
+        self.assertEqual(MeasurementFilter({'anomaly': 'true'}, measurements).qs.count(), 3)
+        self.assertEqual(MeasurementFilter({'anomaly': 'false'}, measurements).qs.count(), 297)
+        self.assertEqual(list(MeasurementFilter({'anomaly_kind': 'spike'}, measurements).qs), [
+            Measurement.objects.get(pk=ids[150])
+        ])
+        self.assertFalse(MeasurementFilter({'anomaly_kind': 'spike', 'anomaly_metric': 'ph'}, measurements).qs)
+
+
+class MeasurementRetentionTests(TestCase):
+    def setUp(self):
+        self.system = HydroponicSystemFactory(retention_days=30)
+        self.now = timezone.now()
+        self.old_day = rollups.truncate(self.now - timedelta(days=40), 'day')
+        offsets = [timedelta(days=40), timedelta(days=40), timedelta(days=35), timedelta(days=10), timedelta(0)]
+        for offset, tds in zip(offsets, [100, 300, 500, 700, 900]):
+            measurement = MeasurementFactory(system=self.system, tds=tds)
+            Measurement.objects.filter(pk=measurement.pk).update(
+                timestamp=rollups.truncate(self.now - offset, 'hour') + timedelta(minutes=tds / 100)
+            )
+        self.kept = MeasurementFactory(system=HydroponicSystemFactory())
+        # rollups are recomputed from the raw measurements before they are deleted
+        HourlyMeasurementRollup.objects.all().delete()
+
+    def test_compact(self):
+        out = StringIO()
+        call_command('compact_measurements', stdout=out)
+        self.assertIn('Compacted 3 measurements.', out.getvalue())
+        self.assertEqual(sorted(self.system.measurements.values_list('tds', flat=True)), [700, 900])
+        self.assertTrue(Measurement.objects.filter(pk=self.kept.pk).exists())
+        self.system.refresh_from_db()
+        self.assertEqual(self.system.compacted_until, rollups.truncate(self.now - timedelta(days=35), 'day')
+                         + timedelta(days=1))
+        hourly = HourlyMeasurementRollup.objects.filter(system=self.system, bucket__lt=self.system.compacted_until)
+        self.assertEqual(sum(hourly.values_list('count', flat=True)), 3)
+        self.assertEqual(hourly.get(bucket=rollups.truncate(self.now - timedelta(days=40), 'hour')).tds_sum, 400)
+        daily = DailyMeasurementRollup.objects.get(system=self.system, bucket=self.old_day)
+        self.assertEqual((daily.count, daily.tds_min, daily.tds_max), (2, 100, 300))
+        # rebuilding the rollups keeps the compacted days
+        rollups.rebuild()
+        self.assertEqual(DailyMeasurementRollup.objects.get(system=self.system, bucket=self.old_day).count, 2)
+        # nothing left to do
+        call_command('compact_measurements', stdout=out)
+        self.assertIn('Compacted 0 measurements.', out.getvalue())
+
+    def test_small_batches(self):
+        processed = list(retention.compact(self.system, now=self.now, batch_size=1))
+        self.assertEqual([deleted for _, deleted in processed], [2, 1])
+        self.assertEqual(self.system.measurements.count(), 2)
+
+    def test_resume(self):
+        # interrupted after summarizing the first day, before deleting its measurements
+        HydroponicSystem.objects.filter(pk=self.system.pk).update(compacted_until=self.old_day + timedelta(days=1))
+        rollups.recompute_range(self.system.pk, self.old_day, self.old_day + timedelta(days=1))
+        # deleting a measurement of a compacted day leaves its summary alone
+        self.system.measurements.filter(tds=100).delete()
+        self.system.refresh_from_db()
+        processed = list(retention.compact(self.system, now=self.now))
+        self.assertEqual(processed[0], (self.old_day + timedelta(days=1), 1))
+        # the summary of the first day was not recomputed from what was left of it
+        self.assertEqual(DailyMeasurementRollup.objects.get(system=self.system, bucket=self.old_day).count, 2)
+        self.assertEqual(self.system.measurements.count(), 2)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('compact_measurements', '--dry-run', stdout=out)
+        self.assertIn(f'{self.system.slug}: would compact 3 measurements', out.getvalue())
+        self.assertEqual(self.system.measurements.count(), 5)
+        self.system.refresh_from_db()
+        self.assertIsNone(self.system.compacted_until)
+
+
+class SyntheticMeasurementTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.end = timezone.now().replace(microsecond=0)
+
+    def test_generate_measurements(self):
+        out = StringIO()
+        call_command('generate_measurements', '--owner', self.user.username, '--create-systems', '2',
+                     '--count', '500', '--days', '5', '--end', self.end.isoformat(), stdout=out)
+        self.assertIn('1000 measurements of 2 systems', out.getvalue())
+        systems = HydroponicSystem.objects.filter(owner=self.user)
+        for system in systems:
+            timestamps = list(system.measurements.order_by('timestamp').values_list('timestamp', flat=True))
+            self.assertEqual((len(timestamps), timestamps[0], timestamps[-1]),
+                             (500, self.end - timedelta(days=5), self.end))
+            hourly = HourlyMeasurementRollup.objects.filter(system=system)
+            self.assertEqual(sum(hourly.values_list('count', flat=True)), 500)
+            self.assertEqual(MeasurementSnapshot.objects.get(system=system).readings[0][0],
+                             system.measurements.get(timestamp=self.end).pk)
+        self.assertTrue(all(5.5 < ph < 7 for ph in Measurement.objects.values_list('ph', flat=True)))
+
+        with self.assertRaises(CommandError):
+            call_command('generate_measurements', '--create-systems', '1', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('generate_measurements', '--system', 'missing', stdout=out)
+
+    def test_deterministic(self):
+        readings = [
+            synthetic.generate(1000, self.end, timedelta(days=10), np.random.default_rng([seed, 0]))
+            for seed in [1, 1, 2]
+        ]
+        self.assertTrue(all(np.array_equal(readings[0][name], readings[1][name]) for name in readings[0]))
+        self.assertFalse(np.array_equal(readings[0]['ph'], readings[2]['ph']))
+        # TDS jumps back up when nutrients are dosed
+        self.assertGreater(np.diff(readings[0]['tds']).max(), 50)
+
+        systems = HydroponicSystemFactory.create_batch(2, owner=self.user)
+        synthetic.generate_measurements(systems, 10, end=self.end, seed=1)
+        self.assertEqual(list(systems[0].measurements.order_by('timestamp').values_list('ph', flat=True)),
+                         synthetic.generate(10, self.end, timedelta(days=30), np.random.default_rng([1, 0]))['ph'].tolist())
+
+    def test_insert_without_copy(self):
+        system = HydroponicSystemFactory(owner=self.user)
+        with mock.patch.object(connections['default'], 'vendor', 'sqlite'):
+            self.assertEqual(synthetic.generate_measurements([system], 10, end=self.end, workers=4), 10)
+        self.assertEqual(system.measurements.order_by('timestamp').last().timestamp, self.end)
+        self.assertEqual(system.measurements.count(), 10)
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from systems import snapshots
+from systems.models import Measurement
+from .factories import HydroponicSystemFactory, UserFactory
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Regression tests asserting that the hot measurement queries can be served by an index.
+
+    Sequential scans are disabled for the planner, so a plan still containing one means
+    that no index exists for the query shape anymore.
+    """
+    systems_count = 20
+    measurements_per_system = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.systems = [HydroponicSystemFactory(owner=cls.user) for _ in range(cls.systems_count)]
+        HydroponicSystemFactory.create_batch(5)
+        start = timezone.now() - timedelta(days=30)
+        measurements = [
+            Measurement(system=system, temperature=20, ph=6, tds=500)
+            for system in cls.systems
+            for _ in range(cls.measurements_per_system)
+        ]
+        Measurement.objects.bulk_create(measurements)
+        step = timedelta(days=30) / len(measurements)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {Measurement._meta.db_table} SET timestamp = %s + (id - %s) * %s',
+                [start, measurements[0].pk, step]
+            )
+            cursor.execute(f'ANALYZE {Measurement._meta.db_table}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def measurement_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        table = Measurement._meta.db_table
+        return [query['sql'] for query in context.captured_queries if f'FROM "{table}"' in query['sql']]
+
+    def assertUsesIndex(self, sql, index=None):
+        plan = self.explain(sql)
+        self.assertNotIn(f'Seq Scan on {Measurement._meta.db_table}', plan, plan)
+        if index is not None:
+            self.assertIn(index, plan, plan)
+
+    def test_snapshot_refresh(self):
+        with CaptureQueriesContext(connection) as context:
+            snapshots.refresh([self.systems[0].pk])
+        table = Measurement._meta.db_table
+        queries = [query['sql'] for query in context.captured_queries if f'FROM "{table}"' in query['sql']]
+        self.assertEqual(len(queries), 1)
+        self.assertUsesIndex(queries[0], 'measurement_system_ts_idx')
+
+    def test_latest_measurements_of_system(self):
+        queryset = Measurement.objects.filter(system=self.systems[0]).order_by('-timestamp')[:10]
+        self.assertUsesIndex(str(queryset.query), 'measurement_system_ts_idx')
+
+    def test_measurement_list(self):
+        url = f"{reverse('systems:measurement-list')}?count=false"
+        for sql in self.measurement_queries(url):
+            self.assertUsesIndex(sql)
+
+    def test_measurement_list_next_page(self):
+        response = self.client.get(f"{reverse('systems:measurement-list')}?count=false&limit=50")
+        for sql in self.measurement_queries(response.data['next']):
+            self.assertUsesIndex(sql)
+
+    def test_measurement_list_timestamp_range(self):
+        now = timezone.now()
+        url = (f"{reverse('systems:measurement-list')}?timestamp_min={(now - timedelta(days=2)).isoformat()}"
+               f"&timestamp_max={(now - timedelta(days=1)).isoformat()}").replace('+', '%2B')
+        for sql in self.measurement_queries(url):
+            self.assertUsesIndex(sql)
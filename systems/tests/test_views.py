@@ -1,9 +1,35 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import sync_to_async
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
+from rest_framework.reverse import reverse as reverse_url
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APITestCase
+from . import benchmarks
 from .factories import HydroponicSystemFactory, UserFactory, MeasurementFactory
-from systems.models import HydroponicSystem, Measurement
+from systems import caching, downsampling, metrics, rollups
+from systems.async_views import MeasurementStream
+from systems.renderers import ColumnarJSONRenderer, unpack_measurements
+from systems.models import AlertEvent, AlertRule, DeviceKey, HydroponicSystem, Measurement
+from systems.serializers import LastMeasurementsSerializer, MeasurementSerializer
+from systems.views import MeasurementUpload
 
 
 class APIRootTests(APITestCase):
@@ -71,6 +97,27 @@ class HydroponicSystemDetailTests(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_last_measurements_from_snapshot(self):
+        measurements = MeasurementFactory.create_batch(12, system=self.system)
+        # modification stamp and the system with its snapshot
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        expected = LastMeasurementsSerializer(
+            sorted(measurements, key=lambda m: (m.timestamp, m.pk), reverse=True)[:10],
+            many=True, context={'request': response.wsgi_request}
+        ).data
+        self.assertEqual(response.data['last_measurements'], expected)
+
+    def test_last_measurements_follow_updates_and_deletes(self):
+        measurements = MeasurementFactory.create_batch(3, system=self.system)
+        measurements[2].delete()
+        measurements[1].description = 'updated'
+        measurements[1].save()
+        response = self.client.get(self.url)
+        last_measurements = response.data['last_measurements']
+        self.assertEqual([m['id'] for m in last_measurements], [measurements[1].pk, measurements[0].pk])
+        self.assertEqual(last_measurements[0]['description'], 'updated')
+
     def test_update(self):
         data = {
             'name': 'Updated Name',
@@ -81,12 +128,151 @@ class HydroponicSystemDetailTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(HydroponicSystem.objects.get(pk=self.system.pk).name, 'Updated Name')
 
+    def test_retention(self):
+        response = self.client.patch(self.url, {'retention_days': 90}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['compacted_until'])
+        response = self.client.patch(self.url, {'retention_days': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_delete(self):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(HydroponicSystem.objects.filter(pk=self.system.pk).exists())
 
 
+class HydroponicSystemSeriesTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.url = reverse('systems:hydroponic-system-series', kwargs={'slug': self.system.slug})
+        self.client.force_authenticate(user=self.user)
+        self.start = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+        # a flat series of 200 readings, one per minute, with a single spike
+        Measurement.objects.bulk_create([
+            Measurement(system=self.system, temperature=20, ph=50 if index == 123 else 6, tds=index)
+            for index in range(200)
+        ])
+        for index, pk in enumerate(self.system.measurements.order_by('pk').values_list('pk', flat=True)):
+            Measurement.objects.filter(pk=pk).update(timestamp=self.start + timedelta(minutes=index))
+        rollups.rebuild()
+
+    def test_downsample(self):
+        response = self.client.get(f'{self.url}?points=20')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['source'], 'raw')
+        self.assertEqual(response.data['count'], 200)
+        ph = response.data['series']['ph']
+        self.assertEqual(len(ph['value']), 20)
+        self.assertEqual(ph['timestamp'][0], '2024-06-01T00:00:00Z')
+        self.assertEqual(ph['timestamp'][-1], '2024-06-01T03:19:00Z')
+        self.assertIn(50, ph['value'])
+        self.assertEqual(ph['timestamp'], sorted(ph['timestamp']))
+        # every metric gets its own points; the linear tds keeps its end points
+        tds = response.data['series']['tds']
+        self.assertEqual((tds['value'][0], tds['value'][-1]), (0, 199))
+
+    def test_short_series_is_returned_whole(self):
+        response = self.client.get(f'{self.url}?metric=tds')
+        self.assertEqual(list(response.data['series']), ['tds'])
+        self.assertEqual(response.data['series']['tds']['value'], list(range(200)))
+
+    def test_range_and_metrics(self):
+        response = self.client.get(
+            f'{self.url}?metric=tds&metric=ph&points=10'
+            f'&timestamp_min=2024-06-01T01:00:00Z&timestamp_max=2024-06-01T02:00:00Z'
+        )
+        self.assertEqual(list(response.data['series']), ['ph', 'tds'])
+        self.assertEqual(response.data['count'], 60)
+        self.assertEqual(response.data['series']['tds']['value'][0], 60)
+        self.assertEqual(response.data['series']['tds']['value'][-1], 119)
+
+    def test_chunked_read_matches_single_read(self):
+        metrics = ['temperature', 'ph', 'tds']
+        first, last = downsampling.to_microseconds(self.start), downsampling.to_microseconds(
+            self.start + timedelta(minutes=199))
+        whole = downsampling.downsample(downsampling.read_series(self.system.pk, metrics), first, last, 17, 3)
+        chunked = downsampling.downsample(
+            downsampling.read_series(self.system.pk, metrics, chunk_rows=7), first, last, 17, 3
+        )
+        self.assertEqual((whole[0], chunked[0]), (200, 200))
+        self.assertTrue(np.array_equal(whole[1], chunked[1]))
+        self.assertTrue(np.array_equal(whole[2], chunked[2]))
+
+    def test_hourly_source(self):
+        response = self.client.get(f'{self.url}?metric=ph&points=3&source=hourly')
+        self.assertEqual(response.data['source'], 'hourly')
+        self.assertEqual(response.data['count'], 200)
+        self.assertEqual(response.data['series']['ph']['value'], [6, 50, 6])
+        self.assertEqual(response.data['series']['ph']['timestamp'][1], '2024-06-01T02:30:00Z')
+
+    def test_long_range_uses_rollups(self):
+        response = self.client.get(f'{self.url}?points=3')
+        self.assertEqual(response.data['source'], 'raw')
+        response = self.client.get(f'{self.url}?points=3&timestamp_min=2024-05-01T00:00:00Z')
+        self.assertEqual(response.data['source'], 'raw')
+        Measurement.objects.filter(pk=self.system.measurements.latest('timestamp').pk).update(
+            timestamp=self.start + timedelta(days=1)
+        )
+        response = self.client.get(f'{self.url}?points=4')
+        self.assertEqual(response.data['source'], 'hourly')
+
+    def test_compacted_range_uses_rollups(self):
+        HydroponicSystem.objects.filter(pk=self.system.pk).update(
+            retention_days=1, compacted_until=self.start + timedelta(hours=1)
+        )
+        self.system.measurements.filter(timestamp__lt=self.start + timedelta(hours=1)).delete()
+        response = self.client.get(f'{self.url}?points=5')
+        self.assertEqual(response.data['source'], 'hourly')
+        self.assertEqual(response.data['count'], 200)
+        response = self.client.get(f'{self.url}?points=5&timestamp_min=2024-06-01T01:00:00Z')
+        self.assertEqual(response.data['source'], 'raw')
+        self.assertEqual(response.data['count'], 140)
+
+    def test_empty(self):
+        system = HydroponicSystemFactory(owner=self.user)
+        response = self.client.get(reverse('systems:hydroponic-system-series', kwargs={'slug': system.slug}))
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['series']['ph'], {'timestamp': [], 'value': []})
+
+    def test_invalid_points(self):
+        response = self.client.get(f'{self.url}?points=2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_system(self):
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class HydroponicSystemStateListTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('systems:measurement-latest')
+        self.user = UserFactory()
+        self.systems = HydroponicSystemFactory.create_batch(3, owner=self.user)
+        for system in self.systems:
+            MeasurementFactory.create_batch(2, system=system)
+        HydroponicSystemFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def test_get(self):
+        # count and systems with their snapshots
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([system['slug'] for system in response.data['results']],
+                         [system.slug for system in self.systems])
+        self.assertEqual([len(system['last_measurements']) for system in response.data['results']], [2, 2, 2])
+
+    def test_bulk_created_measurements(self):
+        items = [{'system': self.systems[0].slug, 'temperature': 30, 'ph': 7, 'tds': 800}] * 15
+        self.client.post(reverse('systems:measurement-bulk-create'), items, format='json')
+        response = self.client.get(self.url)
+        last_measurements = response.data['results'][0]['last_measurements']
+        self.assertEqual(len(last_measurements), 10)
+        self.assertTrue(all(m['temperature'] == 30 for m in last_measurements))
+
+
 class MeasurementListTests(APITestCase):
     def setUp(self):
         self.url = reverse('systems:measurement-list')
@@ -116,6 +302,720 @@ class MeasurementListTests(APITestCase):
         response = self.client.post(self.url, self.data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_get_matches_model_serializer(self):
+        MeasurementFactory.create_batch(5, system=self.system, description='')
+        response = self.client.get(f'{self.url}?ordering=timestamp')
+        measurements = Measurement.objects.filter(system=self.system).order_by('timestamp', 'pk')
+        expected = MeasurementSerializer(measurements, many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.data['results'], expected)
+
+    def test_get_builds_urls_without_reverse(self):
+        MeasurementFactory.create_batch(5, system=self.system)
+        with mock.patch('systems.serializers.reverse', wraps=reverse_url) as reverse_mock:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(reverse_mock.call_count, 2)
+
+
+class MeasurementFormatTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.systems = HydroponicSystemFactory.create_batch(2, owner=self.user)
+        for system in self.systems:
+            MeasurementFactory.create_batch(3, system=system, temperature=21.5, ph=6.25, tds=640)
+        self.url = reverse('systems:measurement-list')
+        self.client.force_authenticate(user=self.user)
+
+    def test_columnar(self):
+        rows = self.client.get(self.url).data['results']
+        response = self.client.get(self.url, HTTP_ACCEPT='application/vnd.hydroponic.columnar+json')
+        self.assertEqual(response['Content-Type'], 'application/vnd.hydroponic.columnar+json')
+        content = json.loads(response.content)
+        self.assertEqual(content['count'], 6)
+        self.assertEqual(content['results']['id'], [row['id'] for row in rows])
+        self.assertEqual(content['results']['timestamp'], [row['timestamp'] for row in rows])
+
+    def test_columnar_non_rows_are_json(self):
+        renderer = ColumnarJSONRenderer()
+        self.assertEqual(json.loads(renderer.render(['Invalid data.'])), ['Invalid data.'])
+        self.assertEqual(json.loads(renderer.render({'results': [1, 2]})), {'results': [1, 2]})
+        self.assertEqual(json.loads(renderer.render([])), {})
+
+    def test_packed(self):
+        rows = self.client.get(f'{self.url}?limit=4').data['results']
+        response = self.client.get(f'{self.url}?limit=4&format=packed')
+        self.assertEqual(response['Content-Type'], 'application/vnd.hydroponic.packed')
+        self.assertEqual(response['X-Total-Count'], '6')
+        self.assertIn('rel="next"', response['Link'])
+        unpacked = unpack_measurements(response.content)
+        self.assertEqual(
+            [(m['id'], m['system'].split('?')[0], m['timestamp'], m['temperature'], m['ph'], m['tds'])
+             for m in unpacked],
+            [(row['id'], row['system'], parse_datetime(row['timestamp']), 21.5, 6.25, 640) for row in rows]
+        )
+
+    def test_format_suffix(self):
+        url = reverse('systems:measurement-list', kwargs={'format': 'columnar'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = json.loads(response.content)
+        self.assertTrue(all(link.endswith('.columnar/') for link in content['results']['url']))
+        self.assertEqual(self.client.get(content['results']['url'][0]).status_code, status.HTTP_200_OK)
+
+    def test_packed_error_is_json(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(f'{self.url}?format=packed')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', json.loads(response.content))
+
+
+class MeasurementPaginationTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('systems:measurement-list')
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        start = timezone.now() - timedelta(days=1)
+        measurements = MeasurementFactory.create_batch(25, system=self.system)
+        for index, measurement in enumerate(measurements):
+            # consecutive pairs share a timestamp to exercise the id tie-breaker
+            measurement.timestamp = start + timedelta(minutes=index - index % 2)
+        Measurement.objects.bulk_update(measurements, ['timestamp'])
+        self.ordered_ids = list(Measurement.objects.order_by('-timestamp', '-pk').values_list('pk', flat=True))
+
+    def collect(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.append([measurement['id'] for measurement in response.data['results']])
+            url = response.data[link]
+        return ids
+
+    def test_forward(self):
+        pages = self.collect(f'{self.url}?limit=10', 'next')
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.ordered_ids)
+
+    def test_backward(self):
+        response = self.client.get(f'{self.url}?limit=10')
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+        pages = self.collect(response.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(pages), []), self.ordered_ids[:20])
+
+    def test_ascending(self):
+        pages = self.collect(f'{self.url}?limit=7&ordering=timestamp', 'next')
+        self.assertEqual(sum(pages, []), list(reversed(self.ordered_ids)))
+
+    def test_count_opt_out(self):
+        response = self.client.get(f'{self.url}?count=false')
+        self.assertNotIn('count', response.data)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 25)
+
+    def test_count_query_skipped(self):
+        # modification stamp and the page
+        with self.assertNumQueries(2):
+            self.client.get(f'{self.url}?count=false')
+
+    def test_timestamp_filter(self):
+        timestamps = sorted(Measurement.objects.values_list('timestamp', flat=True))
+        url = f'{self.url}?limit=3&timestamp_min={timestamps[4].isoformat()}&timestamp_max={timestamps[13].isoformat()}'
+        pages = self.collect(url.replace('+', '%2B'), 'next')
+        expected = list(
+            Measurement.objects.filter(timestamp__range=(timestamps[4], timestamps[13]))
+            .order_by('-timestamp', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_offset_fallback(self):
+        response = self.client.get(f'{self.url}?limit=10&offset=20')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.url}?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MeasurementAggregateTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('systems:measurement-aggregate')
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        start = datetime(2024, 6, 1, 12, 0, tzinfo=dt_timezone.utc)
+        offsets = [0, 3, 7, 58, 61, 62]
+        for minute, temperature in zip(offsets, [20, 22, 24, 26, 10, 12]):
+            measurement = MeasurementFactory(system=self.system, temperature=temperature, ph=6, tds=500)
+            Measurement.objects.filter(pk=measurement.pk).update(timestamp=start + timedelta(minutes=minute))
+        MeasurementFactory()
+        rollups.rebuild()
+
+    def test_hourly(self):
+        response = self.client.get(f'{self.url}?bucket=1h')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([row['count'] for row in results], [4, 2])
+        self.assertEqual(results[0]['system'], self.system.slug)
+        self.assertEqual(results[0]['bucket'], '2024-06-01T12:00:00Z')
+        self.assertEqual(results[0]['temperature']['min'], 20)
+        self.assertEqual(results[0]['temperature']['max'], 26)
+        self.assertAlmostEqual(results[0]['temperature']['avg'], 23)
+        self.assertAlmostEqual(results[1]['temperature']['stddev'], 1)
+
+    def test_five_minutes(self):
+        response = self.client.get(f'{self.url}?bucket=5m')
+        buckets = [(row['bucket'], row['count']) for row in response.data['results']]
+        self.assertEqual(buckets, [
+            ('2024-06-01T12:00:00Z', 2),
+            ('2024-06-01T12:05:00Z', 1),
+            ('2024-06-01T12:55:00Z', 1),
+            ('2024-06-01T13:00:00Z', 2),
+        ])
+
+    def test_filters(self):
+        response = self.client.get(f'{self.url}?bucket=1d&temperature_min=21')
+        self.assertEqual(response.data['results'][0]['count'], 3)
+
+    def test_rollups_match_raw_aggregation(self):
+        # no range is served from the rollups, a short range from the raw measurements
+        rollup_response = self.client.get(f'{self.url}?bucket=1h')
+        raw_response = self.client.get(f'{self.url}?bucket=1h&timestamp_min=2024-06-01T11:00:00Z')
+        self.assertEqual(len(rollup_response.data['results']), len(raw_response.data['results']))
+        for rollup_row, raw_row in zip(rollup_response.data['results'], raw_response.data['results']):
+            self.assertEqual(rollup_row['bucket'], raw_row['bucket'])
+            self.assertEqual(rollup_row['count'], raw_row['count'])
+            for metric in ['temperature', 'ph', 'tds']:
+                for stat, value in raw_row[metric].items():
+                    self.assertAlmostEqual(rollup_row[metric][stat], value)
+
+    def test_rollups_with_partial_edges(self):
+        url = f'{self.url}?bucket=1h&timestamp_min=2024-05-01T00:00:00Z&timestamp_max=2024-06-01T13:01:30Z'
+        Measurement.objects.filter(timestamp__minute=2).delete()
+        response = self.client.get(url)
+        self.assertEqual([row['count'] for row in response.data['results']], [4, 1])
+
+    def test_compacted_range_uses_rollups(self):
+        compacted_until = datetime(2024, 6, 1, 13, 0, tzinfo=dt_timezone.utc)
+        HydroponicSystem.objects.filter(pk=self.system.pk).update(retention_days=1, compacted_until=compacted_until)
+        self.system.measurements.filter(timestamp__lt=compacted_until).delete()
+        url = f'{self.url}?bucket=1h&timestamp_min=2024-06-01T12:00:00Z&timestamp_max=2024-06-01T14:00:00Z'
+        response = self.client.get(url)
+        self.assertEqual([row['count'] for row in response.data['results']], [4, 2])
+        response = self.client.get(f'{url}&system__slug={self.system.slug}')
+        self.assertEqual([row['count'] for row in response.data['results']], [4, 2])
+
+    def test_invalid_bucket(self):
+        response = self.client.get(f'{self.url}?bucket=7m')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncMeasurementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.measurements = MeasurementFactory.create_batch(3, system=self.system)
+        MeasurementFactory()
+        self.url = reverse('systems:async-measurement-list')
+
+    async def test_get_matches_sync_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'{self.url}?limit=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.json()
+        sync_response = await self.async_client.get(f"{reverse('systems:measurement-list')}?limit=2")
+        sync_content = sync_response.json()
+        self.assertEqual(content['results'], sync_content['results'])
+        self.assertEqual(content['count'], 3)
+        next_response = await self.async_client.get(content['next'])
+        self.assertEqual([row['id'] for row in next_response.json()['results']], [self.measurements[0].pk])
+
+    async def test_get_filtered_by_system(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'{self.url}?system__slug={self.system.slug}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 3)
+
+    async def test_post(self):
+        await self.async_client.aforce_login(self.user)
+        data = {
+            'system': reverse('systems:hydroponic-system-detail', kwargs={'slug': self.system.slug}),
+            'temperature': 21.5, 'ph': 6.1, 'tds': 640, 'description': 'async',
+        }
+        response = await self.async_client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['description'], 'async')
+        self.assertTrue(await Measurement.objects.filter(system=self.system, description='async').aexists())
+
+    async def test_post_validation(self):
+        await self.async_client.aforce_login(self.user)
+        other = await HydroponicSystem.objects.exclude(owner=self.user).afirst()
+        data = {
+            'system': reverse('systems:hydroponic-system-detail', kwargs={'slug': other.slug}),
+            'temperature': 'warm', 'ph': 6.1, 'tds': 640,
+        }
+        response = await self.async_client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {'system', 'temperature'})
+
+    async def test_bulk_create(self):
+        await self.async_client.aforce_login(self.user)
+        items = [{'system': self.system.slug, 'temperature': 21, 'ph': 6, 'tds': 600}, {'system': 'unknown'}]
+        response = await self.async_client.post(
+            reverse('systems:async-measurement-bulk-create'), items, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+        self.assertEqual(await Measurement.objects.filter(system=self.system).acount(), 4)
+
+    async def test_unauthorized(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MeasurementStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.measurement = MeasurementFactory(system=self.system)
+        self.url = reverse('systems:measurement-stream')
+
+    def create_measurements(self, count, system=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MeasurementFactory.create_batch(count, system=system or self.system)
+
+    async def next_event(self, stream):
+        """
+        Read the stream up to the next event, skipping the retry field and comments.
+        """
+        while True:
+            chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+            if not chunk.startswith(('retry:', ':')):
+                return dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+
+    async def open_stream(self, url=None, **extra):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url or self.url, **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    async def test_pushes_new_measurements(self):
+        stream = await self.open_stream()
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        create = sync_to_async(self.create_measurements)
+        measurements = await create(2)
+        await create(1, system=await sync_to_async(HydroponicSystemFactory)())
+        event = await self.next_event(stream)
+        self.assertEqual(event['event'], 'measurements')
+        # everything up to the measurement of setUp was sent
+        self.assertEqual(event['id'], str(self.measurement.pk))
+        rows = json.loads(event['data'])
+        self.assertEqual([row['id'] for row in rows], [measurement.pk for measurement in measurements])
+        self.assertEqual(rows[0]['system'], 'http://testserver' + reverse(
+            'systems:hydroponic-system-detail', kwargs={'slug': self.system.slug}
+        ))
+        await stream.aclose()
+
+    async def test_coalesces_bursts(self):
+        with mock.patch.object(MeasurementStream, 'coalesce_interval', 0.5):
+            stream = await self.open_stream()
+            await anext(stream)
+            create = sync_to_async(self.create_measurements)
+            first = await create(1)
+            await asyncio.sleep(0.1)
+            rest = await create(3)
+            event = await self.next_event(stream)
+        self.assertEqual([row['id'] for row in json.loads(event['data'])], [first[0].pk] + [m.pk for m in rest])
+        await stream.aclose()
+
+    async def test_resumes_after_last_event_id(self):
+        newer = await sync_to_async(self.create_measurements)(2)
+        stream = await self.open_stream(headers={'Last-Event-ID': str(self.measurement.pk)})
+        event = await self.next_event(stream)
+        self.assertEqual([row['id'] for row in json.loads(event['data'])], [m.pk for m in newer])
+        await stream.aclose()
+
+        stream = await self.open_stream(f'{self.url}?last_event_id={newer[0].pk}')
+        event = await self.next_event(stream)
+        self.assertEqual([row['id'] for row in json.loads(event['data'])], [newer[1].pk])
+        self.assertEqual(event['id'], str(newer[0].pk))
+        await stream.aclose()
+
+    async def test_resume_backlog_is_bounded(self):
+        newer = await sync_to_async(self.create_measurements)(3)
+        with mock.patch.multiple(MeasurementStream, max_backlog=2, batch_size=1):
+            stream = await self.open_stream(headers={'Last-Event-ID': '0'})
+            events = [await self.next_event(stream) for _ in range(2)]
+        self.assertEqual([json.loads(event['data'])[0]['id'] for event in events], [m.pk for m in newer[1:]])
+        await stream.aclose()
+
+    async def test_event_id_follows_lookback(self):
+        create = sync_to_async(self.create_measurements)
+        with mock.patch.object(MeasurementStream, 'lookback', 0):
+            stream = await self.open_stream()
+            await anext(stream)
+            first = await create(1)
+            self.assertEqual((await self.next_event(stream))['id'], str(self.measurement.pk))
+            second = await create(1)
+            event = await self.next_event(stream)
+        self.assertEqual([row['id'] for row in json.loads(event['data'])], [second[0].pk])
+        self.assertEqual(event['id'], str(first[0].pk))
+        await stream.aclose()
+
+    async def test_invalid_last_event_id(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': 'latest'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('last_event_id', response.json())
+
+    async def test_unauthorized(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MeasurementStreamTransactionTests(TransactionTestCase):
+    async def test_sends_measurements_committed_after_higher_ids(self):
+        user = await sync_to_async(UserFactory)()
+        # writes to one system wait for each other, as they update the system
+        system, other_system = await sync_to_async(HydroponicSystemFactory.create_batch)(2, owner=user)
+        await self.async_client.aforce_login(user)
+        stream = (await self.async_client.get(reverse('systems:measurement-stream'))).streaming_content
+        await anext(stream)
+
+        inserted, commit = threading.Event(), threading.Event()
+        slow = []
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    slow.append(MeasurementFactory(system=system))
+                    inserted.set()
+                    commit.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write_slowly)
+        thread.start()
+        self.assertTrue(await asyncio.to_thread(inserted.wait, 5))
+        fast = await sync_to_async(MeasurementFactory)(system=other_system)
+        self.assertLess(slow[0].pk, fast.pk)
+
+        async def next_rows():
+            while True:
+                chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+                if chunk.startswith('id:'):
+                    return [row['id'] for row in json.loads(chunk.split('data: ', 1)[1])]
+
+        self.assertEqual(await next_rows(), [fast.pk])
+        commit.set()
+        await asyncio.to_thread(thread.join)
+        self.assertEqual(await next_rows(), [slow[0].pk])
+        await stream.aclose()
+
+
+class MeasurementExportTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory(owner=self.user)
+        self.measurements = [
+            MeasurementFactory(system=self.system, ph=ph, description='line, "quoted"\nbreak')
+            for ph in (5.5, 6.5, 7.5)
+        ]
+        self.other_measurement = MeasurementFactory(system=self.other_system, ph=6.0)
+        MeasurementFactory(ph=6.0)
+        self.url = reverse('systems:measurement-export')
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response = self.client.get(f'{self.url}?system__slug={self.system.slug}')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(self.read(response).decode().splitlines(keepends=True)))
+        self.assertEqual([int(row['id']) for row in rows], [m.pk for m in self.measurements])
+        self.assertEqual({row['system'] for row in rows}, {self.system.slug})
+        self.assertEqual(rows[0]['description'], 'line, "quoted"\nbreak')
+        self.assertEqual(float(rows[1]['ph']), 6.5)
+
+    def test_ndjson_with_filters(self):
+        response = self.client.get(f'{self.url}?format=ndjson&ph_min=6&ph_max=7')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.read(response).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.measurements[1].pk, self.other_measurement.pk])
+        self.assertTrue(all(row['timestamp'].endswith('Z') for row in rows))
+
+    def test_gzip(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/x-ndjson', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(self.read(response)).decode().splitlines()), 4)
+
+    async def test_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'format': 'ndjson'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # a synchronous iterator would be read whole by the ASGI handler before sending it
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(gzip.decompress(content).decode().splitlines()), 4)
+
+
+    def test_unauthorized(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class MeasurementBulkCreateTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('systems:measurement-bulk-create')
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def make_items(self, count, slug=None):
+        return [
+            {'system': slug or self.system.slug, 'temperature': 20 + i % 5, 'ph': 6.0, 'tds': 500}
+            for i in range(count)
+        ]
+
+    def test_post_authorized(self):
+        response = self.client.post(self.url, self.make_items(25), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 25)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 25)
+
+    def test_post_reports_item_errors(self):
+        items = self.make_items(3)
+        items[1]['system'] = self.other_system.slug
+        items[2]['ph'] = 'not a number'
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('system', response.data['errors'][0]['errors'])
+        self.assertIn('ph', response.data['errors'][1]['errors'])
+        self.assertFalse(Measurement.objects.filter(system=self.other_system).exists())
+
+    def test_post_invalid_system_value(self):
+        items = self.make_items(3)
+        items[1]['system'] = []
+        items[2]['system'] = {'slug': self.system.slug}
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+
+    def test_post_all_invalid(self):
+        response = self.client.post(self.url, self.make_items(2, slug=self.other_system.slug), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Measurement.objects.count(), 0)
+
+    def test_post_not_a_list(self):
+        response = self.client.post(self.url, self.make_items(1)[0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_too_many_items(self):
+        response = self.client.post(self.url, self.make_items(5001), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_items(self):
+        other_system = HydroponicSystemFactory(owner=self.user)
+        items = self.make_items(50) + self.make_items(50, slug=other_system.slug)
+        # system lookup, savepoint, insert, hourly and daily rollup upserts,
+        # snapshot creation, locking and update, modification stamps, cache invalidation lookup,
+        # alert rules of the systems (compiled once per process), anomaly detector state
+        # locking, creation (on the first write only), relocking and update, savepoint release
+        with self.assertNumQueries(16):
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.data['created'], 100)
+
+    def test_post_unauthorized(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.post(self.url, self.make_items(1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MeasurementUploadTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('systems:measurement-upload')
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, body, content_type):
+        return self.client.generic('POST', self.url, body.encode(), content_type=content_type)
+
+    def test_ndjson(self):
+        body = '\n'.join([
+            json.dumps({'system': self.system.slug, 'temperature': 21.5, 'ph': 6.1, 'tds': 640}),
+            '',
+            '{not json',
+            json.dumps({'system': self.other_system.slug, 'temperature': 21.5, 'ph': 6.1, 'tds': 640}),
+            json.dumps({'system': self.system.slug, 'temperature': 22, 'ph': 6.2, 'tds': 650}),
+        ])
+        response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(Measurement.objects.filter(system=self.system).count(), 2)
+
+    def test_csv(self):
+        body = (
+            'system,temperature,ph,tds,description\n'
+            f'{self.system.slug},21.5,6.1,640,morning\n'
+            f'{self.system.slug},abc,6.1,640,\n'
+            f'{self.system.slug},22.0,6.2\n'
+        )
+        response = self.upload(body, 'text/csv; charset=utf-8')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertIn('temperature', response.data['errors'][0]['errors'])
+        self.assertEqual(Measurement.objects.get().description, 'morning')
+
+    def test_commits_in_batches(self):
+        row = json.dumps({'system': self.system.slug, 'temperature': 21.5, 'ph': 6.1, 'tds': 640})
+        with mock.patch.object(MeasurementUpload, 'batch_size', 3), \
+                mock.patch.object(MeasurementUpload, 'write', autospec=True,
+                                  side_effect=MeasurementUpload.write) as write:
+            response = self.upload('\n'.join([row] * 7), 'application/x-ndjson')
+        self.assertEqual(response.data['accepted'], 7)
+        self.assertEqual([len(call.args[1]) for call in write.call_args_list], [3, 3, 1])
+        self.assertEqual(Measurement.objects.count(), 7)
+
+    def test_unsupported_media_type(self):
+        response = self.upload('[]', 'application/json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_post_unauthorized(self):
+        self.client.force_authenticate(user=None)
+        response = self.upload('', 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        MeasurementFactory(system=self.system, ph=6.5)
+        self.list_url = reverse('systems:measurement-list')
+        self.detail_url = reverse('systems:hydroponic-system-detail', kwargs={'slug': self.system.slug})
+        self.client.force_authenticate(user=self.user)
+
+    def test_cached(self):
+        first = self.client.get(self.list_url)
+        # only the modification stamp
+        with self.assertNumQueries(1):
+            second = self.client.get(self.list_url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.client.get(self.list_url)
+        response = self.client.get(f'{self.list_url}?ph_min=100')
+        self.assertEqual(response.data['results'], [])
+
+    def test_not_modified(self):
+        response = self.client.get(self.detail_url)
+        with self.assertNumQueries(1):
+            etag_response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(etag_response.status_code, status.HTTP_304_NOT_MODIFIED)
+        date_response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(date_response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_modified_without_cache(self):
+        response = self.client.get(self.detail_url)
+        cache.clear()
+        with self.assertNumQueries(1):
+            etag_response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(etag_response.status_code, status.HTTP_304_NOT_MODIFIED)
+        list_url = reverse('systems:hydroponic-system-list')
+        response = self.client.get(list_url)
+        cache.clear()
+        with self.assertNumQueries(1):
+            date_response = self.client.get(list_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(date_response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modification_stamp(self):
+        stamp = HydroponicSystem.objects.get(pk=self.system.pk).modified_at
+        measurement = MeasurementFactory(system=self.system)
+        touched = HydroponicSystem.objects.get(pk=self.system.pk).modified_at
+        self.assertGreater(touched, stamp)
+        measurement.delete()
+        self.assertGreater(HydroponicSystem.objects.get(pk=self.system.pk).modified_at, touched)
+
+    def test_system_delete_changes_list_stamp(self):
+        other_system = HydroponicSystemFactory(owner=self.user)
+        list_url = reverse('systems:hydroponic-system-list')
+        etag = self.client.get(list_url)['ETag']
+        other_system.delete()
+        cache.clear()
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_measurement_write_invalidates(self):
+        list_etag = self.client.get(self.list_url)['ETag']
+        detail_etag = self.client.get(self.detail_url)['ETag']
+        MeasurementFactory(system=self.system)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(len(response.data['last_measurements']), 2)
+
+    def test_write_invalidates_again_on_commit(self):
+        keys = [caching.system_version_key(self.system.slug), caching.user_version_key(self.user.pk)]
+        for write in [lambda: MeasurementFactory(system=self.system), self.system.save]:
+            with self.captureOnCommitCallbacks() as callbacks:
+                write()
+            # responses cached by other requests before the commit must not be served afterwards
+            versions = caching.get_versions(keys)
+            for callback in callbacks:
+                callback()
+            self.assertTrue(all(new > old for new, old in zip(caching.get_versions(keys), versions)))
+
+    def test_other_systems_do_not_invalidate(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        MeasurementFactory(system=self.other_system)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_system_update_invalidates(self):
+        list_url = reverse('systems:hydroponic-system-list')
+        self.client.get(list_url)
+        self.client.get(self.detail_url)
+        self.system.name = 'Renamed system'
+        self.system.save()
+        self.assertEqual(self.client.get(list_url).data['results'][0]['name'], 'Renamed system')
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_per_user(self):
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(user=self.other_system.owner)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class MeasurementDetailTests(APITestCase):
     def setUp(self):
@@ -146,3 +1046,402 @@ class MeasurementDetailTests(APITestCase):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Measurement.objects.filter(pk=self.measurement.pk).exists())
+
+
+class AlertRuleTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        self.url = reverse('systems:alert-rule-list')
+        self.client.force_authenticate(user=self.user)
+
+    def rule_data(self, system=None, **kwargs):
+        return {
+            'system': reverse('systems:hydroponic-system-detail', kwargs={'slug': (system or self.system).slug}),
+            'name': 'TDS', 'metric': 'tds', 'minimum': 500, 'maximum': 900, 'hysteresis': 20,
+            'sustained_for': '00:05:00', **kwargs,
+        }
+
+    def test_create_and_list(self):
+        response = self.client.post(self.url, self.rule_data(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['sustained_for'], '00:05:00')
+        self.assertFalse(response.data['firing'])
+        AlertRule.objects.create(system=self.other_system, name='foreign', metric='ph', maximum=7)
+        response = self.client.get(self.url)
+        self.assertEqual([rule['name'] for rule in response.data['results']], ['TDS'])
+
+    def test_create_validation(self):
+        response = self.client.post(self.url, self.rule_data(self.other_system), format='json')
+        self.assertIn('system', response.data)
+        response = self.client.post(self.url, self.rule_data(minimum=None, maximum=None), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, self.rule_data(hysteresis=250), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(WEBHOOK_ALLOWED_HOSTS=['.example.com'])
+    def test_webhook_url_validation(self):
+        for url in ['ftp://hooks.example.com/alert', 'http://127.0.0.1:8000/hook', 'http://169.254.169.254/latest',
+                    'https://example.org/hook']:
+            with self.subTest(url=url):
+                response = self.client.post(self.url, self.rule_data(webhook_url=url), format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('webhook_url', response.data)
+        with mock.patch('systems.alerts.socket.getaddrinfo', return_value=[
+            (2, 1, 6, '', ('10.0.0.5', 443)), (2, 1, 6, '', ('93.184.215.14', 443)),
+        ]):
+            response = self.client.post(self.url, self.rule_data(webhook_url='https://hooks.example.com/a'),
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch('systems.alerts.socket.getaddrinfo', return_value=[(2, 1, 6, '', ('93.184.215.14', 443))]):
+            response = self.client.post(self.url, self.rule_data(webhook_url='https://hooks.example.com/a'),
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_other_users_rule(self):
+        rule = AlertRule.objects.create(system=self.other_system, name='foreign', metric='ph', maximum=7)
+        url = reverse('systems:alert-rule-detail', kwargs={'pk': rule.pk})
+        response = self.client.patch(url, {'maximum': 8}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_update_applies_to_next_measurement(self):
+        response = self.client.post(self.url, self.rule_data(sustained_for='00:00:00'), format='json')
+        MeasurementFactory(system=self.system, tds=700)
+        self.assertFalse(AlertEvent.objects.exists())
+        self.client.patch(response.data['url'], {'maximum': 650}, format='json')
+        MeasurementFactory(system=self.system, tds=700)
+        self.assertEqual(AlertEvent.objects.get().kind, AlertEvent.FIRING)
+
+    def test_events(self):
+        AlertRule.objects.create(system=self.system, name='pH', metric='ph', maximum=7)
+        AlertRule.objects.create(system=self.other_system, name='pH', metric='ph', maximum=7)
+        measurement = MeasurementFactory(system=self.system, ph=8)
+        MeasurementFactory(system=self.other_system, ph=8)
+        MeasurementFactory(system=self.system, ph=6)
+        response = self.client.get(reverse('systems:alert-event-list'))
+        self.assertEqual([(event['kind'], event['system']) for event in response.data['results']],
+                         [('resolved', self.system.slug), ('firing', self.system.slug)])
+        response = self.client.get(reverse('systems:alert-event-list'), {'kind': 'firing'})
+        self.assertEqual([event['measurement_id'] for event in response.data['results']], [measurement.pk])
+
+    def test_unauthorized(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('systems:alert-event-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AnomalyTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        self.client.force_authenticate(user=self.user)
+        for system in [self.system, self.other_system]:
+            Measurement.objects.bulk_create([
+                Measurement(system=system, temperature=20 + (-1) ** index * 0.1, ph=6 + (-1) ** index * 0.02,
+                            tds=800 + (-1) ** index * 4)
+                for index in range(40)
+            ])
+        self.spike = MeasurementFactory(system=self.system, temperature=20, ph=9, tds=800)
+        MeasurementFactory(system=self.other_system, temperature=20, ph=9, tds=800)
+
+    def test_list(self):
+        response = self.client.get(reverse('systems:anomaly-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(anomaly['system'], anomaly['kind'], anomaly['metric'], anomaly['measurement_id'], anomaly['value'])
+             for anomaly in response.data['results']],
+            [(self.system.slug, 'spike', 'ph', self.spike.pk, 9)]
+        )
+        response = self.client.get(reverse('systems:anomaly-list'), {'kind': 'drift'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_measurement_filter(self):
+        response = self.client.get(reverse('systems:measurement-list'), {'anomaly': 'true'})
+        self.assertEqual([measurement['id'] for measurement in response.data['results']], [self.spike.pk])
+        response = self.client.get(reverse('systems:measurement-list'), {'anomaly_metric': 'tds'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_aggregate_filter(self):
+        # without a range the aggregation would otherwise be read from the rollups
+        url = reverse('systems:measurement-aggregate')
+        response = self.client.get(url, {'bucket': '1d', 'anomaly': 'true'})
+        self.assertEqual([row['count'] for row in response.data['results']], [1])
+        response = self.client.get(url, {'bucket': '1d', 'anomaly': 'false'})
+        self.assertEqual([row['count'] for row in response.data['results']], [40])
+        response = self.client.get(url, {'bucket': '1d', 'anomaly_kind': 'flatline'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_unauthorized(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('systems:anomaly-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DeviceKeyTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        self.unscoped_system = HydroponicSystemFactory(owner=self.user)
+        self.other_system = HydroponicSystemFactory()
+        self.url = reverse('systems:device-key-list')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'name': 'sensor', 'systems': [self.system_url(self.system)]},
+                                    format='json')
+        self.key = response.data['key']
+        self.key_url = response.data['url']
+        self.client.force_authenticate(user=None)
+
+    def system_url(self, system):
+        return reverse('systems:hydroponic-system-detail', kwargs={'slug': system.slug})
+
+    def post_measurement(self, system, key=None):
+        return self.client.post(
+            reverse('systems:measurement-list'),
+            {'system': self.system_url(system), 'temperature': 21.5, 'ph': 6.1, 'tds': 640},
+            format='json', HTTP_AUTHORIZATION=f'Api-Key {key or self.key}'
+        )
+
+    def test_create_and_list(self):
+        self.assertEqual(len(self.key.split('.')[0]), 12)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotIn('key', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['systems'], ['http://testserver' + self.system_url(self.system)])
+        response = self.client.post(self.url, {'name': 'foreign', 'systems': [self.system_url(self.other_system)]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_measurement(self):
+        response = self.post_measurement(self.system)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Measurement.objects.get().system, self.system)
+        # the key, its owner and its systems are cached: only the writes and their receivers run
+        with self.assertNumQueries(12):
+            response = self.post_measurement(self.system)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_scope(self):
+        for system in [self.unscoped_system, self.other_system]:
+            response = self.post_measurement(system)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('system', response.data)
+        MeasurementFactory(system=self.system)
+        MeasurementFactory(system=self.unscoped_system)
+        response = self.client.get(reverse('systems:measurement-list'), HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+        self.assertEqual([row['system'] for row in response.data['results']],
+                         ['http://testserver' + self.system_url(self.system)])
+        # cached responses of the key are not served to its owner
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(len(self.client.get(reverse('systems:measurement-list')).data['results']), 2)
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('systems:hydroponic-system-list'), HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create(self):
+        items = [{'system': system.slug, 'temperature': 21, 'ph': 6, 'tds': 600}
+                 for system in [self.system, self.unscoped_system]]
+        response = self.client.post(reverse('systems:measurement-bulk-create'), items, format='json',
+                                    HTTP_AUTHORIZATION=f'Api-Key {self.key}')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+
+    def test_invalid_keys(self):
+        prefix = self.key.split('.')[0]
+        for key in [f'{prefix}.wrong', 'nodot', 'f' * 12 + '.secret']:
+            response = self.post_measurement(self.system, key)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_revoke(self):
+        self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.delete(self.key_url).status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_change_systems(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(self.key_url, {'systems': [self.system_url(self.unscoped_system)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post_measurement(self.unscoped_system).status_code, status.HTTP_201_CREATED)
+
+    def test_cache_expiry(self):
+        self.post_measurement(self.system)
+        # a revocation in another process, which this process only learns about from the database
+        DeviceKey.objects.update(revoked_at=timezone.now())
+        self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_201_CREATED)
+        with self.settings(DEVICE_KEY_CACHE_TTL=0):
+            self.assertEqual(self.post_measurement(self.system).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OwnershipTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+
+    def requests(self, system, measurement):
+        system_url = reverse('systems:hydroponic-system-detail', kwargs={'slug': system.slug})
+        return {
+            'create': lambda: self.client.post(reverse('systems:measurement-list'), {
+                'system': system_url, 'temperature': 21, 'ph': 6, 'tds': 600,
+            }, format='json'),
+            'list': lambda: self.client.get(reverse('systems:measurement-list'), {'system__slug': system.slug}),
+            'detail': lambda: self.client.get(reverse('systems:measurement-detail', kwargs={'pk': measurement.pk})),
+        }
+
+    @override_settings(OWNED_SYSTEMS_CACHE_TIMEOUT=300)
+    def test_query_counts_do_not_depend_on_systems(self):
+        for systems_count in [1, 20]:
+            with self.subTest(systems=systems_count):
+                systems = HydroponicSystemFactory.create_batch(systems_count, owner=self.user)
+                requests = self.requests(systems[0], MeasurementFactory(system=systems[0]))
+                # the first request loads the slugs and ids of the user's systems, later ones reuse them
+                with self.assertNumQueries(13):
+                    self.assertEqual(requests['create']().status_code, status.HTTP_201_CREATED)
+                with self.assertNumQueries(12):
+                    self.assertEqual(requests['create']().status_code, status.HTTP_201_CREATED)
+                with self.assertNumQueries(3):
+                    self.assertEqual(len(requests['list']().data['results']), 3)
+                with self.assertNumQueries(1):
+                    self.assertEqual(requests['detail']().status_code, status.HTTP_200_OK)
+
+    def test_changed_systems(self):
+        system = HydroponicSystemFactory(owner=self.user)
+        self.requests(system, MeasurementFactory(system=system))['create']()
+        created = HydroponicSystemFactory(owner=self.user)
+        self.assertEqual(self.requests(created, None)['create']().status_code, status.HTTP_201_CREATED)
+
+        system.name = 'renamed system'
+        system.save()
+        self.assertEqual(self.requests(system, None)['create']().status_code, status.HTTP_201_CREATED)
+
+        created.owner = UserFactory()
+        created.save()
+        self.assertEqual(self.requests(created, None)['create']().status_code, status.HTTP_400_BAD_REQUEST)
+        system.delete()
+        self.assertEqual(self.requests(system, None)['create']().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_systems_changed_by_other_processes(self):
+        system, other_system = HydroponicSystemFactory.create_batch(2, owner=self.user)
+        self.assertEqual(self.requests(system, None)['create']().status_code, status.HTTP_201_CREATED)
+        # updates without signals, as another process without a shared cache would not see them
+        HydroponicSystem.objects.filter(pk=system.pk).update(owner=UserFactory())
+        self.assertEqual(self.requests(system, None)['create']().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.requests(other_system, None)['create']().status_code, status.HTTP_201_CREATED)
+        HydroponicSystem.objects.filter(pk=other_system.pk).delete()
+        self.assertEqual(self.requests(other_system, None)['create']().status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkTests(APITestCase):
+    def test_create_bulk(self):
+        systems = HydroponicSystemFactory.create_bulk(3, owner=UserFactory())
+        end = timezone.now()
+        self.assertEqual(
+            MeasurementFactory.seed_measurements(systems, 100, end=end, period=timedelta(hours=99)), 300
+        )
+        measurements = Measurement.objects.filter(system=systems[0]).order_by('timestamp')
+        self.assertEqual(measurements.count(), 100)
+        self.assertEqual(measurements.last().timestamp, end)
+        self.assertEqual(measurements[1].timestamp - measurements[0].timestamp, timedelta(hours=1))
+        self.assertTrue(all(5 < measurement.ph < 7 for measurement in measurements))
+
+    def test_create_bulk_invalidates_caches(self):
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        list_url = reverse('systems:hydroponic-system-list')
+        bulk_url = reverse('systems:measurement-bulk-create')
+        item = {'temperature': 21.5, 'ph': 6.1, 'tds': 640}
+        self.assertEqual(self.client.get(list_url).data['count'], 0)
+        self.client.post(bulk_url, [{**item, 'system': 'missing'}], format='json')
+        system, = HydroponicSystemFactory.create_bulk(1, owner=user)
+        self.assertEqual(self.client.get(list_url).data['count'], 1)
+        response = self.client.post(bulk_url, [{**item, 'system': system.slug}], format='json')
+        self.assertEqual(response.data['created'], 1)
+
+    def test_benchmarks(self):
+        seeded = benchmarks.seed(scale=0.00002)
+        self.assertEqual(seeded, {'users': 1, 'systems': 1, 'measurements': 1000})
+        fixture = benchmarks.load_fixture()
+        cases = benchmarks.cases(fixture)
+        self.assertEqual(benchmarks.uncovered(cases), set())
+        for case in cases:
+            with self.subTest(case=case.name):
+                result = benchmarks.measure(case, fixture, iterations=2, warmup=0, memory_iterations=1)
+                self.assertTrue(all(200 <= code < 300 for code in result['status']), result['status'])
+                self.assertGreater(result['p99_ms'], 0)
+        self.assertEqual(Measurement.objects.count(), 1000)
+
+        previous = {'results': [{**result, 'queries': result['queries'] - 1}]}
+        (name, changes, regressed), = benchmarks.compare(previous, {'results': [result]})
+        self.assertEqual(name, case.name)
+        self.assertTrue(regressed)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = UserFactory()
+        self.system = HydroponicSystemFactory(owner=self.user)
+        MeasurementFactory.create_batch(3, system=self.system)
+        self.client.force_authenticate(user=self.user)
+
+    def series(self, histogram, labels):
+        return dict(zip(['sum', 'count'], histogram.values[labels][-2:]))
+
+    def test_records_requests(self):
+        response = self.client.get(reverse('systems:measurement-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        labels = ('systems:measurement-list', 'GET')
+        self.assertEqual(self.series(metrics.REQUEST_DURATION, (*labels, '200'))['count'], 1)
+        self.assertGreater(self.series(metrics.REQUEST_QUERIES, labels)['sum'], 0)
+        self.assertGreater(self.series(metrics.REQUEST_SERIALIZER_DURATION, labels)['sum'], 0)
+        self.assertEqual(self.series(metrics.RESPONSE_SIZE, labels)['sum'], len(response.content))
+
+        # streamed responses are recorded once consumed, with the queries run while streaming
+        response = self.client.get(reverse('systems:measurement-export'))
+        labels = ('systems:measurement-export', 'GET')
+        self.assertNotIn(labels, metrics.RESPONSE_SIZE.values)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(self.series(metrics.RESPONSE_SIZE, labels)['sum'], len(content))
+        self.assertGreater(self.series(metrics.REQUEST_QUERIES, labels)['sum'], 0)
+
+        self.client.get('/not-a-page/')
+        self.assertIn(('unmatched', 'GET', '404'), metrics.REQUEST_DURATION.values)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('systems:measurement-detail', kwargs={'pk': self.system.measurements.first().pk}))
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=UserFactory(is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE hydroponic_request_duration_seconds histogram', text)
+        self.assertIn('hydroponic_request_duration_seconds_count'
+                      '{view="systems:measurement-detail",method="GET",status="200"} 1', text)
+        self.assertIn('hydroponic_request_queries_bucket{view="systems:measurement-detail",method="GET",le="+Inf"} 1',
+                      text)
+
+        self.client.force_authenticate(user=None)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code,
+                             status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, status.HTTP_200_OK)
+
+    def test_profile(self):
+        url = reverse('systems:measurement-list')
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILE_DIR=directory):
+            response = self.client.get(url, HTTP_X_PROFILE='1')
+            self.assertNotIn('X-Profile', response)
+            self.client.force_authenticate(user=UserFactory(is_staff=True))
+            response = self.client.get(url, HTTP_X_PROFILE='1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(os.listdir(directory), [response['X-Profile']])
+            self.assertTrue(response['X-Profile'].endswith('.prof'))
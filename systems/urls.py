@@ -1,6 +1,27 @@
 from django.urls import path
+from rest_framework.urlpatterns import format_suffix_patterns
 
-from .views import HydroponicSystemList, HydroponicSystemDetail, MeasurementList, MeasurementDetail, api_root, UserCreate
+from .async_views import AsyncMeasurementBulkCreate, AsyncMeasurementList, MeasurementStream
+from .views import (
+    HydroponicSystemList,
+    HydroponicSystemDetail,
+    HydroponicSystemStateList,
+    HydroponicSystemSeries,
+    MeasurementList,
+    MeasurementAggregate,
+    MeasurementExport,
+    MeasurementBulkCreate,
+    MeasurementUpload,
+    MeasurementDetail,
+    AlertRuleList,
+    AlertRuleDetail,
+    AlertEventList,
+    AnomalyList,
+    DeviceKeyList,
+    DeviceKeyDetail,
+    api_root,
+    UserCreate
+)
 
 app_name = 'systems'
 
@@ -9,6 +30,24 @@ urlpatterns = [
     path('register/', UserCreate.as_view(), name='user-create'),
     path('hydroponic-systems/', HydroponicSystemList.as_view(), name='hydroponic-system-list'),
     path('hydroponic-systems/<slug:slug>/', HydroponicSystemDetail.as_view(), name='hydroponic-system-detail'),
+    path('hydroponic-systems/<slug:slug>/series/', HydroponicSystemSeries.as_view(),
+         name='hydroponic-system-series'),
     path('measurements/', MeasurementList.as_view(), name='measurement-list'),
+    path('measurements/latest/', HydroponicSystemStateList.as_view(), name='measurement-latest'),
+    path('measurements/aggregate/', MeasurementAggregate.as_view(), name='measurement-aggregate'),
+    path('measurements/stream/', MeasurementStream.as_view(), name='measurement-stream'),
+    path('measurements/export/', MeasurementExport.as_view(), name='measurement-export'),
+    path('measurements/bulk/', MeasurementBulkCreate.as_view(), name='measurement-bulk-create'),
+    path('measurements/upload/', MeasurementUpload.as_view(), name='measurement-upload'),
     path('measurements/<int:pk>/', MeasurementDetail.as_view(), name='measurement-detail'),
-]
\ No newline at end of file
+    path('alert-rules/', AlertRuleList.as_view(), name='alert-rule-list'),
+    path('alert-rules/<int:pk>/', AlertRuleDetail.as_view(), name='alert-rule-detail'),
+    path('alert-events/', AlertEventList.as_view(), name='alert-event-list'),
+    path('anomalies/', AnomalyList.as_view(), name='anomaly-list'),
+    path('device-keys/', DeviceKeyList.as_view(), name='device-key-list'),
+    path('device-keys/<int:pk>/', DeviceKeyDetail.as_view(), name='device-key-detail'),
+    path('async/measurements/', AsyncMeasurementList.as_view(), name='async-measurement-list'),
+    path('async/measurements/bulk/', AsyncMeasurementBulkCreate.as_view(), name='async-measurement-bulk-create'),
+]
+
+urlpatterns = format_suffix_patterns(urlpatterns)
@@ -1,21 +1,51 @@
-from django.db.models import Prefetch
-from rest_framework import generics, permissions
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max, Min
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.reverse import reverse
 from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import HydroponicSystem, Measurement
+from .models import AlertEvent, AlertRule, Anomaly, DeviceKey, HydroponicSystem, Measurement
 from .serializers import (
     HydroponicSystemSerializer,
     MeasurementSerializer,
+    MeasurementBulkItemSerializer,
+    MeasurementAggregateSerializer,
     UserSerializer,
-    HydroponicSystemDetailSerializer
+    HydroponicSystemDetailSerializer,
+    HydroponicSystemStateSerializer,
+    SeriesQuerySerializer,
+    AlertRuleSerializer,
+    AlertEventSerializer,
+    AnomalySerializer,
+    DeviceKeySerializer
+)
+from .permissions import (
+    CanReadMetrics, IsAlertRuleOwner, IsDeviceKeyOwner, IsHydroponicSystemOwner, IsMeasurementOwner
 )
-from .permissions import IsHydroponicSystemOwner, IsMeasurementOwner
-from .filters import MeasurementFilter, HydroponicSystemFilter
+from .authentication import DeviceKeyAuthMixin
+from .ownership import for_request
+from .caching import CachedResponseMixin, last_modified_for_owner, system_version_key
+from .aggregates import BUCKETS, METRICS, aggregate_measurements
+from .downsampling import downsample, read_hourly_series, read_series, to_microseconds
+from .filters import AlertEventFilter, AnomalyFilter, MeasurementFilter, HydroponicSystemFilter
+from .exports import accepts_gzip, buffered, export_rows, gzipped, in_thread
+from .ingestion import PARSERS, iter_lines
+from .metrics import SerializerMetricsMixin, render as render_metrics
+from .pagination import MeasurementCursorPagination
+from .renderers import CSVExportRenderer, NDJSONExportRenderer
+from .rollups import ROLLUP_BUCKETS, aggregate_rollups
 
 
 @api_view(['GET'])
@@ -30,12 +60,16 @@ def api_root(request, format=None):
         'register': reverse('systems:user-create', request=request, format=format),
         'hydroponic-systems': reverse('systems:hydroponic-system-list', request=request, format=format),
         'measurements': reverse('systems:measurement-list', request=request, format=format),
+        'alert-rules': reverse('systems:alert-rule-list', request=request, format=format),
+        'alert-events': reverse('systems:alert-event-list', request=request, format=format),
+        'anomalies': reverse('systems:anomaly-list', request=request, format=format),
+        'device-keys': reverse('systems:device-key-list', request=request, format=format),
         'swagger': reverse('schema-swagger-ui', request=request),
         'redoc': reverse('schema-redoc', request=request),
     })
 
 
-class UserCreate(generics.CreateAPIView):
+class UserCreate(SerializerMetricsMixin, generics.CreateAPIView):
     """
     View for creating new user instances.
     """
@@ -43,7 +77,7 @@ class UserCreate(generics.CreateAPIView):
     permission_classes = [AllowAny]
 
 
-class HydroponicSystemList(generics.ListCreateAPIView):
+class HydroponicSystemList(SerializerMetricsMixin, CachedResponseMixin, generics.ListCreateAPIView):
     """
     View for listing and creating hydroponic systems owned by the authenticated user.
     """
@@ -61,6 +95,14 @@ class HydroponicSystemList(generics.ListCreateAPIView):
         """
         return HydroponicSystem.objects.filter(owner=self.request.user).select_related('owner')
 
+    def get_last_modified(self):
+        """
+        Newest modification stamp of the authenticated user's systems.
+
+        :return: Datetime of the last modification, or None
+        """
+        return last_modified_for_owner(self.request.user)
+
     def perform_create(self, serializer):
         """
         Perform creation of a new hydroponic system owned by the authenticated user.
@@ -70,44 +112,618 @@ class HydroponicSystemList(generics.ListCreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class HydroponicSystemDetail(generics.RetrieveUpdateDestroyAPIView):
+class HydroponicSystemDetail(SerializerMetricsMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating, and deleting specific hydroponic systems.
     """
-    queryset = HydroponicSystem.objects.prefetch_related(
-        Prefetch(
-            'measurements',
-            queryset=Measurement.objects.order_by('-timestamp')[:10],
-            to_attr='last_measurements_prefetched'
-    )).select_related('owner')
+    queryset = HydroponicSystem.objects.select_related('owner', 'snapshot')
     serializer_class = HydroponicSystemDetailSerializer
     permission_classes = [permissions.IsAuthenticated, IsHydroponicSystemOwner]
     lookup_field = 'slug'
 
+    def get_cache_version_keys(self):
+        """
+        Cached responses depend only on the requested system and its measurements.
+
+        :return: List of version counter keys
+        """
+        return [system_version_key(self.kwargs['slug'])]
+
+    def get_last_modified(self):
+        """
+        Modification stamp of the requested system if it is owned by the authenticated user.
+
+        :return: Datetime of the last modification, or None
+        """
+        systems = HydroponicSystem.objects.filter(slug=self.kwargs['slug'], owner=self.request.user)
+        return systems.values_list('modified_at', flat=True).first()
+
 
-class MeasurementList(generics.ListCreateAPIView):
+class HydroponicSystemSeries(SerializerMetricsMixin, CachedResponseMixin, generics.RetrieveAPIView):
+    """
+    View for a chart-ready series of a hydroponic system's measurements.
+
+    Returns at most ``points`` points per metric between ``timestamp_min`` and ``timestamp_max``,
+    selected with Largest-Triangle-Three-Buckets, so the shape of the series survives
+    downsampling. The raw series is read in chunks of NumPy arrays and never held in memory
+    as a whole; long ranges are downsampled from the hourly extremes in the rollups.
+    """
+    queryset = HydroponicSystem.objects.all()
+    permission_classes = [permissions.IsAuthenticated, IsHydroponicSystemOwner]
+    lookup_field = 'slug'
+    rollup_bucket_width = timedelta(hours=6)
+
+    def get_cache_version_keys(self):
+        """
+        Cached responses depend only on the requested system and its measurements.
+
+        :return: List of version counter keys
+        """
+        return [system_version_key(self.kwargs['slug'])]
+
+    def get_last_modified(self):
+        """
+        Modification stamp of the requested system if it is owned by the authenticated user.
+
+        :return: Datetime of the last modification, or None
+        """
+        systems = HydroponicSystem.objects.filter(slug=self.kwargs['slug'], owner=self.request.user)
+        return systems.values_list('modified_at', flat=True).first()
+
+    def use_rollups(self, source, system, start, bounds, points):
+        """
+        Decide whether to downsample the hourly rollups instead of the raw measurements.
+
+        With ``source=auto`` the rollups are used when the range reaches into compacted days,
+        whose raw measurements are gone, or when every downsampling bucket spans at least
+        ``rollup_bucket_width``, where hourly extremes look the same on a chart as raw data.
+
+        :param source: Requested source, auto, raw or hourly
+        :param system: HydroponicSystem instance
+        :param start: Requested start of the range, or None
+        :param bounds: First and last timestamp of the raw measurements in the range
+        :param points: Number of points per metric
+        :return: True if the rollups should be used
+        """
+        if source != 'auto':
+            return source == 'hourly'
+        if system.compacted_until is not None and (start is None or start < system.compacted_until):
+            return True
+        if bounds['first'] is None:
+            return False
+        return (bounds['last'] - bounds['first']) / (points - 2) >= self.rollup_bucket_width
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Downsample the requested metrics of the system.
+
+        :param request: Request instance
+        :return: Response with the timestamps and values of every metric
+        """
+        system = self.get_object()
+        query = SeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        metrics = query.validated_data.get('metric') or METRICS
+        points = query.validated_data['points']
+        start = query.validated_data.get('timestamp_min')
+        end = query.validated_data.get('timestamp_max')
+
+        measurements = Measurement.objects.filter(system=system)
+        if start is not None:
+            measurements = measurements.filter(timestamp__gte=start)
+        if end is not None:
+            measurements = measurements.filter(timestamp__lt=end)
+        bounds = measurements.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        if self.use_rollups(query.validated_data['source'], system, start, bounds, points):
+            source = 'hourly'
+            count, timestamps, values = read_hourly_series(system.pk, metrics, start, end)
+            chunks = [(timestamps, values)] if len(timestamps) else []
+            first, last = (timestamps[0], timestamps[-1]) if len(timestamps) else (0, 0)
+        else:
+            source = 'raw'
+            count = None
+            chunks = read_series(system.pk, metrics, start, end) if bounds['first'] is not None else []
+            first, last = [to_microseconds(bounds[key]) if bounds[key] else 0 for key in ['first', 'last']]
+        rows, timestamps, values = downsample(chunks, first, last, points, len(metrics))
+        # whole seconds are formatted like the other endpoints, without microseconds
+        unit = 'us' if (timestamps % 10 ** 6).any() else 's'
+        series = {
+            metric: {
+                'timestamp': np.datetime_as_string(timestamps[:, index].astype('datetime64[us]'),
+                                                   unit=unit, timezone='UTC').tolist(),
+                'value': values[:, index].tolist(),
+            }
+            for index, metric in enumerate(metrics)
+        }
+        return Response({
+            'system': system.slug, 'source': source, 'count': rows if count is None else count, 'points': points,
+            'series': series,
+        })
+
+
+class HydroponicSystemStateList(SerializerMetricsMixin, generics.ListAPIView):
+    """
+    View for listing the current state (last measurements) of all hydroponic systems owned by the authenticated user.
+    """
+    serializer_class = HydroponicSystemStateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = HydroponicSystemFilter
+    ordering_fields = ['name', 'slug']
+
+    def get_queryset(self):
+        """
+        Retrieve all hydroponic systems owned by the authenticated user with their snapshots.
+
+        :return: QuerySet of HydroponicSystem objects
+        """
+        return HydroponicSystem.objects.filter(owner=self.request.user).select_related('snapshot').order_by('pk')
+
+
+class MeasurementList(SerializerMetricsMixin, DeviceKeyAuthMixin, CachedResponseMixin, generics.ListCreateAPIView):
     """
     View for listing and creating measurements associated with hydroponic systems owned by the authenticated user.
+
+    Devices can authenticate with an API key, limited to the systems of the key.
     """
     serializer_class = MeasurementSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = MeasurementFilter
     ordering_fields = ['timestamp', 'temperature', 'ph', 'tds']
+    pagination_class = MeasurementCursorPagination
 
     def get_queryset(self):
         """
         Retrieve all measurements associated with hydroponic systems owned by the authenticated user.
 
+        Reads fetch plain ``values()`` rows, which the serializer turns into its output without
+        instantiating models or reversing URLs per row.
+
         :return: QuerySet of Measurement objects
         """
-        return Measurement.objects.filter(system__owner=self.request.user).select_related('system')
+        queryset = self.scope_to_device(Measurement.objects.filter(system__owner=self.request.user))
+        if self.request.method == 'GET':
+            return queryset.values(*MeasurementSerializer.values_fields)
+        return queryset.select_related('system')
+
+    def get_last_modified(self):
+        """
+        Newest modification stamp of the authenticated user's systems.
+
+        :return: Datetime of the last modification, or None
+        """
+        return last_modified_for_owner(self.request.user)
+
+
+class MeasurementAggregate(SerializerMetricsMixin, generics.ListAPIView):
+    """
+    View for time bucketed statistics of the authenticated user's measurements.
+
+    Accepts the same filters as the measurement list and a ``bucket`` parameter
+    (one of 1m, 5m, 15m, 1h, 6h, 1d). Aggregation is done in the database; ranges longer
+    than ``rollup_threshold`` are read from the hourly and daily rollups where possible.
+    """
+    serializer_class = MeasurementAggregateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = MeasurementFilter
+    pagination_class = None
+    default_bucket = '1h'
+    max_buckets = 10000
+    rollup_threshold = timedelta(days=2)
+
+    def get_queryset(self):
+        """
+        Retrieve all measurements associated with hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of Measurement objects
+        """
+        return Measurement.objects.filter(system__owner=self.request.user)
+
+    def get_bucket(self):
+        """
+        Read the bucket size from the query parameters.
+
+        :return: Bucket name
+        """
+        bucket = self.request.query_params.get('bucket', self.default_bucket)
+        if bucket not in BUCKETS:
+            raise ValidationError({'bucket': [f'Must be one of: {", ".join(BUCKETS)}.']})
+        return bucket
+
+    def use_rollups(self, bucket, filters):
+        """
+        Decide whether the aggregation can be served from the rollup tables.
+
+        Rollups are used for buckets they can serve, when no metric value or anomaly filters
+        are given and the requested range is longer than ``rollup_threshold`` or reaches into
+        the compacted days of a system, whose raw measurements are gone.
+
+        :param bucket: Bucket name
+        :param filters: Cleaned data of the measurement filter
+        :return: True if the rollups should be used
+        """
+        if bucket not in ROLLUP_BUCKETS:
+            return False
+        if any(filters.get(metric) for metric in METRICS):
+            return False
+        # anomalies belong to raw measurements, rollups cannot be filtered by them
+        if filters.get('anomaly') is not None or filters.get('anomaly_kind') or filters.get('anomaly_metric'):
+            return False
+        timestamp = filters.get('timestamp')
+        if not timestamp or timestamp.start is None:
+            return True
+        if (timestamp.stop or timezone.now()) - timestamp.start > self.rollup_threshold:
+            return True
+        return self.get_systems(filters).filter(compacted_until__gt=timestamp.start).exists()
+
+    def get_systems(self, filters):
+        """
+        Retrieve the systems of the authenticated user matching the system filters.
+
+        :param filters: Cleaned data of the measurement filter
+        :return: QuerySet of HydroponicSystem objects
+        """
+        systems = HydroponicSystem.objects.filter(owner=self.request.user)
+        if filters.get('system__slug'):
+            systems = systems.filter(pk=for_request(self.request).systems.get(filters['system__slug']))
+        if filters.get('system__name__icontains'):
+            systems = systems.filter(name__icontains=filters['system__name__icontains'])
+        return systems
+
+    def list(self, request, *args, **kwargs):
+        """
+        Return aggregated statistics per system and bucket.
+
+        :param request: Request instance
+        :return: Response with the bucket size and the aggregated rows
+        """
+        bucket = self.get_bucket()
+        queryset = self.get_queryset()
+        filterset = DjangoFilterBackend().get_filterset(request, queryset, self)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        filters = filterset.form.cleaned_data
+
+        if self.use_rollups(bucket, filters):
+            timestamp = filters.get('timestamp')
+            rows = aggregate_rollups(filterset.qs, self.get_systems(filters), bucket,
+                                     start=timestamp and timestamp.start, end=timestamp and timestamp.stop)
+        else:
+            rows = list(aggregate_measurements(filterset.qs, bucket)[:self.max_buckets + 1])
+        if len(rows) > self.max_buckets:
+            raise ValidationError({'bucket': ['Too many buckets, use a larger bucket or a shorter range.']})
+        serializer = self.get_serializer(rows, many=True)
+        return Response({'bucket': bucket, 'results': serializer.data})
+
+
+class MeasurementExport(SerializerMetricsMixin, generics.GenericAPIView):
+    """
+    View streaming all measurements of the authenticated user's systems as CSV or NDJSON.
+
+    The format is negotiated from the ``Accept`` header or ``format`` parameter (``csv`` by default)
+    and the measurement list filters are accepted. Rows are read with a server-side cursor and
+    written as they arrive, so memory use does not grow with the export. The body is gzip
+    compressed on the fly when the client accepts it.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CSVExportRenderer, NDJSONExportRenderer]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = MeasurementFilter
+    chunk_size = 2000
+
+    def get_queryset(self):
+        """
+        Retrieve all measurements associated with hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of Measurement objects
+        """
+        return Measurement.objects.filter(system__owner=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Stream the filtered measurements ordered by system and timestamp.
+
+        :param request: Request instance
+        :return: Streaming response with the export
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by('system_id', 'timestamp', 'pk')
+        renderer = request.accepted_renderer
+        chunks = buffered(renderer.encode(export_rows(queryset, self.chunk_size)))
+        compress = accepts_gzip(request)
+        if compress:
+            chunks = gzipped(chunks)
+        if isinstance(request._request, ASGIRequest):
+            chunks = in_thread(chunks)
+        response = StreamingHttpResponse(chunks, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['Content-Disposition'] = f'attachment; filename="measurements.{renderer.format}"'
+        return response
 
 
-class MeasurementDetail(generics.RetrieveUpdateDestroyAPIView):
+class MeasurementBulkCreate(SerializerMetricsMixin, DeviceKeyAuthMixin, generics.GenericAPIView):
+    """
+    View for creating many measurements for the authenticated user's hydroponic systems in one request.
+
+    Expects a JSON array of measurements referencing systems by slug. Valid items are
+    written with ``bulk_create``, invalid ones are reported back with their index.
+    Devices can authenticate with an API key, limited to the systems of the key.
+    """
+    serializer_class = MeasurementBulkItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 5000
+    batch_size = 1000
+
+    def get_systems(self):
+        """
+        Systems the items may reference, those of the device key for requests made with one.
+
+        :return: Dictionary mapping slugs of the systems to their primary keys
+        """
+        return for_request(self.request).systems
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validate every item and bulk create the valid ones.
+
+        :param request: Request instance
+        :return: Response with the number of created measurements and per-item errors
+        """
+        items = self.get_items(request)
+        measurements, errors = self.validate_items(items, self.get_systems())
+        with transaction.atomic():
+            Measurement.objects.bulk_create(measurements, batch_size=self.batch_size)
+        return self.get_result_response(measurements, errors)
+
+    def get_items(self, request):
+        """
+        Read the list of raw items from the request body.
+
+        :param request: Request instance
+        :return: List of raw measurement items
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'detail': 'Expected a list of measurements.'})
+        if len(items) > self.max_items:
+            raise ValidationError({'detail': f'Cannot create more than {self.max_items} measurements at once.'})
+        return items
+
+    def validate_items(self, items, systems):
+        """
+        Validate every item without touching the database.
+
+        :param items: List of raw measurement items
+        :param systems: Dictionary mapping slugs of the user's systems to their primary keys
+        :return: List of unsaved Measurement objects and list of per-item errors
+        """
+        context = self.get_serializer_context()
+        context['systems'] = systems
+        serializer = self.get_serializer(context=context)
+        measurements = []
+        errors = []
+        for index, item in enumerate(items):
+            try:
+                validated_data = serializer.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+                continue
+            system_id = validated_data.pop('system')
+            measurements.append(Measurement(system_id=system_id, **validated_data))
+        return measurements, errors
+
+    def get_result_response(self, measurements, errors):
+        """
+        Build the response of a bulk create, an error only if no item was valid.
+
+        :param measurements: List of created Measurement objects
+        :param errors: List of per-item errors
+        :return: Response with the number of created measurements and per-item errors
+        """
+        response_status = status.HTTP_201_CREATED if measurements or not errors else status.HTTP_400_BAD_REQUEST
+        return Response({'created': len(measurements), 'errors': errors}, status=response_status)
+
+
+class MeasurementUpload(SerializerMetricsMixin, DeviceKeyAuthMixin, generics.GenericAPIView):
+    """
+    View for uploading large NDJSON or CSV files of measurements.
+
+    The request body is parsed incrementally and never loaded through ``request.data``.
+    Valid rows are committed in transactions of at most ``batch_size`` rows, so memory use
+    does not depend on the size of the upload. Devices can authenticate with an API key,
+    limited to the systems of the key.
+    """
+    serializer_class = MeasurementBulkItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    batch_size = 1000
+    max_reported_errors = 100
+
+    def write(self, measurements):
+        """
+        Commit a batch of measurements in its own transaction.
+
+        :param measurements: List of unsaved Measurement objects
+        """
+        with transaction.atomic():
+            Measurement.objects.bulk_create(measurements)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Parse, validate and store the uploaded rows.
+
+        :param request: Request instance
+        :return: Response with the number of accepted and rejected rows and the rejected line numbers
+        """
+        media_type = request.content_type.split(';')[0].strip()
+        parse = PARSERS.get(media_type)
+        if parse is None:
+            raise UnsupportedMediaType(media_type)
+
+        context = self.get_serializer_context()
+        context['systems'] = for_request(request).systems
+        serializer = self.get_serializer(context=context)
+        accepted = 0
+        rejected = 0
+        errors = []
+        batch = []
+        for line_number, row, row_errors in parse(iter_lines(request.stream)):
+            if row_errors is None:
+                try:
+                    validated_data = serializer.run_validation(row)
+                except serializers.ValidationError as exc:
+                    row_errors = exc.detail
+            if row_errors is not None:
+                rejected += 1
+                if len(errors) < self.max_reported_errors:
+                    errors.append({'line': line_number, 'errors': row_errors})
+                continue
+            system_id = validated_data.pop('system')
+            batch.append(Measurement(system_id=system_id, **validated_data))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                accepted += len(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+            accepted += len(batch)
+
+        response_status = status.HTTP_201_CREATED if accepted or not rejected else status.HTTP_400_BAD_REQUEST
+        return Response({'accepted': accepted, 'rejected': rejected, 'errors': errors}, status=response_status)
+
+
+class MeasurementDetail(SerializerMetricsMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating, and deleting specific measurements.
     """
     queryset = Measurement.objects.select_related('system')
     serializer_class = MeasurementSerializer
     permission_classes = [permissions.IsAuthenticated, IsMeasurementOwner]
+
+
+class AlertRuleList(SerializerMetricsMixin, generics.ListCreateAPIView):
+    """
+    View for listing and creating alert rules of hydroponic systems owned by the authenticated user.
+    """
+    serializer_class = AlertRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """
+        Retrieve all alert rules of hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of AlertRule objects
+        """
+        return AlertRule.objects.filter(system__owner=self.request.user).select_related('system').order_by('pk')
+
+
+class AlertRuleDetail(SerializerMetricsMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    View for retrieving, updating, and deleting specific alert rules.
+    """
+    queryset = AlertRule.objects.select_related('system')
+    serializer_class = AlertRuleSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAlertRuleOwner]
+
+
+class AlertEventList(SerializerMetricsMixin, generics.ListAPIView):
+    """
+    View for listing the firing and resolved alerts of hydroponic systems owned by the authenticated user, newest first.
+    """
+    serializer_class = AlertEventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AlertEventFilter
+
+    def get_queryset(self):
+        """
+        Retrieve all alert events of hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of AlertEvent objects
+        """
+        return (
+            AlertEvent.objects.filter(system__owner=self.request.user)
+            .select_related('system').order_by('-timestamp', '-pk')
+        )
+
+
+class AnomalyList(SerializerMetricsMixin, generics.ListAPIView):
+    """
+    View for listing the anomalies detected in measurements of hydroponic systems owned by the authenticated user, newest first.
+    """
+    serializer_class = AnomalySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AnomalyFilter
+
+    def get_queryset(self):
+        """
+        Retrieve all anomalies of hydroponic systems owned by the authenticated user.
+
+        :return: QuerySet of Anomaly objects
+        """
+        return (
+            Anomaly.objects.filter(system__owner=self.request.user)
+            .select_related('system').order_by('-timestamp', '-pk')
+        )
+
+
+class DeviceKeyList(SerializerMetricsMixin, generics.ListCreateAPIView):
+    """
+    View for listing and creating the device API keys of the authenticated user.
+    """
+    serializer_class = DeviceKeySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """
+        Retrieve all device keys of the authenticated user.
+
+        :return: QuerySet of DeviceKey objects
+        """
+        return DeviceKey.objects.filter(owner=self.request.user).prefetch_related('systems').order_by('pk')
+
+    def perform_create(self, serializer):
+        """
+        Perform creation of a new device key owned by the authenticated user.
+
+        :param serializer: Serializer instance
+        """
+        serializer.save(owner=self.request.user)
+
+
+class DeviceKeyDetail(SerializerMetricsMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    View for retrieving, updating, and revoking specific device API keys.
+    """
+    queryset = DeviceKey.objects.prefetch_related('systems')
+    serializer_class = DeviceKeySerializer
+    permission_classes = [permissions.IsAuthenticated, IsDeviceKeyOwner]
+
+    def perform_destroy(self, instance):
+        """
+        Revoke the key instead of deleting it, keeping it listed with its ``revoked_at``.
+
+        :param instance: DeviceKey instance
+        """
+        instance.revoked_at = timezone.now()
+        instance.save(update_fields=['revoked_at'])
+
+
+class Metrics(APIView):
+    """
+    View exposing the request metrics of the process in the Prometheus text format.
+    """
+    permission_classes = [CanReadMetrics]
+    swagger_schema = None
+
+    def get(self, request):
+        """
+        Render the metrics collected by ``systems.middleware.MetricsMiddleware``.
+
+        :param request: Request object
+        :return: Plain text response
+        """
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')